@@ -0,0 +1,493 @@
+import gzip
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy
+from Configs import getConfig
+
+from tests.helpers import (CypherCountingGraph, get_stand_in_pmids, make_disease_dag, make_drugbank_xml,
+                           make_entity_frame, make_loader, make_mesh_xml, make_obo_file, make_target_compound_rows,
+                           make_xref_frame, reference_filter_nodes_by_ancestor, reference_hash_id,
+                           reference_load_disease_file, reference_parse_anatomy_entries, reference_parse_drug,
+                           reference_update_xrefs, start_eutils_stand_in, start_ftp_stand_in, start_http_stand_in)
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# Micro benchmarks for the hot paths of the data loader.
+# Run all with `python3 benchmark.py` or pick some by name, e.g. `python3 benchmark.py entity_conversion`
+# The data generators, stand-in servers and reference implementations live in tests/helpers.py
+
+
+def bench_entity_conversion(row_count=20000):
+
+    from load_data import Compound, Disease, Target, build_entities
+
+    for entity_name, entity in [("Compound", Compound), ("Target", Target), ("Disease", Disease)]:
+        data = make_entity_frame(entity_name, row_count)
+
+        start = time.perf_counter()
+        [entity(row) for index, row in data.iterrows()]
+        iterrows_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        build_entities(entity, entity_name, data)
+        columnar_time = time.perf_counter() - start
+
+        log.info("{0}: iterrows {1:.0f} rows/s, columnar {2:.0f} rows/s ({3:.1f}x)".format(
+            entity_name, row_count / iterrows_time, row_count / columnar_time, iterrows_time / columnar_time))
+
+
+def bench_worker_statements(batch_count=10):
+
+    from load_data import Disease, build_entities
+
+    data = make_entity_frame("Disease", batch_count * config.BATCH_SIZE)
+    entities = build_entities(Disease, "Disease", data)
+
+    for mode in ["merge", "flush"]:
+        loader = make_loader()
+        graph = CypherCountingGraph()
+        buffered_rows = 0
+        for batch_start in range(0, len(entities), config.BATCH_SIZE):
+            for entity in entities[batch_start:batch_start + config.BATCH_SIZE]:
+                loader.load_json(entity.to_dict(), "Disease")
+            buffered_rows += sum(len(nodes.nodes) for nodes in loader.nodeSets.values())
+            buffered_rows += sum(len(rels.relationships) for rels in loader.relationshipSets.values())
+            getattr(loader, mode)(graph)
+        log.info("{0}: {1} statements, {2} rows sent for {3} buffered rows of a {4} batch worker".format(
+            mode, graph.statements, graph.rows, buffered_rows, batch_count))
+
+
+def bench_create_relation(relation_count=50000):
+
+    from load_data import TargetCompoundMap, _custom_relation_name_generator
+
+    loader = make_loader()
+    loader.config_func_custom_relation_name_generator = _custom_relation_name_generator
+    relations = []
+    for row in make_target_compound_rows(relation_count):
+        entity = TargetCompoundMap(row)
+        relations.append((entity.get_parent_node(loader), entity.get_child_node(loader),
+                          entity.properties, entity.custom_relationship_id))
+
+    start = time.perf_counter()
+    for parent_node, child_node, properties, relationship_id in relations:
+        loader._create_relation(parent_node, child_node, properties, relationship_id)
+    elapsed = time.perf_counter() - start
+
+    log.info("_create_relation: {0:.0f} relations/s".format(relation_count / elapsed))
+
+
+def bench_node_memory(row_count=None):
+
+    import tracemalloc
+
+    from py2neo import Node
+
+    from load_data import Disease, build_entities
+
+    row_count = row_count or config.BATCH_SIZE
+    entities = build_entities(Disease, "Disease", make_entity_frame("Disease", row_count))
+    loader = make_loader()
+
+    tracemalloc.start()
+    start = tracemalloc.take_snapshot()
+    for entity in entities:
+        loader.load_json(entity.to_dict(), "Disease")
+    buffered = tracemalloc.take_snapshot()
+    # the same buffer with py2neo nodes, as it was held before
+    py2neo_nodes = [
+        Node(*nodes.labels, **properties) for nodes in loader.nodeSets.values() for properties in nodes.nodes
+    ]
+    py2neo_buffered = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    node_count = len(py2neo_nodes)
+    record_bytes = sum(stat.size_diff for stat in buffered.compare_to(start, "filename"))
+    py2neo_bytes = sum(stat.size_diff for stat in py2neo_buffered.compare_to(buffered, "filename"))
+    log.info("{0} nodes buffered for {1} rows: {2:.0f} bytes/node (py2neo.Node: {3:.0f} bytes/node on top)".format(
+        node_count, row_count, record_bytes / node_count, py2neo_bytes / node_count))
+
+
+def bench_hash_ids(relation_count=50000):
+
+    from json2graphio import NodeRecord
+    from load_data import TargetCompoundMap
+
+    loader = make_loader()
+    hash_attrs = loader.config_dict_primarykey_generated_hashed_attrs_by_label
+    nodes = []
+    for row in make_target_compound_rows(relation_count):
+        entity = TargetCompoundMap(row)
+        for label, json_data in [(entity.parent_label, entity.parent_json_data),
+                                 (entity.child_label, entity.child_json_data)]:
+            node = loader._adjust_label_name(NodeRecord(label))
+            node.update(json_data)
+            nodes.append(node)
+
+    start = time.perf_counter()
+    for node in nodes:
+        reference_hash_id(node, hash_attrs[node.__primarylabel__])
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for node in nodes:
+        loader._generate_id_attr(node, None)
+    cached_time = time.perf_counter() - start
+
+    hash_func = loader.config_str_primarykey_generated_hash_func
+    log.info("generated ids: uncached md5 {0:.0f} nodes/s, cached {1} {2:.0f} nodes/s ({3:.1f}x)".format(
+        len(nodes) / reference_time, hash_func, len(nodes) / cached_time, reference_time / cached_time))
+
+
+def bench_dedup(batch_count=10):
+
+    from load_data import Disease, TargetCompoundMap, _custom_relation_name_generator, build_entities
+
+    entities = build_entities(Disease, "Disease", make_entity_frame("Disease", batch_count * config.BATCH_SIZE))
+    # every compound/target pair shows up four times
+    entities += [
+        TargetCompoundMap(row) for row in make_target_compound_rows(batch_count * config.BATCH_SIZE // 4) for i in range(4)
+    ]
+
+    for policy in [None, "update", "keep_first"]:
+        loader = make_loader()
+        loader.config_func_custom_relation_name_generator = _custom_relation_name_generator
+        loader.config_str_dedup_policy = policy
+        graph = CypherCountingGraph()
+        duplicates = 0
+        start = time.perf_counter()
+        for batch_start in range(0, len(entities), config.BATCH_SIZE):
+            for entity in entities[batch_start:batch_start + config.BATCH_SIZE]:
+                if hasattr(entity, "is_relationship"):
+                    loader._create_relation(entity.get_parent_node(loader), entity.get_child_node(loader),
+                                            entity.properties, entity.custom_relationship_id)
+                else:
+                    loader.load_json(entity.to_dict(), "Disease")
+            duplicates += sum(loader.get_duplicate_counts().values())
+            loader.flush(graph)
+        elapsed = time.perf_counter() - start
+        log.info("dedup policy {0}: {1} rows sent, {2} duplicates collapsed, {3:.2f}s".format(
+            policy, graph.rows, duplicates, elapsed))
+
+
+def _load_drugbank_in_child(xml_file, output_file, streaming):
+
+    from drugbank_parser import load_drugbank_file
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    load_drugbank_file(None, xml_file, output_file, streaming=streaming)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in KiB on linux
+    return elapsed, baseline_rss * 1024, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_in_child(func, *args):
+    # runs func in a fresh process, so peak memory of one run does not affect the next one
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def bench_drugbank_streaming(drug_count=5000):
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = os.path.join(temp_dir, "drugbank.xml.gz")
+        make_drugbank_xml(xml_file, drug_count)
+        for streaming in [False, True]:
+            output_file = os.path.join(temp_dir, "drugbank-compound-dataset-{0}.csv".format(streaming))
+            elapsed, baseline_rss, peak_rss = run_in_child(_load_drugbank_in_child, xml_file, output_file, streaming)
+            log.info("{0}: {1} drugs in {2:.2f}s, peak RSS {3:.0f} MB ({4:.0f} MB above baseline)".format(
+                "iterparse" if streaming else "ET.parse", drug_count, elapsed, peak_rss / 2 ** 20,
+                (peak_rss - baseline_rss) / 2 ** 20))
+
+
+def bench_drugbank_extraction(drug_count=5000):
+
+    import xml.etree.ElementTree as ET
+
+    from drugbank_parser import parse_drug
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        xml_file = os.path.join(temp_dir, "drugbank.xml.gz")
+        make_drugbank_xml(xml_file, drug_count)
+        with gzip.open(xml_file) as in_file:
+            drugs = list(ET.parse(in_file).getroot())
+
+    start = time.perf_counter()
+    for drug in drugs:
+        reference_parse_drug(drug)
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for drug in drugs:
+        parse_drug(drug)
+    one_pass_time = time.perf_counter() - start
+
+    log.info("drug extraction: findtext {0:.1f} us/drug, one pass {1:.1f} us/drug ({2:.1f}x)".format(
+        reference_time / drug_count * 1e6, one_pass_time / drug_count * 1e6, reference_time / one_pass_time))
+
+
+def bench_mesh_releases(descriptor_counts=(30000, 12000, 10000)):
+
+    from mesh_desc_parser import load_mesh_descriptor_file_list
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for worker_count in [1, len(descriptor_counts)]:
+            files = []
+            for index, descriptor_count in enumerate(descriptor_counts):
+                xml_file = os.path.join(temp_dir, "desc{0}.gz".format(index))
+                if not os.path.exists(xml_file):
+                    make_mesh_xml(xml_file, descriptor_count, seed=index)
+                files.append((xml_file, os.path.join(temp_dir, "terms{0}-{1}.csv".format(index, worker_count)),
+                              os.path.join(temp_dir, "tree-numbers{0}-{1}.csv".format(index, worker_count))))
+            start = time.perf_counter()
+            load_mesh_descriptor_file_list(files, worker_count)
+            elapsed = time.perf_counter() - start
+            log.info("{0} MeSH releases with {1} process(es): {2:.2f}s".format(len(files), worker_count, elapsed))
+
+
+def bench_uberon_xrefs(row_count=100000):
+
+    from uberon_parser import update_mesh_xrefs
+
+    df, tn_to_id = make_xref_frame(row_count)
+
+    # best of a few runs, a single pass takes only a fraction of a second
+    reference_time = vectorized_time = float("inf")
+    for run in range(5):
+        start = time.perf_counter()
+        reference_update_xrefs(df.xref, tn_to_id)
+        reference_time = min(reference_time, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        update_mesh_xrefs(df.xref, tn_to_id)
+        vectorized_time = min(vectorized_time, time.perf_counter() - start)
+
+    log.info("xref update of {0} rows: per row {1:.3f}s, vectorized {2:.3f}s ({3:.1f}x)".format(
+        row_count, reference_time, vectorized_time, reference_time / vectorized_time))
+
+
+def bench_disease_descendants(node_count=20000, query_count=200):
+
+    from disease_ontology_parser import build_descendant_index, filter_nodes_by_ancestor
+
+    child_dict = make_disease_dag(node_count)
+    queries = ["DOID:{0}".format(node) for node in range(0, node_count, node_count // query_count)]
+
+    start = time.perf_counter()
+    for query in queries:
+        set(reference_filter_nodes_by_ancestor(query, child_dict))
+    reference_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    descendant_index = build_descendant_index(child_dict, queries)
+    index_time = time.perf_counter() - start
+    for query in queries:
+        filter_nodes_by_ancestor(query, child_dict, descendant_index)
+    lookup_time = time.perf_counter() - start - index_time
+
+    log.info("{0} descendant queries: recursive {1:.2f}s, index of {2} nodes {3:.2f}s + lookups {4:.4f}s".format(
+        len(queries), reference_time, len(descendant_index), index_time, lookup_time))
+
+
+def _load_disease_in_child(obo_file, output_file, xref_output_file, streaming):
+
+    from disease_ontology_parser import load_disease_file
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if streaming:
+        load_disease_file(obo_file, output_file, xref_output_file)
+    else:
+        reference_load_disease_file(obo_file, output_file, xref_output_file)
+    elapsed = time.perf_counter() - start
+    return elapsed, baseline_rss * 1024, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_disease_obo(term_count=50000):
+
+    try:
+        import obonet
+    except ImportError:
+        obonet = None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        obo_file = os.path.join(temp_dir, "doid.obo")
+        make_obo_file(obo_file, term_count)
+        # the graph based reference needs obonet, which the loader itself does not use anymore
+        for streaming in [False, True] if obonet else [True]:
+            output_files = [os.path.join(temp_dir, "{0}-{1}.csv".format(name, streaming)) for name in ["doid", "doid-xref"]]
+            elapsed, baseline_rss, peak_rss = run_in_child(_load_disease_in_child, obo_file, *output_files, streaming)
+            log.info("{0}: {1} terms in {2:.2f}s, peak RSS {3:.0f} MB ({4:.0f} MB above baseline)".format(
+                "stanza reader" if streaming else "obonet graph", term_count, elapsed, peak_rss / 2 ** 20,
+                (peak_rss - baseline_rss) / 2 ** 20))
+
+
+def _parse_anatomy_in_child(obo_file, streaming):
+
+    from uberon_parser import parse_anatomy_entries
+
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    (parse_anatomy_entries if streaming else reference_parse_anatomy_entries)(obo_file)
+    elapsed = time.perf_counter() - start
+    return elapsed, baseline_rss * 1024, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def bench_uberon_obo(term_count=100000):
+
+    try:
+        import obonet
+    except ImportError:
+        obonet = None
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        obo_file = os.path.join(temp_dir, "basic.obo")
+        make_obo_file(obo_file, term_count, prefix="UBERON", unnamed_ratio=0.01, depiction_ratio=0.01)
+        # the graph based reference needs obonet, which the loader itself does not use anymore
+        for streaming in [False, True] if obonet else [True]:
+            elapsed, baseline_rss, peak_rss = run_in_child(_parse_anatomy_in_child, obo_file, streaming)
+            log.info("{0}: {1} terms in {2:.2f}s, peak RSS {3:.0f} MB ({4:.0f} MB above baseline)".format(
+                "stanza reader" if streaming else "obonet graph", term_count, elapsed, peak_rss / 2 ** 20,
+                (peak_rss - baseline_rss) / 2 ** 20))
+
+
+def bench_downloads(file_count=6, file_size=2 ** 21):
+
+    from download_data import DownloadJob, download_jobs
+
+    rng = numpy.random.RandomState(0)
+    files = {"/file{0}.gz".format(i): rng.bytes(file_size) for i in range(file_count)}
+    http_server, http_url = start_http_stand_in(files, delay=0.002)
+    ftp_server, ftp_url = start_ftp_stand_in(files, delay=0.002)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        manifest_file = os.path.join(temp_dir, "download-manifest.json")
+        for worker_count in [1, 4]:
+            jobs = [DownloadJob(url + path, os.path.join(temp_dir, str(worker_count), url.split(":")[0], path.strip("/")))
+                    for path in files for url in [http_url, ftp_url]]
+            start = time.perf_counter()
+            download_jobs(jobs, worker_count, manifest_file)
+            log.info("{0} files with {1} thread(s): {2:.2f}s".format(len(jobs), worker_count, time.perf_counter() - start))
+
+        # unchanged files cost one round trip each
+        start = time.perf_counter()
+        download_jobs(jobs, 4, manifest_file)
+        log.info("{0} unchanged files: {1:.2f}s".format(len(jobs), time.perf_counter() - start))
+
+    http_server.shutdown()
+    ftp_server.shutdown()
+
+
+def bench_eutils(term_count=20, rate=20):
+
+    from eutils_client import EutilsClient
+
+    terms = ["term {0}[MeSH Terms:noexp]".format(i) for i in range(term_count)]
+    server, base_url = start_eutils_stand_in(rate=rate, fail_every=7, delay=0.2)
+
+    for worker_count in [1, 4]:
+        del server.requests[:]
+        del server.rejected[:]
+        client = EutilsClient(base_url, requests_per_second=rate, worker_count=worker_count, backoff=0.05,
+                              use_history=False)
+        start = time.perf_counter()
+        client.esearch_many(terms, retmax=100)
+        log.info("{0} terms, {1} requests with {2} worker(s): {3:.2f}s, {4} 429s, {5} 503s retried".format(
+            term_count, len(server.requests), worker_count, time.perf_counter() - start,
+            server.rejected.count(429), server.rejected.count(503)))
+        client.close()
+
+    server.shutdown()
+
+
+def bench_eutils_history(pmid_count=200000, rate=20):
+
+    from eutils_client import EutilsClient
+
+    server, base_url = start_eutils_stand_in(rate=rate, delay=0.2)
+    server.get_ids = lambda term: get_stand_in_pmids(term, pmid_count)
+    terms = ["large term", "small term"]
+
+    for use_history in [False, True]:
+        del server.requests[:]
+        client = EutilsClient(base_url, requests_per_second=rate, worker_count=4, backoff=0.05,
+                              use_history=use_history, history_page_size=10000)
+        start = time.perf_counter()
+        # one term at a time, to time the pages of a single query
+        results = [client.search(term, retmax=10000) for term in terms]
+        log.info("{0} ids, {1} requests {2}: {3:.2f}s".format(
+            sum(len(ids) for ids in results), len(server.requests),
+            "from the history server" if use_history else "paged with esearch", time.perf_counter() - start))
+        client.close()
+
+    server.shutdown()
+
+
+def bench_pmid_cache(term_count=20, pmid_count=50000, rate=20):
+
+    import datetime
+    from eutils_client import EutilsClient
+    from pmid_cache import PmidCache, search_cached
+
+    server, base_url = start_eutils_stand_in(rate=rate, delay=0.2)
+    server.get_ids = lambda term: get_stand_in_pmids(term, pmid_count)
+    terms = ["term {0}[MeSH Terms:noexp]".format(i) for i in range(term_count)]
+    client = EutilsClient(base_url, requests_per_second=rate, worker_count=4, backoff=0.05)
+    today = datetime.date(2024, 1, 1)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = PmidCache(os.path.join(temp_dir, "pmid-cache.sqlite"))
+        for label, day, new_terms in [("empty cache", today, []),
+                                      ("within the TTL", today + datetime.timedelta(days=1), []),
+                                      ("after the TTL", today + datetime.timedelta(days=60), ["new term"])]:
+            if new_terms:
+                # a few articles were added to PubMed
+                server.new_ids = {term: [str(40000000 + i)] for i, term in enumerate(terms[:3])}
+                terms = terms + new_terms
+            del server.requests[:]
+            start = time.perf_counter()
+            search_cached(client, cache, terms, retmax=10000, ttl_days=30, today=day)
+            log.info("{0} queries, {1}: {2} requests, {3:.2f}s".format(
+                len(terms), label, len(server.requests), time.perf_counter() - start))
+        cache.close()
+
+    client.close()
+    server.shutdown()
+
+
+BENCHMARKS = {
+    "entity_conversion": bench_entity_conversion,
+    "worker_statements": bench_worker_statements,
+    "create_relation": bench_create_relation,
+    "node_memory": bench_node_memory,
+    "hash_ids": bench_hash_ids,
+    "dedup": bench_dedup,
+    "drugbank_streaming": bench_drugbank_streaming,
+    "drugbank_extraction": bench_drugbank_extraction,
+    "mesh_releases": bench_mesh_releases,
+    "uberon_xrefs": bench_uberon_xrefs,
+    "disease_descendants": bench_disease_descendants,
+    "disease_obo": bench_disease_obo,
+    "uberon_obo": bench_uberon_obo,
+    "downloads": bench_downloads,
+    "eutils": bench_eutils,
+    "eutils_history": bench_eutils_history,
+    "pmid_cache": bench_pmid_cache,
+}
+
+
+if __name__ == "__main__":
+
+    for name in sys.argv[1:] or BENCHMARKS.keys():
+        log.info("Running benchmark '{0}'".format(name))
+        BENCHMARKS[name]()
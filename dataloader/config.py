@@ -24,16 +24,39 @@ class DEFAULT(ConfigBase):
     # you will get feedback on which rows the import failed
     CANCEL_WHOLE_IMPORT_IF_A_WORKER_FAILS = True
 
+    # Parsing processes do not write to the database themselves, they queue their data for <NO_OF_DB_WRITERS> writer processes
+    # The writers coalesce the queued batches and write them every COMMIT_INTERVAL nodes/relations
+    NO_OF_DB_WRITERS = 1
+    # Max. number of batches waiting to be written. Parsing processes block while the queue is full
+    DB_WRITE_QUEUE_SIZE = 20
+    # Seconds a writer waits for new data before writing what it has buffered so far
+    DB_WRITER_FLUSH_TIMEOUT = 5
+
+    # Workers read their rows of a dataset file by seeking to byte offsets from an index sidecar file (<dataset file>.idx)
+    # The index records the offset of every <DATASET_INDEX_INTERVAL>th row and is rebuilt when the dataset file changes
+    USE_DATASET_INDEX = True
+    DATASET_INDEX_INTERVAL = 1000
+
     SCRIPT_DIR = os.path.dirname(
         os.path.realpath(os.path.join(os.getcwd(), os.path.expanduser(__file__)))
     )
 
     # if set to True, the dataset will always be downloaded, regardless of its allready existing
     REDOWNLOAD_DATASET_IF_EXISTENT = False
+    # Number of dataset files downloaded at the same time and the socket timeout in seconds
+    DOWNLOAD_WORKERS = 4
+    DOWNLOAD_TIMEOUT = 60
 
     # Where to store the downloaded dataset
     DATA_BASE_DIR = os.path.join(SCRIPT_DIR, "../dataset/")
 
+    # Preprocessing stages whose input files and config did not change since their last run are skipped.
+    # Their state is kept in the stage manifest. Switch 'FORCE_STAGE_REBUILD' to True to always run all stages
+    STAGE_MANIFEST_FILE = os.path.join(DATA_BASE_DIR, "stage-manifest.json")
+    FORCE_STAGE_REBUILD = False
+    # Size, sha256 and server validators (ETag, Last-Modified, MDTM) of the downloaded dataset files
+    DOWNLOAD_MANIFEST_FILE = os.path.join(DATA_BASE_DIR, "download-manifest.json")
+
     DRUGBANK_HETIONET_DIR = os.path.join(DATA_BASE_DIR, "drugbank")
     DRUGBANK_DOWNLOAD_DIR = os.path.join(DRUGBANK_HETIONET_DIR, "download")
 
@@ -69,6 +92,8 @@ class DEFAULT(ConfigBase):
     DISEASE_DOWNLOAD_URL = "https://github.com/DiseaseOntology/HumanDiseaseOntology/raw/master/src/ontology/doid.obo"
     DISEASE_DOWNLOAD_DIR = os.path.join(DATA_BASE_DIR, "disease_ontology")
     DISEASE_OBO_FILE = os.path.join(DISEASE_DOWNLOAD_DIR, "doid.obo")
+    # Only load the descendants of these DOID terms, e.g. ["DOID:0050117"] for infectious diseases. Empty: load all
+    DISEASE_FILTER_ANCESTORS = []
 
     MESH_DESC_2020_DOWNLOAD_URL = "ftp://nlmpubs.nlm.nih.gov/online/mesh/MESH_FILES/xmlmesh/desc2020.gz"
     MESH_DESC_2005_DOWNLOAD_URL = "ftp://nlmpubs.nlm.nih.gov/online/mesh/1999-2010/xmlmesh/desc2005.gz"
@@ -83,6 +108,10 @@ class DEFAULT(ConfigBase):
     MESH_TREE_NUMBER_2005_FILE = os.path.join(DATA_BASE_DIR, "mesh-tree-numbers-2005.csv")
     MESH_TERM_2002_FILE = os.path.join(DATA_BASE_DIR, "mesh-terms-2002.csv")
     MESH_TREE_NUMBER_2002_FILE = os.path.join(DATA_BASE_DIR, "mesh-tree-numbers-2002.csv")
+    # Tree numbers of all releases and descriptor names compiled into one file, see mesh_lookup.py
+    MESH_LOOKUP_FILE = os.path.join(DATA_BASE_DIR, "mesh-lookup.pkl")
+    # Also write the parsed MeSH descriptors (incl. semantic types and parents) to mesh_<release>.json files
+    MESH_WRITE_JSON = False
 
     UBERON_DOWNLOAD_URL = "http://purl.obolibrary.org/obo/uberon.obo"
     UBERON_EXT_DOWNLOAD_URL = "http://purl.obolibrary.org/obo/uberon/ext.obo"
@@ -101,6 +130,22 @@ class DEFAULT(ConfigBase):
     UBERON_ANATOMY_FILE = os.path.join(DATA_BASE_DIR, 'anatomy.csv')
 
     REGEN_PMID_FILES = False
+    # NCBI E-utilities used for the PMID files. Without an api key NCBI allows 3 requests per second, with one 10.
+    # EUTILS_REQUESTS_PER_SECOND overrides that limit
+    EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
+    EUTILS_API_KEY = None
+    EUTILS_REQUESTS_PER_SECOND = None
+    EUTILS_WORKERS = 3
+    EUTILS_MAX_RETRIES = 5
+    EUTILS_BACKOFF = 1.0
+    EUTILS_TIMEOUT = 60
+    # Fetch the PMIDs of a query from the history server (usehistory=y) in pages of EUTILS_HISTORY_PAGE_SIZE ids
+    # and concurrently. Without it esearch is paged with retstart one page after the other
+    EUTILS_USE_HISTORY = True
+    EUTILS_HISTORY_PAGE_SIZE = 10000
+    # PMIDs per term query, queries fetched less than PMID_CACHE_TTL_DAYS ago are not sent to PubMed again
+    PMID_CACHE_FILE = os.path.join(DATA_BASE_DIR, "pmid-cache.sqlite")
+    PMID_CACHE_TTL_DAYS = 30
     DISEASE_PMID_FILE = os.path.join(DATA_BASE_DIR, "disease-pmids.tsv.gz")
     ANATOMY_PMID_FILE = os.path.join(DATA_BASE_DIR, 'anatomy-pmids.tsv.gz')
     DISEASE_ANATOMY_EDGE_FILE = os.path.join(DATA_BASE_DIR, 'disease-anatomy-dataset.csv')
@@ -208,6 +253,23 @@ class DEFAULT(ConfigBase):
         "Disease": ["doid"],
         "Anatomy": ["uberon_id"]
     }
+    # Hash function for the generated ids. "md5" or "xxh3_128" (faster, needs the xxhash package).
+    # The ids are persisted and nodes are merged on them: switching the hash function for an existing
+    # database creates duplicates of all nodes. See "Generated ids" in the README before changing it
+    JSON2GRAPH_GENERATED_HASH_FUNC = "md5"
+    # Count of generated ids each worker keeps cached
+    JSON2GRAPH_GENERATED_HASH_CACHE_SIZE = 100000
+    # How duplicate nodes and relationships in a batch are collapsed before they are sent to the database.
+    # "update" (same result as merging every duplicate), "keep_first" or None (send all duplicates)
+    JSON2GRAPH_DEDUP_POLICY = "update"
+
+    # Properties to match nodes with, for labels that are start or end of a relationship (see JSON2GRAPH_RELTYPE)
+    # but have no generated hash id. These labels get an index on the properties before loading
+    JSON2GRAPH_INDEXED_ATTRS = {
+        "Gene": ["GeneID"]
+    }
+    # Seconds to wait for newly created indexes/constraints to come online before loading
+    SCHEMA_INDEX_TIMEOUT = 300
 
     JSON2GRAPH_ID_ATTR = {
         "Compound": "compound_id",
@@ -0,0 +1,241 @@
+import collections
+import csv
+import json
+import logging
+import os
+
+import pandas
+from Configs import getConfig
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# Strings pandas.read_csv treats as missing values by default
+NA_VALUES = frozenset(["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan",
+                       "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA", "NULL", "NaN", "n/a", "nan", "null"])
+BOOL_VALUES = {"True": True, "TRUE": True, "true": True, "False": False, "FALSE": False, "false": False}
+
+# columns: header of the dataset file
+# row_count: number of rows that are not completely empty
+# dtypes: dtype hints for pandas.read_csv, so that a slice of the file gets the same column types as the whole file.
+#   bool marks a bool column with missing values, which read_dataset returns as object column of bools and NaN
+# offsets: byte offset of every <interval>th row (row 0, interval, 2 * interval, ...)
+DatasetLayout = collections.namedtuple("DatasetLayout", ["columns", "row_count", "dtypes", "interval", "offsets"])
+
+# how the dtype hints are stored in the index sidecar file
+DTYPE_NAMES = {str: "str", float: "float", bool: "bool"}
+DTYPES_BY_NAME = {name: dtype for dtype, name in DTYPE_NAMES.items()}
+
+
+def _value_kind(value):
+
+    if value in NA_VALUES:
+        return "null"
+    if value in BOOL_VALUES:
+        return "bool"
+    try:
+        int(value)
+        return "int"
+    except ValueError:
+        pass
+    try:
+        float(value)
+        return "float"
+    except ValueError:
+        return "str"
+
+
+def _column_dtype(kinds):
+
+    if "str" in kinds:
+        return str
+    if "bool" in kinds:
+        if kinds - {"bool", "null"}:
+            # pandas keeps the strings of bools mixed with numbers
+            return str
+        # pandas gives bool for slices without missing values, but object for the whole file
+        return bool if "null" in kinds else None
+    if kinds <= {"null"}:
+        # leave it to pandas
+        return None
+    if "float" in kinds or "null" in kinds:
+        return float
+    return None
+
+
+def _iter_records(in_file):
+    # yields (byte offset, raw record) for every non blank record of a binary file handle.
+    # a record is complete when its quotes are balanced, as quoted fields may contain line breaks
+    offset = 0
+    record_offset = 0
+    record = b""
+    for line in in_file:
+        if not record:
+            record_offset = offset
+        record += line
+        offset += len(line)
+        if record.count(b'"') % 2:
+            continue
+        if record.strip(b"\r\n"):
+            yield record_offset, record
+        record = b""
+    if record.strip(b"\r\n"):
+        yield record_offset, record
+
+
+def _split_record(record):
+
+    text = record.decode("utf-8")
+    if '"' not in text:
+        return text.rstrip("\r\n").split("\t")
+    return next(csv.reader([text], delimiter="\t"))
+
+
+def scan_dataset(dataset_file, interval=None):
+    """Stream once over a tab separated dataset file and collect its layout.
+
+    This replaces a full pandas.read_csv when only the row count is needed. The
+    collected dtype hints reproduce the column types pandas would infer for the whole
+    file, which a reader of a single slice could otherwise get wrong (e.g. int vs. float
+    for a column that only has empty cells outside of the slice). The byte offset of
+    every <interval>th row is recorded as well, so readers can seek to their slice.
+    """
+    interval = interval or config.DATASET_INDEX_INTERVAL
+    with open(dataset_file, "rb") as in_file:
+        records = _iter_records(in_file)
+        columns = _split_record(next(records)[1])
+        kinds = [set() for column in columns]
+        offsets = []
+        row_count = 0
+        for row_index, (offset, record) in enumerate(records):
+            if row_index % interval == 0:
+                offsets.append(offset)
+            values = _split_record(record)
+            row_has_value = False
+            for column_kinds, value in zip(kinds, values):
+                kind = _value_kind(value)
+                column_kinds.add(kind)
+                if kind != "null":
+                    row_has_value = True
+            for column_kinds in kinds[len(values):]:
+                column_kinds.add("null")
+            if row_has_value:
+                row_count += 1
+
+    dtypes = {}
+    for column, column_kinds in zip(columns, kinds):
+        # pandas renames empty and duplicate column names, skip hints for those
+        if column == "" or columns.count(column) > 1:
+            continue
+        dtype = _column_dtype(column_kinds)
+        if dtype is not None:
+            dtypes[column] = dtype
+
+    return DatasetLayout(columns, row_count, dtypes, interval, offsets)
+
+
+def get_index_file(dataset_file):
+
+    return dataset_file + ".idx"
+
+
+def load_dataset_index(dataset_file, interval=None):
+    """Get the layout of a dataset file from its index sidecar file (<dataset_file>.idx).
+
+    The sidecar is (re)built with scan_dataset if it is missing or unreadable, was built
+    with another interval or the dataset file changed in size or mtime since.
+    """
+    interval = interval or config.DATASET_INDEX_INTERVAL
+    index_file = get_index_file(dataset_file)
+    stat = os.stat(dataset_file)
+
+    if os.path.isfile(index_file):
+        try:
+            with open(index_file) as in_file:
+                index = json.load(in_file)
+            if (index["size"] == stat.st_size and index["mtime_ns"] == stat.st_mtime_ns and
+                    index["interval"] == interval):
+                dtypes = {column: DTYPES_BY_NAME[name] for column, name in index["dtypes"].items()}
+                return DatasetLayout(index["columns"], index["row_count"], dtypes, index["interval"], index["offsets"])
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            log.warning("Ignore unreadable row index {0}: {1!r}".format(index_file, e))
+
+    log.info("Build row index {0}".format(index_file))
+    layout = scan_dataset(dataset_file, interval)
+    index = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "interval": layout.interval,
+        "columns": layout.columns,
+        "row_count": layout.row_count,
+        "dtypes": {column: DTYPE_NAMES[dtype] for column, dtype in layout.dtypes.items()},
+        "offsets": layout.offsets,
+    }
+    # written next to it and renamed, so an interrupted write does not leave a truncated index
+    temp_file = "{0}.{1}.tmp".format(index_file, os.getpid())
+    with open(temp_file, "w") as out_file:
+        json.dump(index, out_file)
+    os.replace(temp_file, index_file)
+
+    return layout
+
+
+def read_dataset(dataset_file, from_row=None, to_row=None, dtype=None, layout=None):
+    """Read the rows [from_row:to_row] of a tab separated dataset file.
+
+    Only the requested slice is parsed. The rows before it are skipped as raw records,
+    with a layout (see scan_dataset) from the nearest indexed row before the slice
+    instead of from the start of the file. The returned frame keeps the row labels a
+    full read followed by slicing would have.
+    """
+    from_row = from_row or 0
+    nrows = to_row - from_row if to_row is not None else None
+    if layout is not None:
+        dtype = layout.dtypes if dtype is None else dtype
+    bool_columns = []
+    if isinstance(dtype, dict):
+        bool_columns = [column for column, column_dtype in dtype.items() if column_dtype is bool]
+        dtype = {column: object if column_dtype is bool else column_dtype for column, column_dtype in dtype.items()}
+
+    if not from_row:
+        data = pandas.read_csv(dataset_file, sep="\t", nrows=nrows, dtype=dtype)
+    else:
+        if layout is not None and _has_plain_columns(layout.columns):
+            columns = layout.columns
+        else:
+            columns = list(pandas.read_csv(dataset_file, sep="\t", nrows=0).columns)
+        if layout is not None and layout.offsets:
+            checkpoint = min(from_row // layout.interval, len(layout.offsets) - 1)
+            row_offset, skip = layout.offsets[checkpoint], from_row - checkpoint * layout.interval
+        else:
+            # the header is the first record
+            row_offset, skip = 0, from_row + 1
+        with open(dataset_file, "rb") as in_file:
+            # pandas' skiprows counts lines, which are not rows with quoted line breaks or blank lines
+            start = _find_record(in_file, row_offset, skip)
+            if start is None:
+                in_file.seek(0, os.SEEK_END)
+            else:
+                in_file.seek(start)
+            data = pandas.read_csv(in_file, sep="\t", header=None, names=columns, nrows=nrows, dtype=dtype)
+    data.index = pandas.RangeIndex(from_row, from_row + len(data))
+    for column in bool_columns:
+        data[column] = data[column].map(BOOL_VALUES).astype(object)
+
+    return data
+
+
+def _find_record(in_file, record_offset, skip):
+    # byte offset of the record <skip> non blank records after the one at record_offset, None past the end
+    in_file.seek(record_offset)
+    for record_index, (offset, record) in enumerate(_iter_records(in_file)):
+        if record_index == skip:
+            return record_offset + offset
+    return None
+
+
+def _has_plain_columns(columns):
+    # header=None/names=... only reproduces the header of a full read if pandas would not rename any column
+    return "" not in columns and len(set(columns)) == len(columns)
@@ -1,58 +1,112 @@
+import array
+import collections
 import csv
 import io
 import os
 
-import obonet
 import logging
-import pandas as pd
 from Configs import getConfig
 
+from obo_reader import iter_obo_terms
+
 config = getConfig()
 log = logging.getLogger(__name__)
 log.addHandler(logging.StreamHandler())
 log.setLevel(getattr(logging, config.LOG_LEVEL))
 
 
-def build_child_dict(ont):
+# is_a edges of an ontology: term_ids[children[i]] is_a term_ids[parents[i]]
+ParentEdges = collections.namedtuple("ParentEdges", ["term_ids", "children", "parents"])
+
+TERM_TAGS = ["name", "def", "is_a", "xref"]
+
+
+def read_parent_edges(disease_download_file):
+
+    term_ids = []
+    term_indices = {}
+    children = array.array("L")
+    parents = array.array("L")
 
-    # first build dictionary of parents
-    parent_dict = {}
-    for id_, data in ont.nodes(data=True):
-        if "is_a" in data:
-            parent_dict[id_] = data['is_a']
-        else:
-            parent_dict[id_] = []
+    def get_index(term_id):
+        index = term_indices.get(term_id)
+        if index is None:
+            index = term_indices[term_id] = len(term_ids)
+            term_ids.append(term_id)
+        return index
 
-    # build dictionary of children
+    for term in iter_obo_terms(disease_download_file, ["is_a"]):
+        child = get_index(term["id"])
+        for parent in term.get("is_a", []):
+            children.append(child)
+            parents.append(get_index(parent))
+
+    return ParentEdges(term_ids, children, parents)
+
+
+def build_child_dict(parent_edges):
+
+    term_ids = parent_edges.term_ids
     child_dict = {}
-    for child in parent_dict.keys():
-        for parent in parent_dict[child]:
-            if not parent in child_dict:
-                child_dict[parent] = []
-            child_dict[parent].append(child)
+    for child, parent in zip(parent_edges.children, parent_edges.parents):
+        child_dict.setdefault(term_ids[parent], []).append(term_ids[child])
 
     return child_dict
 
 
-def filter_nodes_by_ancestor(disease_id, child_dict):
+def build_descendant_index(child_dict, roots=None):
+    """Map the nodes reachable from roots (default: all nodes with children) to the set of their descendants.
+
+    The DAG is walked iteratively in post-order, so the descendants of a node with several
+    parents are collected once and the depth of the ontology is not limited by the recursion limit.
+    """
+    descendant_index = {}
+    for root in child_dict if roots is None else roots:
+        if root in descendant_index or root not in child_dict:
+            continue
+        # nodes on the stack are skipped as children, which guards against cycles
+        on_stack = {root}
+        stack = [(root, iter(child_dict[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if child in child_dict and child not in descendant_index and child not in on_stack:
+                    on_stack.add(child)
+                    stack.append((child, iter(child_dict[child])))
+                    break
+            else:
+                stack.pop()
+                on_stack.discard(node)
+                descendants = set(child_dict[node])
+                for child in child_dict[node]:
+                    descendants.update(descendant_index.get(child, ()))
+                descendant_index[node] = frozenset(descendants)
 
-    children = []
+    return descendant_index
 
-    if not disease_id in child_dict:
-        return [disease_id]
-    else:
-        for child in child_dict[disease_id]:
-            children += [child] + filter_nodes_by_ancestor(child, child_dict)
 
-    return children
+def filter_nodes_by_ancestor(disease_id, child_dict, descendant_index=None):
 
+    if descendant_index is None:
+        descendant_index = build_descendant_index(child_dict, [disease_id])
 
-def get_infectious_diseases(ont, child_dict):
+    # a node without children is its own filter
+    return descendant_index.get(disease_id) or frozenset([disease_id])
+
+
+def get_infectious_diseases(child_dict):
 
     infectious_disease_id = "DOID:0050117"
     return filter_nodes_by_ancestor(infectious_disease_id, child_dict)
 
 
+def get_disease_filter(child_dict, ancestors):
+
+    descendant_index = build_descendant_index(child_dict, ancestors)
+    return frozenset().union(*[filter_nodes_by_ancestor(ancestor, child_dict, descendant_index)
+                               for ancestor in ancestors])
+
+
 def parse_ontology_entry(do_id, do_data):
 
     link = "http://www.disease-ontology.org/?id={0}".format(do_id)
@@ -71,12 +125,9 @@ def parse_ontology_entry(do_id, do_data):
     return row
 
 
-def parse_ontology_xref(do_id, do_data, xref_list):
+def parse_ontology_xref(do_id, do_data):
 
-    if 'xref' in do_data:
-        for xref in do_data['xref']:
-            entry = {'doid': do_id, 'xref': xref}
-            xref_list.append(entry)
+    return [[do_id, xref] for xref in do_data.get('xref', [])]
 
 
 def get_disease_parents(do_id, do_data):
@@ -92,29 +143,28 @@ def get_disease_parents(do_id, do_data):
 
 def load_disease_file(disease_download_file, disease_output_file, disease_xref_output_file):
 
-    # parse ontology
-    ont = obonet.read_obo(disease_download_file)
-
-    # build child node lookup dictionary
-    child_dict = build_child_dict(ont)
-
     # build filter
-    #do_filter = get_infectious_diseases(ont, child_dict)
     do_filter = None
-
-    xref_list = []
-    with open(disease_output_file, "w", newline='') as outfile:
+    if config.DISEASE_FILTER_ANCESTORS:
+        # only the filter needs the hierarchy, so the parent edges are read in an extra pass
+        child_dict = build_child_dict(read_parent_edges(disease_download_file))
+        do_filter = get_disease_filter(child_dict, config.DISEASE_FILTER_ANCESTORS)
+        log.info("Filter diseases by ancestors {0}: {1} diseases".format(config.DISEASE_FILTER_ANCESTORS, len(do_filter)))
+
+    with open(disease_output_file, "w", newline='') as outfile, \
+            open(disease_xref_output_file, "w", newline='') as xref_outfile:
         writer = csv.writer(outfile, delimiter="\t")
         writer.writerow(["doid", "name", "definition", "parents", "link", "source", "license"])
-        for id_, data in ont.nodes(data=True):
+        # same format as DataFrame.to_csv(sep="\t", index=False)
+        xref_writer = csv.writer(xref_outfile, delimiter="\t", lineterminator="\n")
+        xref_writer.writerow(["doid", "xref"])
+        for data in iter_obo_terms(disease_download_file, TERM_TAGS):
+            id_ = data["id"]
             if do_filter == None or id_ in do_filter:
                 row = parse_ontology_entry(id_, data)
                 writer.writerow(row)
 
-                parse_ontology_xref(id_, data, xref_list)
-
-    xref_df = pd.DataFrame(xref_list)
-    xref_df.to_csv(disease_xref_output_file, sep="\t", index=False)
+                xref_writer.writerows(parse_ontology_xref(id_, data))
 
 
 if __name__ == "__main__":
@@ -1,16 +1,27 @@
+import collections
+import concurrent.futures
+import ftplib
+import functools
+import hashlib
+import json
 import logging
 import os
-import shutil
+import urllib.error
+import urllib.parse
 import urllib.request
 import zipfile
 
 from Configs import getConfig
 
+from stage_manifest import load_manifest, save_manifest
+
 config = getConfig()
 log = logging.getLogger(__name__)
 log.addHandler(logging.StreamHandler())
 log.setLevel(getattr(logging, config.LOG_LEVEL))
 
+CHUNK_SIZE = 2 ** 20
+
 
 def get_drugbank_download_url(url, url_path):
 
@@ -25,118 +36,263 @@ def get_drugbank_download_url(url, url_path):
     return download_url
 
 
-def download_file(url, dest_file):
-
-    log.info("downloading {0} to {1}".format(url, dest_file))
-    with urllib.request.urlopen(url) as response:
-        with open(dest_file, "wb") as out_file:
-            shutil.copyfileobj(response, out_file)
-
-
-def download_ftp_file(url, dest_file):
-
-    log.info("downloading {0} to {1}".format(url, dest_file))
-    urllib.request.urlretrieve(url, dest_file)
-
-
-def download_drugbank_dataset():
+# url may be a callable that returns the url, it is called in the download worker
+DownloadJob = collections.namedtuple("DownloadJob", ["url", "dest_file"])
 
-    log.info("downloading DrugBank compound dataset")
-    download_url = get_drugbank_download_url(config.DRUGBANK_VOCABULARY_URL, config.DRUGBANK_VOCABULARY_URL_PATH)
 
-    if not os.path.isdir(config.DRUGBANK_DOWNLOAD_DIR):
-        os.makedirs(config.DRUGBANK_DOWNLOAD_DIR)
+def get_part_file(dest_file):
 
-    download_file(download_url, config.DRUGBANK_VOCABULARY_ZIP_FILE)
+    return dest_file + ".part"
 
-    with zipfile.ZipFile(config.DRUGBANK_VOCABULARY_ZIP_FILE, 'r') as zip_ref:
-        zip_ref.extractall(config.DRUGBANK_DOWNLOAD_DIR)
 
+def get_part_meta_file(dest_file):
+    # validators of the server file a .part file belongs to, a download is only resumed if they still match
+    return dest_file + ".part.json"
 
-def download_disease_dataset():
 
-    log.info("downloading disease ontology dataset")
-    if not os.path.isdir(config.DISEASE_DOWNLOAD_DIR):
-        os.makedirs(config.DISEASE_DOWNLOAD_DIR)
+def _read_part(dest_file):
+    # returns (size, sha256 of the content, validators) of a partial download
+    part_file = get_part_file(dest_file)
+    meta_file = get_part_meta_file(dest_file)
+    if not os.path.isfile(part_file) or not os.path.isfile(meta_file):
+        return 0, hashlib.sha256(), {}
+    with open(meta_file) as in_file:
+        validators = json.load(in_file)
+    sha256 = hashlib.sha256()
+    with open(part_file, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return os.path.getsize(part_file), sha256, validators
 
-    download_file(config.DISEASE_DOWNLOAD_URL, config.DISEASE_OBO_FILE)
 
+def _start_part(dest_file, validators):
 
-def download_uberon_dataset():
+    with open(get_part_meta_file(dest_file), "w") as out_file:
+        json.dump(validators, out_file)
+    return open(get_part_file(dest_file), "wb")
 
-    log.info("downloading uberon ontology dataset")
-    if not os.path.isdir(config.UBERON_DOWNLOAD_DIR):
-        os.makedirs(config.UBERON_DOWNLOAD_DIR)
 
-    download_file(config.HUMAN_CONSTRAINTS_URL, config.HUMAN_CONSTRAINTS_FILE)
-    download_file(config.UBERON_DOWNLOAD_URL, config.UBERON_OBO_FILE)
-    download_file(config.UBERON_BASIC_DOWNLOAD_URL, config.UBERON_BASIC_OBO_FILE)
-    download_file(config.UBERON_EXT_DOWNLOAD_URL, config.UBERON_EXT_OBO_FILE)
+def _finish_part(url, dest_file, sha256, expected_size, validators, entry):
 
+    part_file = get_part_file(dest_file)
+    size = os.path.getsize(part_file)
+    if expected_size is not None and size != expected_size:
+        # the .part file is kept, the next run resumes it
+        raise IOError("Incomplete download of {0}: got {1} of {2} bytes".format(url, size, expected_size))
+    new_entry = {"url": url, "size": size, "sha256": sha256.hexdigest()}
+    new_entry.update(validators)
 
-def download_mesh_descriptors():
+    if is_downloaded(dest_file, entry) and entry is not None and entry["sha256"] == new_entry["sha256"]:
+        # same content, keep the file (and its mtime) so the stages reading it are not rebuilt
+        log.info("{0} is unchanged".format(url))
+        os.remove(part_file)
+    else:
+        os.replace(part_file, dest_file)
+    os.remove(get_part_meta_file(dest_file))
 
-    log.info("downloading mesh descriptor dataset")
-    if not os.path.isdir(config.MESH_DOWNLOAD_DIR):
-        os.makedirs(config.MESH_DOWNLOAD_DIR)
+    return new_entry
 
-    download_ftp_file(config.MESH_DESC_2020_DOWNLOAD_URL, config.MESH_DESC_FILE)
-    download_ftp_file(config.MESH_DESC_2005_DOWNLOAD_URL, config.MESH_DESC_2005_FILE)
-    download_ftp_file(config.MESH_DESC_2002_DOWNLOAD_URL, config.MESH_DESC_2002_FILE)
 
+def download_file(url, dest_file, entry=None):
+    """Download url to dest_file and return its manifest entry (url, size, sha256, etag, last_modified).
 
-def download_ttd_dataset():
+    The content is written to a .part file that is renamed to dest_file when complete. A .part
+    file left over by an interrupted run is resumed with a range request, if the server still
+    has the same version of the file (If-Range). If dest_file matches its previous manifest
+    entry, the request is conditional (If-None-Match, If-Modified-Since) and an unchanged
+    file costs one round trip.
+    """
+    offset, sha256, validators = _read_part(dest_file)
+    # weak ETags can not be used with If-Range
+    etag = validators.get("etag")
+    if_range = etag if etag and not etag.startswith("W/") else validators.get("last_modified")
+    headers = {}
+    if offset and if_range:
+        log.info("resuming download of {0} at {1} bytes".format(url, offset))
+        headers["Range"] = "bytes={0}-".format(offset)
+        headers["If-Range"] = if_range
+    elif is_downloaded(dest_file, entry) and entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
 
-    log.info("downloading ttd dataset")
-    if not os.path.isdir(config.TTD_DOWNLOAD_DIR):
-        os.makedirs(config.TTD_DOWNLOAD_DIR)
-
-    download_file(config.TTD_TARGET_DOWNLOAD_URL, config.TTD_TARGET_DOWNLOAD_FILE)
-    download_file(config.TTD_DRUG_DOWNLOAD_URL, config.TTD_DRUG_DOWNLOAD_FILE)
-    download_file(config.TTD_DRUG_XREF_DOWNLOAD_URL, config.TTD_DRUG_XREF_DOWNLOAD_FILE)
-    download_file(config.TTD_TARGET_DRUG_MAPPING_URL, config.TTD_TARGET_DRUG_MAPPING_DOWNLOAD_FILE)
-
-
-def download_disease_gene_associations():
-    if not os.path.isdir(config.DISEASE_ASSOCIATES_GENE_DIR):
-        os.makedirs(config.DISEASE_ASSOCIATES_GENE_DIR)
-
-    download_file(config.DISEASE_ASSOCIATES_GENE_URL, config.DISEASE_ASSOCIATES_GENE_FILE)
+    log.info("downloading {0} to {1}".format(url, dest_file))
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=config.DOWNLOAD_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            log.info("{0} is unchanged".format(url))
+            return dict(entry, url=url)
+        if e.code != 416 or not offset:
+            raise
+        # the range does not fit the file anymore, start over
+        os.remove(get_part_file(dest_file))
+        return download_file(url, dest_file, entry)
+
+    with response:
+        validators = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+        content_length = response.headers.get("Content-Length")
+        if response.status == 206:
+            # Content-Range: bytes <offset>-<end>/<total>
+            total = response.headers.get("Content-Range", "").rpartition("/")[2]
+            expected_size = int(total) if total.isdigit() else None
+            out_file = open(get_part_file(dest_file), "ab")
+        else:
+            expected_size = int(content_length) if content_length else None
+            sha256 = hashlib.sha256()
+            out_file = _start_part(dest_file, validators)
+        with out_file:
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b""):
+                out_file.write(chunk)
+                sha256.update(chunk)
+
+    return _finish_part(url, dest_file, sha256, expected_size, validators, entry)
+
+
+def _get_ftp_validators(ftp, path):
+    # SIZE and MDTM are extensions (RFC 3659) a server may not support
+    validators = {"ftp_size": None, "mdtm": None}
+    try:
+        validators["ftp_size"] = ftp.size(path)
+        validators["mdtm"] = ftp.voidcmd("MDTM " + path).split()[-1]
+    except ftplib.error_perm as e:
+        log.debug("FTP server does not support SIZE/MDTM for {0}: {1}".format(path, e))
+    return validators
+
+
+def download_ftp_file(url, dest_file, entry=None):
+    """Download an ftp:// url to dest_file and return its manifest entry (url, size, sha256, mdtm).
+
+    Like download_file, a .part file of the same server file (SIZE and MDTM) is resumed with REST
+    and dest_file is not fetched again if SIZE and MDTM match its previous manifest entry.
+    """
+    parsed_url = urllib.parse.urlparse(url)
+    log.info("downloading {0} to {1}".format(url, dest_file))
+    with ftplib.FTP(timeout=config.DOWNLOAD_TIMEOUT) as ftp:
+        ftp.connect(parsed_url.hostname, parsed_url.port or 21)
+        ftp.login(parsed_url.username or "anonymous", parsed_url.password or "")
+        ftp.voidcmd("TYPE I")
+        validators = _get_ftp_validators(ftp, parsed_url.path)
+        expected_size = validators["ftp_size"]
+        if (validators["mdtm"] and is_downloaded(dest_file, entry) and entry is not None
+                and all(entry.get(key) == value for key, value in validators.items())):
+            log.info("{0} is unchanged".format(url))
+            return dict(entry, url=url)
+
+        offset, sha256, part_validators = _read_part(dest_file)
+        if offset and validators["mdtm"] and part_validators == validators and offset < (expected_size or 0):
+            log.info("resuming download of {0} at {1} bytes".format(url, offset))
+            out_file = open(get_part_file(dest_file), "ab")
+        else:
+            offset = 0
+            sha256 = hashlib.sha256()
+            out_file = _start_part(dest_file, validators)
+
+        def write(chunk):
+            out_file.write(chunk)
+            sha256.update(chunk)
+
+        with out_file:
+            ftp.retrbinary("RETR " + parsed_url.path, write, blocksize=CHUNK_SIZE, rest=offset or None)
+
+    return _finish_part(url, dest_file, sha256, expected_size, validators, entry)
+
+
+def get_download_jobs():
+
+    drugbank_url = functools.partial(get_drugbank_download_url, config.DRUGBANK_VOCABULARY_URL,
+                                     config.DRUGBANK_VOCABULARY_URL_PATH)
+    return [
+        DownloadJob(drugbank_url, config.DRUGBANK_VOCABULARY_ZIP_FILE),
+        DownloadJob(config.TTD_TARGET_DOWNLOAD_URL, config.TTD_TARGET_DOWNLOAD_FILE),
+        DownloadJob(config.TTD_DRUG_DOWNLOAD_URL, config.TTD_DRUG_DOWNLOAD_FILE),
+        DownloadJob(config.TTD_DRUG_XREF_DOWNLOAD_URL, config.TTD_DRUG_XREF_DOWNLOAD_FILE),
+        DownloadJob(config.TTD_TARGET_DRUG_MAPPING_URL, config.TTD_TARGET_DRUG_MAPPING_DOWNLOAD_FILE),
+        DownloadJob(config.DISEASE_DOWNLOAD_URL, config.DISEASE_OBO_FILE),
+        DownloadJob(config.MESH_DESC_2020_DOWNLOAD_URL, config.MESH_DESC_FILE),
+        DownloadJob(config.MESH_DESC_2005_DOWNLOAD_URL, config.MESH_DESC_2005_FILE),
+        DownloadJob(config.MESH_DESC_2002_DOWNLOAD_URL, config.MESH_DESC_2002_FILE),
+        DownloadJob(config.HUMAN_CONSTRAINTS_URL, config.HUMAN_CONSTRAINTS_FILE),
+        DownloadJob(config.UBERON_DOWNLOAD_URL, config.UBERON_OBO_FILE),
+        DownloadJob(config.UBERON_BASIC_DOWNLOAD_URL, config.UBERON_BASIC_OBO_FILE),
+        DownloadJob(config.UBERON_EXT_DOWNLOAD_URL, config.UBERON_EXT_OBO_FILE),
+        DownloadJob(config.DISEASE_ASSOCIATES_GENE_URL, config.DISEASE_ASSOCIATES_GENE_FILE),
+    ]
+
+
+def is_downloaded(dest_file, entry):
+
+    if not os.path.isfile(dest_file):
+        return False
+    # files of a download without a manifest are trusted
+    return entry is None or entry["size"] == os.path.getsize(dest_file)
+
+
+def run_download_job(job, entry):
+
+    url = job.url() if callable(job.url) else job.url
+    os.makedirs(os.path.dirname(job.dest_file), exist_ok=True)
+    if url.startswith("ftp://"):
+        return download_ftp_file(url, job.dest_file, entry)
+    return download_file(url, job.dest_file, entry)
+
+
+def download_jobs(jobs, worker_count, manifest_file=None):
+    """Run the download jobs with worker_count threads and record the downloaded files in the download manifest.
+
+    Returns the list of files whose content changed. Failed downloads are logged and the first
+    error is raised once all other jobs are done, their .part files are resumed by the next run.
+    """
+    manifest_file = manifest_file or config.DOWNLOAD_MANIFEST_FILE
+    manifest = load_manifest(manifest_file)
+    changed_files = []
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=worker_count) as executor:
+        futures = {executor.submit(run_download_job, job, manifest.get(job.dest_file)): job for job in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            job = futures[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                log.error("Download of {0} failed: {1}".format(job.dest_file, e))
+                errors.append(e)
+                continue
+            previous_entry = manifest.get(job.dest_file)
+            if previous_entry is None or previous_entry["sha256"] != entry["sha256"]:
+                changed_files.append(job.dest_file)
+            manifest[job.dest_file] = entry
+            # saved after every file, so a failing job does not lose the records of the finished ones
+            save_manifest(manifest, manifest_file)
+
+    if errors:
+        raise errors[0]
+    return changed_files
 
 
 def download():
 
     if not os.path.isdir(config.DATA_BASE_DIR):
         os.makedirs(config.DATA_BASE_DIR)
+
+    jobs = get_download_jobs()
     if not config.REDOWNLOAD_DATASET_IF_EXISTENT:
-        if os.path.isfile(config.DRUGBANK_COMPOUND_FILE):
+        manifest = load_manifest(config.DOWNLOAD_MANIFEST_FILE)
+        jobs = [job for job in jobs if not is_downloaded(job.dest_file, manifest.get(job.dest_file))]
+        if not jobs:
             log.info(
                 "Skip downloading dataset. Seems to be already existing. Switch 'REDOWNLOAD_DATASET_IF_EXISTENT' to True to force download."
             )
             return
 
-    log.info("Start downloading DrugBank Dataset...")
-    download_drugbank_dataset()
-    log.info("Finished downloading DrugBank Dataset...")
-
-    log.info("Start downloading TTD Dataset...")
-    download_ttd_dataset()
-    log.info("Finished downloading TTD Dataset...")
-
-    log.info("Start downloading disease ontology Dataset...")
-    download_disease_dataset()
-    log.info("Finished downloading disease ontology Dataset...")
-
-    log.info("Start downloading mesh descriptor Dataset")
-    download_mesh_descriptors()
-    log.info("Finished downloading mesh descriptor Dataset")
+    log.info("Start downloading {0} dataset files with {1} thread(s)...".format(len(jobs), config.DOWNLOAD_WORKERS))
+    changed_files = download_jobs(jobs, config.DOWNLOAD_WORKERS)
+    log.info("Finished downloading dataset files, {0} of {1} changed: {2}".format(
+        len(changed_files), len(jobs), ", ".join(os.path.basename(file_name) for file_name in changed_files)))
 
-    log.info("Start downloading uberon ontology Dataset...")
-    download_uberon_dataset()
-    log.info("Finished downloading uberon ontology Dataset...")
-    log.info("Start downloading disease gene associations Dataset...")
-    download_disease_gene_associations()
-    log.info("Finished downloading disease gene associations Dataset...")
+    if config.DRUGBANK_VOCABULARY_ZIP_FILE in changed_files or not os.path.isfile(config.DRUGBANK_VOCABULARY_FILE):
+        with zipfile.ZipFile(config.DRUGBANK_VOCABULARY_ZIP_FILE, 'r') as zip_ref:
+            zip_ref.extractall(config.DRUGBANK_DOWNLOAD_DIR)
 
 
 if __name__ == "__main__":
@@ -4,59 +4,125 @@ import xml.etree.ElementTree as ET
 
 import pandas
 
+ns = '{http://www.drugbank.ca}'
+
+
+def iter_drugbank_xml(xml_file):
+    # Stream the <drug> elements of a DrugBank xml file. Every drug is dropped from the tree
+    # once the caller is done with it, so only one drug record is held in memory at a time
+
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        # drugs are the direct children of the root element
+        if depth == 1 and elem.tag == ns + 'drug':
+            yield elem
+            root.clear()
+
+
+# direct children of <drug> that are read with their text
+TEXT_TAGS = {ns + tag: key for tag, key in [("name", "name"), ("description", "description"),
+                                             ("cas-number", "cas_number"), ("indication", "indication"),
+                                             ("mechanism-of-action", "mechanism")]}
+# <external-identifiers> resources that go into the row
+RESOURCES = {"ChEBI": "chebi_id", "PubChem Compound": "pubchem_id", "KEGG Compound": "kegg_id",
+             "KEGG Drug": "kegg_drug_id", "ChemSpider": "chemspider_id"}
+
+
+def _find_keyed_texts(container, item_tag, key_tag, value_tag, texts):
+    # One sweep over e.g. <external-identifiers>, collecting the first value text per key, like
+    # findtext("{item_tag}[{key_tag}='key']/{value_tag}") does for a single key
+    for item in container:
+        if item.tag != item_tag:
+            continue
+        value = item.find(value_tag)
+        if value is None:
+            continue
+        for key in item:
+            if key.tag == key_tag:
+                texts.setdefault("".join(key.itertext()), value.text or "")
+
+
+def parse_drug(drug):
+
+    # Walks the children of the drug once. The row is the same as the one findtext/findall
+    # with the paths of the fields would give
+    texts = {}
+    groups = []
+    atc_codes = []
+    categories = []
+    properties = {}
+    identifiers = {}
+    brands = []
+    synonyms = []
+    product_names = []
+    drugbank_id = None
+    for child in drug:
+        tag = child.tag
+        if tag in TEXT_TAGS:
+            texts.setdefault(TEXT_TAGS[tag], child.text or "")
+        elif tag == ns + "drugbank-id":
+            if drugbank_id is None and child.get("primary") == "true":
+                drugbank_id = child.text or ""
+        elif tag == ns + "groups":
+            groups.extend(group.text for group in child if group.tag == ns + "group")
+        elif tag == ns + "atc-codes":
+            atc_codes.extend(code.get("code") for code in child if code.tag == ns + "atc-code")
+        elif tag == ns + "categories":
+            categories.extend(x.findtext(ns + "category") for x in child if x.tag == ns + "category")
+        elif tag == ns + "calculated-properties":
+            _find_keyed_texts(child, ns + "property", ns + "kind", ns + "value", properties)
+        elif tag == ns + "external-identifiers":
+            _find_keyed_texts(child, ns + "external-identifier", ns + "resource", ns + "identifier", identifiers)
+        elif tag == ns + "international-brands":
+            brands.extend(brand.text for brand in child if brand.tag == ns + "international-brand")
+        elif tag == ns + "synonyms":
+            synonyms.extend(synonym.text for synonym in child
+                            if synonym.tag == ns + "synonym" and synonym.get("language") == "English")
+        elif tag == ns + "products":
+            product_names.extend(name.text for product in child if product.tag == ns + "product"
+                                 for name in product if name.tag == ns + "name")
+
+    row = collections.OrderedDict()
+    row['type'] = drug.get('type')
+    row['drugbank_id'] = drugbank_id
+    row['name'] = texts.get('name')
+    row['description'] = texts.get('description')
+    row['cas_number'] = texts.get('cas_number')
+    row['groups'] = groups
+    row['atc_codes'] = atc_codes
+    row['categories'] = categories
+    row['inchi'] = properties.get('InChI')
+    row['inchikey'] = properties.get('InChIKey')
+    row['indication'] = texts.get('indication')
+    row['mechanism'] = texts.get('mechanism')
+    for resource, key in RESOURCES.items():
+        row[key] = identifiers.get(resource)
+
+    # Add drug aliases
+    aliases = set(brands + synonyms + product_names)
+    aliases.add(row['name'])
+    row['aliases'] = sorted(aliases)
+    row['license'] = 'het CC0 1.0'
+    row['source'] = 'DrugBank'
+    row['source_url'] = "https://www.drugbank.ca/drugs/{0}".format(row['drugbank_id'])
 
-def parse_drugbank_xml(root):
+    return row
 
-    ns = '{http://www.drugbank.ca}'
-    inchikey_template = "{ns}calculated-properties/{ns}property[{ns}kind='InChIKey']/{ns}value"
-    inchi_template = "{ns}calculated-properties/{ns}property[{ns}kind='InChI']/{ns}value"
 
+def parse_drugbank_xml(root):
+
+    # root can be the root element of a parsed tree or an iterator of drug elements (see iter_drugbank_xml)
     rows = list()
-    for i, drug in enumerate(root):
-        row = collections.OrderedDict()
+    for drug in root:
         assert drug.tag == ns + 'drug'
-        row['type'] = drug.get('type')
-        row['drugbank_id'] = drug.findtext(ns + "drugbank-id[@primary='true']")
-        row['name'] = drug.findtext(ns + "name")
-        row['description'] = drug.findtext(ns + "description")
-        row['cas_number'] = drug.findtext(ns + "cas-number")
-        row['groups'] = [group.text for group in
-                         drug.findall("{ns}groups/{ns}group".format(ns=ns))]
-        row['atc_codes'] = [code.get('code') for code in
-                            drug.findall("{ns}atc-codes/{ns}atc-code".format(ns=ns))]
-        row['categories'] = [x.findtext(ns + 'category') for x in
-                             drug.findall("{ns}categories/{ns}category".format(ns=ns))]
-        row['inchi'] = drug.findtext(inchi_template.format(ns=ns))
-        row['inchikey'] = drug.findtext(inchikey_template.format(ns=ns))
-        row['indication'] = drug.findtext(ns + "indication")
-        row['mechanism'] = drug.findtext(ns + "mechanism-of-action")
-        row['chebi_id'] = drug.findtext(
-            "{ns}external-identifiers/{ns}external-identifier[{ns}resource='ChEBI']/{ns}identifier".format(ns=ns))
-        row['pubchem_id'] = drug.findtext(
-            "{ns}external-identifiers/{ns}external-identifier[{ns}resource='PubChem Compound']/{ns}identifier".format(ns=ns))
-        row['kegg_id'] = drug.findtext(
-            "{ns}external-identifiers/{ns}external-identifier[{ns}resource='KEGG Compound']/{ns}identifier".format(ns=ns))
-        row['kegg_drug_id'] = drug.findtext(
-            "{ns}external-identifiers/{ns}external-identifier[{ns}resource='KEGG Drug']/{ns}identifier".format(ns=ns))
-        row['chemspider_id'] = drug.findtext(
-            "{ns}external-identifiers/{ns}external-identifier[{ns}resource='ChemSpider']/{ns}identifier".format(ns=ns))
-
-        # Add drug aliases
-        aliases = {
-            elem.text for elem in
-            drug.findall("{ns}international-brands/{ns}international-brand".format(ns=ns)) +
-            drug.findall("{ns}synonyms/{ns}synonym[@language='English']".format(ns=ns)) +
-            drug.findall("{ns}international-brands/{ns}international-brand".format(ns=ns)) +
-            drug.findall("{ns}products/{ns}product/{ns}name".format(ns=ns))
-
-        }
-        aliases.add(row['name'])
-        row['aliases'] = sorted(aliases)
-        row['license'] = 'het CC0 1.0'
-        row['source'] = 'DrugBank'
-        row['source_url'] = "https://www.drugbank.ca/drugs/{0}".format(row['drugbank_id'])
-
-        rows.append(row)
+        rows.append(parse_drug(drug))
 
     return rows
 
@@ -78,13 +144,14 @@ def load_drugbank_vocab_file(drugbank_vocabulary_file):
     return df
 
 
-def load_drugbank_file(drugbank_vocabulary_file, drugbank_xml_file, compound_output_file):
+def load_drugbank_file(drugbank_vocabulary_file, drugbank_xml_file, compound_output_file, streaming=True):
 
+    # streaming=False parses the whole xml tree into memory first (several GB for a full DrugBank release)
     with gzip.open(drugbank_xml_file) as xml_file:
-        tree = ET.parse(xml_file)
-    root = tree.getroot()
-
-    rows = parse_drugbank_xml(root)
+        if streaming:
+            rows = parse_drugbank_xml(iter_drugbank_xml(xml_file))
+        else:
+            rows = parse_drugbank_xml(ET.parse(xml_file).getroot())
     rows = list(map(collapse_list_values, rows))
 
     columns = ['drugbank_id', 'name', 'type', 'groups', 'cas_number', 'atc_codes', 'categories', 'inchikey', 'inchi', 'description', 'indication', 'mechanism',
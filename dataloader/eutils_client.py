@@ -0,0 +1,194 @@
+import concurrent.futures
+import logging
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+import requests
+from Configs import getConfig
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# Client for the NCBI E-utilities: https://www.ncbi.nlm.nih.gov/books/NBK25497/
+# Without an api key NCBI allows 3 requests per second, with an api key 10.
+
+RETRY_STATUS_CODES = frozenset([429, 500, 502, 503, 504])
+
+
+class EutilsError(Exception):
+    pass
+
+
+class TokenBucket:
+    """Thread safe token bucket: acquire() blocks until a token is available.
+
+    Tokens are added at rate per second up to capacity, so at most capacity requests
+    can be sent at once and rate per second on average.
+    """
+
+    def __init__(self, rate, capacity=1):
+
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Hand out no tokens for the next seconds, e.g. after the server asked to slow down."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class EutilsClient:
+    """Rate limited E-utilities client that shares one pooled session between its worker threads.
+
+    esearch_many runs the terms on worker_count threads, the pages of the history server are
+    fetched by another worker_count threads shared by all terms.
+    """
+
+    def __init__(self, base_url=None, api_key=None, requests_per_second=None, worker_count=None,
+                 max_retries=None, backoff=None, timeout=None, use_history=None, history_page_size=None):
+
+        self.base_url = (base_url or config.EUTILS_BASE_URL).rstrip("/") + "/"
+        self.api_key = api_key if api_key is not None else config.EUTILS_API_KEY
+        if requests_per_second is None:
+            requests_per_second = config.EUTILS_REQUESTS_PER_SECOND or (10 if self.api_key else 3)
+        self.worker_count = worker_count or config.EUTILS_WORKERS
+        self.max_retries = max_retries if max_retries is not None else config.EUTILS_MAX_RETRIES
+        self.backoff = backoff if backoff is not None else config.EUTILS_BACKOFF
+        self.timeout = timeout or config.EUTILS_TIMEOUT
+        self.use_history = use_history if use_history is not None else config.EUTILS_USE_HISTORY
+        self.history_page_size = history_page_size or config.EUTILS_HISTORY_PAGE_SIZE
+        self.rate_limiter = TokenBucket(requests_per_second)
+
+        self.page_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.worker_count)
+        self.session = requests.Session()
+        # one connection for each term and each page thread
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=2 * self.worker_count)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+
+        self.page_executor.shutdown()
+        self.session.close()
+
+    def get(self, utility, params):
+        """GET <base_url><utility>.fcgi and return the parsed XML.
+
+        Retries with exponential backoff on 429, 5xx, connection errors and on error
+        responses without the expected content, honouring Retry-After.
+        """
+        params = dict(params)
+        if self.api_key:
+            params["api_key"] = self.api_key
+        url = "{0}{1}.fcgi".format(self.base_url, utility)
+
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            status_code = None
+            retry_after = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+                    xml = ET.fromstring(response.content)
+                    # NCBI reports some backend failures in the body of a 200 response
+                    if xml.find("ERROR") is None:
+                        return xml
+                    error = EutilsError(xml.findtext("ERROR"))
+                else:
+                    status_code = response.status_code
+                    error = EutilsError("HTTP {0}".format(status_code))
+                    retry_after = response.headers.get("Retry-After")
+            except (requests.ConnectionError, requests.Timeout, ET.ParseError) as e:
+                error = e
+            if attempt == self.max_retries:
+                break
+            delay = self.backoff * 2 ** attempt
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+            log.debug("{0} failed ({1}), retry in {2:.1f}s".format(utility, error, delay))
+            if status_code == 429:
+                # the limit is shared by all workers, so all of them slow down
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+        raise EutilsError("{0} failed after {1} attempts: {2}".format(utility, self.max_retries + 1, error))
+
+    def esearch(self, term, retmax=100, db="pubmed", params=None):
+        """Return the ids of all records matching term, fetched in pages of retmax ids.
+
+        params are additional esearch parameters, e.g. datetype, mindate and maxdate.
+        """
+        ids = []
+        retstart = 0
+        count = 1
+        while retstart < count:
+            xml = self.get("esearch", dict(params or {}, db=db, term=term, retmax=retmax, retstart=retstart))
+            count = int(xml.findtext("Count"))
+            ids += [xml_id.text for xml_id in xml.findall("IdList/Id")]
+            retstart += retmax
+        return ids
+
+    def esearch_history(self, term, db="pubmed", params=None):
+        """Return the ids of all records matching term, using the history server.
+
+        The search runs once with usehistory=y and returns the first page of history_page_size
+        ids, the other pages are fetched concurrently from the stored result with efetch.
+        """
+        page_size = self.history_page_size
+        xml = self.get("esearch", dict(params or {}, db=db, term=term, usehistory="y", retmax=page_size))
+        count = int(xml.findtext("Count"))
+        web_env = xml.findtext("WebEnv")
+        query_key = xml.findtext("QueryKey")
+        ids = [xml_id.text for xml_id in xml.findall("IdList/Id")]
+        if count > len(ids) and not (web_env and query_key):
+            raise EutilsError("esearch returned no WebEnv for {0}".format(term))
+
+        def fetch_page(retstart):
+            page = self.get("efetch", {"db": db, "WebEnv": web_env, "query_key": query_key,
+                                       "rettype": "uilist", "retmode": "xml",
+                                       "retstart": retstart, "retmax": page_size})
+            return [xml_id.text for xml_id in page.iter("Id")]
+
+        for page_ids in self.page_executor.map(fetch_page, range(len(ids), count, page_size)):
+            ids += page_ids
+        if len(ids) != count:
+            raise EutilsError("history server returned {0} of {1} ids for {2}".format(len(ids), count, term))
+        return ids
+
+    def search(self, term, retmax=100, db="pubmed", params=None):
+        """Return the ids of all records matching term, from the history server if use_history is set.
+
+        Falls back to paging with esearch if the history server fails.
+        """
+        if self.use_history:
+            try:
+                return self.esearch_history(term, db, params)
+            except (EutilsError, requests.RequestException) as e:
+                log.warning("History server failed for {0} ({1}), page with esearch".format(term, e))
+        return self.esearch(term, retmax, db, params)
+
+    def esearch_many(self, terms, retmax=100, db="pubmed", params=None):
+        """search for each of terms with worker_count threads, returns the id lists in the order of terms."""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.worker_count) as executor:
+            return list(executor.map(lambda term: self.search(term, retmax, db, params), terms))
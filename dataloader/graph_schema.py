@@ -0,0 +1,65 @@
+import logging
+
+from Configs import getConfig
+from py2neo import Graph
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+
+def get_schema_definitions():
+    """Derive the schema the loader relies on from the config.
+
+    Returns a dict {label: (property names, unique)}. Labels with a generated hash id
+    get a uniqueness constraint on the id attribute, as nodes are merged on it. Start and
+    end labels of the configured relationship types that are not created by this loader
+    get an index on the properties relationships are matched with.
+    """
+    id_attr = config.JSON2GRAPH_GENERATED_HASH_ID_ATTR_NAME
+    definitions = {label: ([id_attr], True) for label in config.JSON2GRAPH_GENERATED_HASH_IDS}
+
+    labels_by_reltype_name = {label.upper(): label for label in definitions}
+    labels_by_reltype_name.update({label.upper(): label for label in config.JSON2GRAPH_INDEXED_ATTRS})
+    for reltype_key in config.JSON2GRAPH_RELTYPE:
+        for reltype_label_name in reltype_key.split(":"):
+            label = labels_by_reltype_name.get(reltype_label_name)
+            if label is None:
+                log.warning("No merge properties known for label '{0}' of relationship '{1}'. Skip index.".format(
+                    reltype_label_name, reltype_key))
+            elif label not in definitions:
+                definitions[label] = (list(config.JSON2GRAPH_INDEXED_ATTRS[label]), False)
+
+    return definitions
+
+
+def create_schema(graph: Graph):
+    """Create all indexes and uniqueness constraints once and wait for them to come online.
+
+    Existing indexes and constraints are kept. This runs before any data is loaded, so
+    the batch loading path does not need any schema round trips.
+    """
+    for label, (properties, unique) in get_schema_definitions().items():
+        property_keys = tuple(properties)
+        if property_keys in _get_property_keys(graph.schema.get_uniqueness_constraints(label)):
+            log.debug("Uniqueness constraint on :{0}{1} exists".format(label, property_keys))
+        elif property_keys in _get_property_keys(graph.schema.get_indexes(label)):
+            if unique:
+                # neo4j refuses to create a constraint on properties that are already indexed
+                log.warning("Index on :{0}{1} exists. Keep it instead of creating a uniqueness constraint.".format(
+                    label, property_keys))
+        elif unique:
+            log.info("Create uniqueness constraint on :{0}{1}".format(label, property_keys))
+            graph.schema.create_uniqueness_constraint(label, *property_keys)
+        else:
+            log.info("Create index on :{0}{1}".format(label, property_keys))
+            graph.schema.create_index(label, *property_keys)
+
+    log.info("Wait for indexes to come online...")
+    graph.run("CALL db.awaitIndexes({0})".format(config.SCHEMA_INDEX_TIMEOUT)).close()
+
+
+def _get_property_keys(schema_entries):
+    # py2neo lists uniqueness constraints by their single property name and indexes by tuples of property names
+    return {(entry,) if isinstance(entry, str) else tuple(entry) for entry in schema_entries}
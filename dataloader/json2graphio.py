@@ -1,13 +1,79 @@
+import functools
 import hashlib
 import json
 import uuid
 
 from graphio import NodeSet, RelationshipSet
-from py2neo import Graph, Node
+from graphio.objects.relationship import Relationship
+from py2neo import Graph
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 # i know this is a mess. the great refactoring is coming...
 
 
+class NodeRecord(object):
+    # Lightweight node used while building the graph. Supports the parts of the py2neo.Node interface
+    # Json2graphio and its modifier hooks use (labels, item access, dict(node)).
+    # Only the property dict ends up in the NodeSets, graphio serializes nothing else
+    __slots__ = (
+        "labels",
+        "properties",
+        "__primarylabel__",
+        "__primarykey__",
+        "_is_collectionhub",
+        "override_reltype",
+    )
+
+    def __init__(self, *labels, **properties):
+        self.labels = list(labels)
+        self.properties = properties
+
+    def add_label(self, label):
+        if label not in self.labels:
+            self.labels.append(label)
+
+    def clear_labels(self):
+        self.labels = []
+
+    def keys(self):
+        return self.properties.keys()
+
+    def get(self, key, default=None):
+        return self.properties.get(key, default)
+
+    def update(self, properties):
+        self.properties.update(properties)
+        if None in self.properties.values():
+            # like with py2neo, None removes the property. in place, as the dict may be referenced elsewhere
+            for key in [key for key, value in self.properties.items() if value is None]:
+                del self.properties[key]
+
+    def __getitem__(self, key):
+        return self.properties[key]
+
+    def __setitem__(self, key, value):
+        if value is None:
+            self.properties.pop(key, None)
+        else:
+            self.properties[key] = value
+
+    def __contains__(self, key):
+        return key in self.properties
+
+    def __iter__(self):
+        return iter(self.properties)
+
+    def __len__(self):
+        return len(self.properties)
+
+    def __repr__(self):
+        return "NodeRecord({0}, {1})".format(self.labels, self.properties)
+
+
 class Json2graphio(object):
     config_bool_capitalize_labels = False
     # Override generated label names (which are based on json attr names)
@@ -24,6 +90,12 @@ class Json2graphio(object):
     config_dict_primarykey_attr_by_label = None
     config_dict_primarykey_generated_hashed_attrs_by_label = None
     config_str_primarykey_generated_attr_name = "_id"
+    # Hash function for ids generated from a list of attributes (see config_dict_primarykey_generated_hashed_attrs_by_label)
+    # "md5" or "xxh3_128" (needs the xxhash package). xxh3_128 is much faster, but generates other ids than md5.
+    # Do not switch it for a database that already holds nodes with md5 ids, as these would not be matched anymore
+    config_str_primarykey_generated_hash_func = "md5"
+    # Max count of cached generated ids. The same nodes are often hashed over and over, e.g. endpoints of relations
+    config_int_primarykey_generated_hash_cache_size = 100000
     # Collection hubs node label name. 'LIST_MEMBER_LABEL' can be used as placeholders var. e.g. "{LIST_MEMBER_LABEL}_Collection"
     config_str_collection_anchor_label = "{LIST_MEMBER_LABEL}Collection"
     config_list_collection_anchor_extra_labels = ["CollectionHub"]
@@ -40,6 +112,13 @@ class Json2graphio(object):
     config_func_node_post_modifier = None
     config_func_node_pre_modifier = None
     config_graphio_batch_size = 10000
+    # Collapse duplicate nodes (same merge key values) and relationships (same set, start and end node)
+    # in the buffer, so they are not sent to the database over and over.
+    # "update": apply the duplicates the way MERGE would. Node properties are updated with the ones of the
+    #   duplicate, relationship properties are replaced by the ones of the duplicate
+    # "keep_first": ignore the duplicates
+    # None: no deduplication
+    config_str_dedup_policy = "update"
     config_dict_create_merge_depending_scheme = None
     config_dict_property_to_extra_node = None
     # config_dict_interfold_json_attr
@@ -73,6 +152,21 @@ class Json2graphio(object):
         self.config_dict_json_attr_to_reltype_instead_of_label = {}
         self.config_list_drop_reltypes = []
         self._blocked_reltypes = []
+        self._reset_dedup()
+        self.invalidate_caches()
+
+    def __setattr__(self, name, value):
+        # cached label and merge key lookups are derived from the config. drop them when the config is reassigned
+        if name.startswith("config_"):
+            self.invalidate_caches()
+        object.__setattr__(self, name, value)
+
+    def invalidate_caches(self):
+        # Call this after modifying a config dict in place
+        object.__setattr__(self, "_label_cache", {})
+        object.__setattr__(self, "_merge_keys_cache", {})
+        object.__setattr__(self, "_hash_attrs_cache", {})
+        object.__setattr__(self, "_hash_id_cache", None)
 
     def load_json(self, data, parent_label_name=None):
         if isinstance(data, str):
@@ -91,9 +185,47 @@ class Json2graphio(object):
         for rels in self.relationshipSets.values():
             rels.merge(graph, batch_size=self.config_graphio_batch_size)
 
+    def clear(self):
+        # Drop the buffered nodes and relationships.
+        # The set definitions (labels, rel types, merge keys) and blocked reltypes are kept for the next batch
+        for nodes in self.nodeSets.values():
+            nodes.nodes = []
+        for rels in self.relationshipSets.values():
+            rels.relationships = []
+        self._reset_dedup()
+
+    def _reset_dedup(self):
+        # positions of the buffered nodes/relationships by set identifier and dedup key
+        self._node_positions = {}
+        self._relationship_positions = {}
+        # count of collapsed duplicates by set identifier
+        self._duplicate_counts = {}
+
+    def get_duplicate_counts(self):
+        # Count of duplicates collapsed per node/relationship set since the last clear()
+        counts = {}
+        for identifier, count in self._duplicate_counts.items():
+            if identifier in self.nodeSets:
+                name = ":".join(sorted(self.nodeSets[identifier].labels))
+            else:
+                rels = self.relationshipSets[identifier]
+                name = "({})-[{}]->({})".format(
+                    ":".join(sorted(rels.start_node_labels)),
+                    rels.rel_type,
+                    ":".join(sorted(rels.end_node_labels)),
+                )
+            counts[name] = counts.get(name, 0) + count
+        return counts
+
+    def flush(self, graph: Graph):
+        # Merge the buffered nodes and relationships and drop them afterwards,
+        # so the next merge only sends what was added since
+        self.merge(graph)
+        self.clear()
+
     def create(self, graph: Graph):
         for nodes in self.nodeSets.values():
-            nodes.create(graph, batch_size=self.config_graphio_batch_size)
+            self._create_nodes(nodes, graph)
         for rels in self.relationshipSets.values():
             rels.create(graph, batch_size=self.config_graphio_batch_size)
 
@@ -101,14 +233,14 @@ class Json2graphio(object):
         # ToDo: make this switch tree more elegant. this is ugly
         for nodes in self.nodeSets.values():
             if nodes.labels in self.config_dict_create_merge_depending_scheme["create"]:
-                nodes.create(graph, batch_size=self.config_graphio_batch_size)
+                self._create_nodes(nodes, graph)
             elif (
                 nodes.labels in self.config_dict_create_merge_depending_scheme["merge"]
             ):
                 nodes.merge(graph, batch_size=self.config_graphio_batch_size)
             else:
                 if default == "create":
-                    nodes.create(graph, batch_size=self.config_graphio_batch_size)
+                    self._create_nodes(nodes, graph)
                 else:
                     nodes.merge(graph, batch_size=self.config_graphio_batch_size)
 
@@ -128,10 +260,130 @@ class Json2graphio(object):
                 else:
                     rels.merge(graph, batch_size=self.config_graphio_batch_size)
 
+    def _create_nodes(self, nodes: NodeSet, graph: Graph):
+        # NodeSet.create() needs py2neo nodes, but the buffer only holds property dicts
+        node_set = NodeSet(nodes.labels, merge_keys=nodes.merge_keys)
+        node_set.add_nodes(nodes.nodes)
+        node_set.create(graph, batch_size=self.config_graphio_batch_size)
+
     def create_indexes(self, graph: Graph):
         for rels in self.relationshipSets.values():
             rels.create_index(graph)
 
+    def get_payload(self):
+        # Export the buffered node and relationship sets as plain picklable data,
+        # e.g. to hand them over to another process which loads them with add_payload()
+        node_sets = [
+            (list(nodes.labels), list(nodes.merge_keys), list(nodes.nodes))
+            for nodes in self.nodeSets.values()
+        ]
+        relationship_sets = [
+            (
+                rels.rel_type,
+                list(rels.start_node_labels),
+                list(rels.end_node_labels),
+                list(rels.start_node_properties),
+                list(rels.end_node_properties),
+                list(rels.relationships),
+            )
+            for rels in self.relationshipSets.values()
+        ]
+        return node_sets, relationship_sets
+
+    def add_payload(self, payload) -> int:
+        # Add a payload created by get_payload() to the buffered sets.
+        # Payloads of the same set are coalesced into one set. Returns the count of added nodes and relationships
+        node_sets, relationship_sets = payload
+        count = 0
+        for labels, merge_keys, nodes in node_sets:
+            nodeset_identifier = (frozenset(labels), tuple(merge_keys))
+            if not nodeset_identifier in self.nodeSets:
+                self.nodeSets[nodeset_identifier] = NodeSet(labels, merge_keys=merge_keys)
+            for properties in nodes:
+                count += self._append_node(nodeset_identifier, properties)
+        for (
+            rel_type,
+            start_node_labels,
+            end_node_labels,
+            start_node_properties,
+            end_node_properties,
+            relationships,
+        ) in relationship_sets:
+            relationshipset_identifier = (
+                rel_type,
+                frozenset(start_node_labels),
+                frozenset(end_node_labels),
+                tuple(start_node_properties),
+                tuple(end_node_properties),
+            )
+            if not relationshipset_identifier in self.relationshipSets:
+                self.relationshipSets[relationshipset_identifier] = RelationshipSet(
+                    rel_type=rel_type,
+                    start_node_labels=frozenset(start_node_labels),
+                    end_node_labels=frozenset(end_node_labels),
+                    start_node_properties=start_node_properties,
+                    end_node_properties=end_node_properties,
+                )
+            for rel in relationships:
+                count += self._append_relationship(relationshipset_identifier, rel)
+        return count
+
+    def _append_node(self, nodeset_identifier, properties) -> int:
+        # Add the node properties to the buffer, unless they are a duplicate. Returns the count of added nodes
+        nodes = self.nodeSets[nodeset_identifier]
+        if self.config_str_dedup_policy is None:
+            nodes.nodes.append(properties)
+            return 1
+        dedup_key = tuple(properties.get(key) for key in nodes.merge_keys)
+        if None in dedup_key:
+            # can not be merged anyway. leave it to the database to complain
+            nodes.nodes.append(properties)
+            return 1
+        positions = self._node_positions.setdefault(nodeset_identifier, {})
+        position = positions.get(dedup_key)
+        if position is None:
+            positions[dedup_key] = len(nodes.nodes)
+            nodes.nodes.append(properties)
+            return 1
+        self._duplicate_counts[nodeset_identifier] = (
+            self._duplicate_counts.get(nodeset_identifier, 0) + 1
+        )
+        if self.config_str_dedup_policy == "update":
+            nodes.nodes[position].update(properties)
+        return 0
+
+    def _append_relationship(self, relationshipset_identifier, rel) -> int:
+        # Add a graphio relationship to the buffer, unless it is a duplicate. Returns the count of added relationships
+        rels = self.relationshipSets[relationshipset_identifier]
+        if self.config_str_dedup_policy is None:
+            rels.relationships.append(rel)
+            return 1
+        dedup_key = (
+            tuple(rel.start_node_properties.items()),
+            tuple(rel.end_node_properties.items()),
+        )
+        positions = self._relationship_positions.setdefault(
+            relationshipset_identifier, {}
+        )
+        position = positions.get(dedup_key)
+        if position is None:
+            positions[dedup_key] = len(rels.relationships)
+            rels.relationships.append(rel)
+            return 1
+        self._duplicate_counts[relationshipset_identifier] = (
+            self._duplicate_counts.get(relationshipset_identifier, 0) + 1
+        )
+        if self.config_str_dedup_policy == "update":
+            rels.relationships[position] = rel
+        return 0
+
+    def build_node(self, label_name, json_data) -> NodeRecord:
+        # Build the node for a flat json object (only basic type values) the same way load_json() does,
+        # without adding it to a NodeSet. Used to create relations between nodes from different sources
+        node = self._adjust_label_name(NodeRecord(label_name))
+        node.update(json_data)
+        return self._generate_id_attr(node, json_data)
+
     def _generate_id_attr(self, node, json_data):
         if (
             node.__primarylabel__
@@ -151,15 +403,9 @@ class Json2graphio(object):
                 ).hexdigest()
             elif isinstance(hash_attrs, list):
                 # generate a hash based on specific node properties
-                id_hash = hashlib.md5()
-
-                node_dict = dict(node)
-                for key in sorted(node_dict.keys()):
-                    if key in hash_attrs:
-                        id_hash.update(node_dict[key].encode())
                 node[
                     self.config_str_primarykey_generated_attr_name
-                ] = id_hash.hexdigest()
+                ] = self._get_hash_id(node, hash_attrs)
             if hash_attrs is None:
                 # generate a random hash
                 node[self.config_str_primarykey_generated_attr_name] = uuid.uuid4().hex
@@ -167,14 +413,57 @@ class Json2graphio(object):
             node.__primarykey__ = self.config_str_primarykey_generated_attr_name
         return node
 
-    def _adjust_label_name(self, node: Node) -> str:
+    def _get_hash_id(self, node, hash_attrs):
+        # the id is the hash of the values of the hash attrs the node has, in the order of the sorted attr names
+        label = node.__primarylabel__
+        if not label in self._hash_attrs_cache:
+            self._hash_attrs_cache[label] = sorted(set(hash_attrs))
+        values = tuple(map(node.get, self._hash_attrs_cache[label]))
+        if self._hash_id_cache is None:
+            self._hash_id_cache = functools.lru_cache(
+                maxsize=self.config_int_primarykey_generated_hash_cache_size
+            )(self._hash_values)
+        return self._hash_id_cache(values)
+
+    def _hash_values(self, values):
+        if self.config_str_primarykey_generated_hash_func == "md5":
+            id_hash = hashlib.md5()
+        elif self.config_str_primarykey_generated_hash_func == "xxh3_128":
+            if xxhash is None:
+                raise ImportError("Hash function 'xxh3_128' needs the xxhash package")
+            id_hash = xxhash.xxh3_128()
+        else:
+            raise ValueError(
+                "Unknown hash function '{}'".format(
+                    self.config_str_primarykey_generated_hash_func
+                )
+            )
+        for value in values:
+            if value is not None:
+                id_hash.update(value.encode())
+        return id_hash.hexdigest()
+
+    def _adjust_label_name(self, node: NodeRecord) -> NodeRecord:
         label_name = list(node.labels)[0]
         node.clear_labels()
         if callable(self.config_func_label_name_generator_func):
             custom_name = self.config_func_label_name_generator_func(label_name)
             if custom_name is not None:
                 return custom_name
+        if not label_name in self._label_cache:
+            self._label_cache[label_name] = self._resolve_label_name(label_name)
+        label_name_adjusted, extra_props = self._label_cache[label_name]
+        # add extra props as configured by caller
+        for extra_prop, extra_val in extra_props.items():
+            node[extra_prop] = extra_val
+        node.add_label(label_name_adjusted)
+        node.__primarylabel__ = label_name_adjusted
+        return node
+
+    def _resolve_label_name(self, label_name):
+        # returns the adjusted label name and the extra props for nodes with this label
         label_name_adjusted = label_name
+        extra_props = {}
         if label_name in self.config_dict_json_attr_to_reltype_instead_of_label:
             label_name_adjusted = self.config_dict_json_attr_to_reltype_instead_of_label[
                 label_name
@@ -185,18 +474,13 @@ class Json2graphio(object):
                 label_name_adjusted = label_name_override_config
             elif isinstance(label_name_override_config, dict):
                 label_name_adjusted = list(label_name_override_config.keys())[0]
-                # add extra props as configured by caller
                 extra_props = list(label_name_override_config.values())[0]
-                for extra_prop, extra_val in extra_props.items():
-                    node[extra_prop] = extra_val
         label_name_adjusted = (
             label_name_adjusted.capitalize()
             if self.config_bool_capitalize_labels
             else label_name_adjusted
         )
-        node.add_label(label_name_adjusted)
-        node.__primarylabel__ = label_name_adjusted
-        return node
+        return label_name_adjusted, extra_props
 
     def _is_basic_type(self, val):
         if isinstance(val, (str, int, float, bool)):
@@ -211,7 +495,7 @@ class Json2graphio(object):
             return True
         return False
 
-    def _create_relation(self, parent_node: Node, child_node: Node, relation_props={}, relationshipset_identifier=None):
+    def _create_relation(self, parent_node: NodeRecord, child_node: NodeRecord, relation_props={}, relationshipset_identifier=None):
 
         if parent_node is None or child_node is None:
             return None
@@ -264,19 +548,23 @@ class Json2graphio(object):
                 )
         # add relationship to set if not blocked by caller config
         if not relationshipset_identifier in self._blocked_reltypes:
-            self.relationshipSets[relationshipset_identifier].add_relationship(
+            rels = self.relationshipSets[relationshipset_identifier]
+            rel = Relationship(
+                rels.start_node_labels,
+                rels.end_node_labels,
                 start_node_properties={
-                    key: val
-                    for key, val in dict(parent_node).items()
-                    if key in self._get_merge_keys(parent_node)
+                    key: parent_node[key]
+                    for key in self._get_merge_keys(parent_node)
+                    if key in parent_node
                 },
                 end_node_properties={
-                    key: val
-                    for key, val in dict(child_node).items()
-                    if key in self._get_merge_keys(child_node)
+                    key: child_node[key]
+                    for key in self._get_merge_keys(child_node)
+                    if key in child_node
                 },
                 properties=relation_props,
             )
+            self._append_relationship(relationshipset_identifier, rel)
 
     def _add_node(self, node):
         # create nodeSet if necessary
@@ -286,21 +574,26 @@ class Json2graphio(object):
             self.nodeSets[labels] = NodeSet(
                 list(labels), merge_keys=self._get_merge_keys(node)
             )
-        # add node to nodeset
-        self.nodeSets[labels].nodes.append(node)
+        # add node to nodeset. graphio only needs the properties
+        self._append_node(labels, node.properties)
 
     def _get_merge_keys(self, node):
+        # the returned list may be shared between calls. do not modify it
         labels = node.__primarylabel__
         if hasattr(node, "_is_collectionhub"):
             return ["id"]
+        if labels in self._merge_keys_cache:
+            return self._merge_keys_cache[labels]
         if labels in self.config_dict_primarykey_attr_by_label:
             merge_keys = self.config_dict_primarykey_attr_by_label[labels]
         elif labels in self.config_dict_primarykey_generated_hashed_attrs_by_label:
             merge_keys = self.config_str_primarykey_generated_attr_name
         else:
-            merge_keys = list(dict(node).keys())
+            # depends on the properties of the node, so this can not be cached per label
+            return list(dict(node).keys())
         if not isinstance(merge_keys, list):
             merge_keys = [merge_keys]
+        self._merge_keys_cache[labels] = merge_keys
         return merge_keys
 
     def _adjust_property_name(self, label, property_name):
@@ -319,7 +612,7 @@ class Json2graphio(object):
 
     def _create_collection_hub_node(self, member_label_name, hub_id):
         hub_node_label = self._get_hub_node_label_name(member_label_name)
-        hub_node = Node(hub_node_label, id=hub_id)
+        hub_node = NodeRecord(hub_node_label, id=hub_id)
         hub_node._is_collectionhub = True
         hub_node.__primarylabel__ = hub_node_label
         hub_node.__primarykey__ = "id"
@@ -367,7 +660,7 @@ class Json2graphio(object):
                 del val[folding_attr]
             return val
 
-    def _jsondict2subgraph(self, label_name: str, json_data, parent_node=None) -> Node:
+    def _jsondict2subgraph(self, label_name: str, json_data, parent_node=None) -> NodeRecord:
         """[summary]
 
         Arguments:
@@ -379,7 +672,7 @@ class Json2graphio(object):
         if self._is_empty(json_data):
             return None
         if label_name is not None:
-            node = self._adjust_label_name(Node(label_name))
+            node = self._adjust_label_name(NodeRecord(label_name))
             label_name_adjusted = node.__primarylabel__
 
             if label_name_adjusted in self.config_dict_primarykey_attr_by_label:
@@ -4,16 +4,19 @@ import functools
 import logging
 import multiprocessing
 import os
+import queue
+import time
 from typing import Any, Dict, List
 
 import pandas
 from Configs import getConfig
 from pebble import ProcessPool
-from py2neo import Node
 
 from compound_parser import load_compounds
+from dataset_reader import DatasetLayout, load_dataset_index, read_dataset, scan_dataset
 from disease_ontology_parser import load_disease_file
-from json2graphio import Json2graphio
+from graph_schema import create_schema
+from json2graphio import Json2graphio, NodeRecord
 from compound_parser import load_compounds
 from ttd_target_parser import load_target_file
 from disease_ontology_parser import load_disease_file
@@ -25,7 +28,21 @@ config = getConfig()
 log = logging.getLogger(__name__)
 log.addHandler(logging.StreamHandler())
 log.setLevel(getattr(logging, config.LOG_LEVEL))
-graph = config.get_graph()
+# the database connection is opened on first use (see get_graph), so importing this module does not need a database
+graph = None
+
+# Set in parsing worker processes (see worker_task_init). In single process mode data is written directly
+db_write_queue = None
+db_writer_failed = None
+# Tells a DB writer process that no more payloads will follow
+DB_WRITER_STOP = "STOP"
+
+
+def get_graph():
+    global graph
+    if graph is None:
+        graph = config.get_graph()
+    return graph
 
 
 class Entity(object):
@@ -38,10 +55,13 @@ class Entity(object):
                  row: pandas.Series,
                  label=None,
                  name=None,
-                 parser=None):
+                 parser=None,
+                 properties: Dict[str, Any] = None):
 
         self._raw_data_csv_row = row
-        self.properties = {}
+        # properties can be handed in precomputed (see parse_entity_properties_batch),
+        # otherwise the parser extracts them from the row
+        self.properties = properties
         self.label = label
         self.name = name
         parser(self)
@@ -57,7 +77,9 @@ class EntityParser(object):
     def __init__(self, entity: Entity):
 
         self.entity = entity
-        self.parse_entity_properties()
+        if self.entity.properties is None:
+            self.entity.properties = {}
+            self.parse_entity_properties()
 
     def parse_entity_properties(self):
 
@@ -69,13 +91,44 @@ class EntityParser(object):
                 self.entity.properties[prop_name] = prop_val
 
 
+def parse_entity_properties_batch(data: pandas.DataFrame, entity_name: str) -> List[Dict[str, Any]]:
+    """Columnar counterpart of EntityParser.parse_entity_properties.
+
+    Converts a whole batch of rows into property dicts in one pass, with the null mask
+    computed once for the frame instead of calling pandas.isna per cell.
+    """
+    columns = list(config.ENTITY_PROPERTY_COLUMNS[entity_name])
+    frame = data[columns]
+    values = frame.to_numpy(dtype=object)
+    not_null = frame.notna().to_numpy()
+
+    return [
+        {column: value for column, value, keep in zip(columns, row_values, row_not_null) if keep}
+        for row_values, row_not_null in zip(values, not_null)
+    ]
+
+
+def build_entities(entity, entity_name: str, data: pandas.DataFrame) -> list:
+    """Turn a batch of dataset rows into entity objects.
+
+    Node entities get their properties from parse_entity_properties_batch, so the
+    entity classes only act as thin views on the precomputed dicts.
+    """
+    rows = data.to_dict("records")
+    if issubclass(entity, Entity):
+        properties = parse_entity_properties_batch(data, entity_name)
+        return [entity(row, properties=props) for row, props in zip(rows, properties)]
+
+    return [entity(row) for row in rows]
+
+
 class Compound(Entity):
 
-    def __init__(self, row: pandas.Series):
+    def __init__(self, row: pandas.Series, properties: Dict[str, Any] = None):
 
         label = "Compound"
         name = "Compound"
-        super(Compound, self).__init__(row, label=label, name=name, parser=CompoundParser)
+        super(Compound, self).__init__(row, label=label, name=name, parser=CompoundParser, properties=properties)
 
 
 class CompoundParser(EntityParser):
@@ -87,10 +140,10 @@ class CompoundParser(EntityParser):
 
 class Target(Entity):
 
-    def __init__(self, row: pandas.Series):
+    def __init__(self, row: pandas.Series, properties: Dict[str, Any] = None):
 
         label = "Target"
-        super(Target, self).__init__(row, label=label, name=label, parser=TargetParser)
+        super(Target, self).__init__(row, label=label, name=label, parser=TargetParser, properties=properties)
 
 
 class TargetParser(EntityParser):
@@ -102,10 +155,10 @@ class TargetParser(EntityParser):
 
 class Anatomy(Entity):
 
-    def __init__(self, row: pandas.Series):
+    def __init__(self, row: pandas.Series, properties: Dict[str, Any] = None):
 
         label = "Anatomy"
-        super(Anatomy, self).__init__(row, label=label, name=label, parser=AnatomyParser)
+        super(Anatomy, self).__init__(row, label=label, name=label, parser=AnatomyParser, properties=properties)
 
 
 class AnatomyParser(EntityParser):
@@ -122,11 +175,9 @@ class TargetCompoundMap():
         self._raw_data_csv_row = row
 
         self.parent_label = "Compound"
-        self.parent_node = None
         self.parent_json_data = {}
 
         self.child_label = "Target"
-        self.child_node = None
         self.child_json_data = {}
 
         self.properties = {}
@@ -138,27 +189,11 @@ class TargetCompoundMap():
 
     def get_parent_node(self, data_loader):
 
-        node = data_loader._adjust_label_name(Node(self.parent_label))
-
-        for key, value in self.parent_json_data.items():
-            node[key] = value
-
-        label_name_adjusted = node.__primarylabel__
-        node = data_loader._generate_id_attr(node, self.parent_json_data)
-
-        return node
+        return data_loader.build_node(self.parent_label, self.parent_json_data)
 
     def get_child_node(self, data_loader):
 
-        node = data_loader._adjust_label_name(Node(self.child_label))
-
-        for key, value in self.child_json_data.items():
-            node[key] = value
-
-        label_name_adjusted = node.__primarylabel__
-        node = data_loader._generate_id_attr(node, self.child_json_data)
-
-        return node
+        return data_loader.build_node(self.child_label, self.child_json_data)
 
 
 class TargetCompoundMapParser():
@@ -174,12 +209,10 @@ class TargetCompoundMapParser():
         if isinstance(ttd_drug_id, float):
             ttd_drug_id = ""
 
-        self.entity.parent_node = Node(self.entity.parent_label)
         self.entity.parent_json_data = {"drugbank_id": drugbank_id,
                                         "ttd_id": ttd_drug_id}
 
         child_id = self.entity._raw_data_csv_row["ttd_id"]
-        self.entity.child_node = Node(self.entity.child_label)
         self.entity.child_json_data = {"ttd_id": child_id}
 
         for prop_name in ['moa', 'activity', 'reference']:
@@ -193,8 +226,8 @@ class TargetCompoundMapParser():
             moa = self.entity.properties['moa']
 
         self.entity.custom_relationship_id = (
-            frozenset(self.entity.parent_node.labels),
-            frozenset(self.entity.child_node.labels),
+            frozenset([self.entity.parent_label]),
+            frozenset([self.entity.child_label]),
             moa
         )
 
@@ -206,11 +239,9 @@ class DiseaseAnatomyMap():
         self._raw_data_csv_row = row
 
         self.parent_label = "Disease"
-        self.parent_node = None
         self.parent_json_data = {}
 
         self.child_label = "Anatomy"
-        self.child_node = None
         self.child_json_data = {}
 
         self.properties = {}
@@ -222,27 +253,11 @@ class DiseaseAnatomyMap():
 
     def get_parent_node(self, data_loader):
 
-        node = data_loader._adjust_label_name(Node(self.parent_label))
-
-        for key, value in self.parent_json_data.items():
-            node[key] = value
-
-        label_name_adjusted = node.__primarylabel__
-        node = data_loader._generate_id_attr(node, self.parent_json_data)
-
-        return node
+        return data_loader.build_node(self.parent_label, self.parent_json_data)
 
     def get_child_node(self, data_loader):
 
-        node = data_loader._adjust_label_name(Node(self.child_label))
-
-        for key, value in self.child_json_data.items():
-            node[key] = value
-
-        label_name_adjusted = node.__primarylabel__
-        node = data_loader._generate_id_attr(node, self.child_json_data)
-
-        return node
+        return data_loader.build_node(self.child_label, self.child_json_data)
 
 
 class DiseaseAnatomyMapParser():
@@ -258,11 +273,9 @@ class DiseaseAnatomyMapParser():
         if isinstance(anatomy_id, float):
             anatomy_id = ""
 
-        self.entity.parent_node = Node(self.entity.parent_label)
         self.entity.parent_json_data = {"doid": disease_id}
 
         child_id = self.entity._raw_data_csv_row["uberon_id"]
-        self.entity.child_node = Node(self.entity.child_label)
         self.entity.child_json_data = {"uberon_id": anatomy_id}
 
         for prop_name in ['cooccurrence', 'expected', 'p_fisher']:
@@ -272,14 +285,14 @@ class DiseaseAnatomyMapParser():
                 self.entity.properties[prop_name] = prop_val
 
         self.entity.custom_relationship_id = (
-            frozenset(self.entity.parent_node.labels),
-            frozenset(self.entity.child_node.labels)
+            frozenset([self.entity.parent_label]),
+            frozenset([self.entity.child_label])
         )
 
 
 class DiseaseAssociatesGene:
 
-    __slots__ = ('parent_node', 'parent_json_data', 'child_node', 'child_json_data', 'properties')
+    __slots__ = ('parent_json_data', 'child_json_data', 'properties')
 
     def __init__(self, data_row: pandas.Series):
         self._parse_attributes_from(data_row)
@@ -330,26 +343,16 @@ class DiseaseAssociatesGene:
     def custom_relationship_id(self) -> str:
         return "DISEASE:GENE"
 
-    def get_parent_node(self, data_loader: Json2graphio) -> Json2graphio:
-        return self._get_node(data_loader, label=self.parent_label, json_data=self.parent_json_data)
+    def get_parent_node(self, data_loader: Json2graphio) -> NodeRecord:
+        return data_loader.build_node(self.parent_label, self.parent_json_data)
 
-    def get_child_node(self, data_loader: Json2graphio) -> Json2graphio:
-        return self._get_node(data_loader, label=self.child_label, json_data=self.child_json_data)
-
-    def _get_node(self, data_loader: Json2graphio, label: str, json_data: Dict[str, Any]) -> Json2graphio:
-        node = data_loader._adjust_label_name(Node(label))
-
-        for key, value in json_data.items():
-            node[key] = value
-
-        return data_loader._generate_id_attr(node, json_data)
+    def get_child_node(self, data_loader: Json2graphio) -> NodeRecord:
+        return data_loader.build_node(self.child_label, self.child_json_data)
 
     def _parse_attributes_from(self, data_row: pandas.Series) -> None:
-        self.parent_node = Node(self.parent_label)
         parent_id = data_row[self.parent_id_column]
         self.parent_json_data = {self.parent_id_field: parent_id}
 
-        self.child_node = Node(self.child_label)
         child_id = str(data_row[self.child_id_column])
         self.child_json_data = {self.child_id_field: child_id}
 
@@ -358,11 +361,11 @@ class DiseaseAssociatesGene:
 
 class Disease(Entity):
 
-    def __init__(self, row: pandas.Series):
+    def __init__(self, row: pandas.Series, properties: Dict[str, Any] = None):
 
         label = "Disease"
         self.parents = []
-        super(Disease, self).__init__(row, label=label, name=label, parser=DiseaseParser)
+        super(Disease, self).__init__(row, label=label, name=label, parser=DiseaseParser, properties=properties)
 
     def to_dict(self):
 
@@ -427,9 +430,10 @@ def _custom_relation_name_generator(parent_node, child_node, relation_props):
 
 
 class Dataloader(object):
-    def __init__(self, dataset_file, entity_name, from_row=None, to_row=None, worker_name: str = None,):
+    def __init__(self, dataset_file, entity_name, from_row=None, to_row=None, worker_name: str = None,
+                 layout: DatasetLayout = None):
         self.name = worker_name
-        self.data = pandas.read_csv(dataset_file, sep="\t")[from_row:to_row]
+        self.data = read_dataset(dataset_file, from_row, to_row, layout=layout)
         self.entity_name = entity_name
 
         self.entity_lookup = {
@@ -461,34 +465,43 @@ class Dataloader(object):
         self._build_loader()
 
     def parse(self):
-        nodes = []
         node_total_count = len(self.data)
 
         node_count = 0
-        for index, row in self.data.iterrows():
-            nodes.append(self.entity(row))
-            if len(nodes) == config.BATCH_SIZE:
-                log.info(
-                    "{}Load next {} {}.".format(
-                        self.name + ": " if self.name else "", len(nodes), self.entity_name.lower()
-                    )
+        for batch_start in range(0, node_total_count, config.BATCH_SIZE):
+            parse_start = time.perf_counter()
+            nodes = build_entities(
+                self.entity, self.entity_name, self.data[batch_start:batch_start + config.BATCH_SIZE]
+            )
+            self._add_to_loader(nodes)
+            parse_time = time.perf_counter() - parse_start
+            log.info(
+                "{}Parsed next {} {} in {:.2f}s ({:.0f} rows/s).".format(
+                    self.name + ": " if self.name else "",
+                    len(nodes),
+                    self.entity_name.lower(),
+                    parse_time,
+                    len(nodes) / parse_time if parse_time else 0,
                 )
-                self.load(nodes)
-                node_count += len(nodes)
-                del nodes
-                nodes = []
-                log.info(
-                    "{}Loaded {} from {} {}s.".format(
-                        self.name + ": " if self.name else "",
-                        node_count,
-                        node_total_count,
-                        self.entity_name.lower()
-                    )
+            )
+            self._write()
+            node_count += len(nodes)
+            log.info(
+                "{}Loaded {} from {} {}s.".format(
+                    self.name + ": " if self.name else "",
+                    node_count,
+                    node_total_count,
+                    self.entity_name.lower()
                 )
-        self.load(nodes)
+            )
 
     def load(self, nodes):
 
+        self._add_to_loader(nodes)
+        self._write()
+
+    def _add_to_loader(self, nodes):
+
         for index, node in enumerate(nodes):
             if hasattr(node, "is_relationship"):
                 parent_node = node.get_parent_node(self.loader)
@@ -497,33 +510,35 @@ class Dataloader(object):
                 self.loader._create_relation(parent_node, child_node, node.properties, node.custom_relationship_id)
             else:
                 self.loader.load_json(node.to_dict(), self.entity_label)
-        try:
-            if db_loading_lock is not None:
-                db_loading_lock.acquire()
-                log.info(
-                    "{}Acquired DB loading lock.".format(
-                        self.name + ": " if self.name else ""
-                    )
-                )
-        except NameError:
-            # we are in singlethreaded mode. no lock set
-            pass
-        try:
-            self.loader.create_indexes(graph)
-            self.loader.merge(graph)
-        finally:
-            try:
-                if db_loading_lock is not None:
-                    log.info(
-                        "{}Release DB loading lock.".format(
-                            self.name + ": " if self.name else ""
-                        )
-                    )
-                    db_loading_lock.release()
-            except NameError:
-                # we are in singlethreaded mode. no lock set
-                pass
 
+    def _write(self):
+
+        duplicate_counts = self.loader.get_duplicate_counts()
+        if duplicate_counts:
+            log.info(
+                "{}Collapsed duplicates in batch: {}".format(self.name + ": " if self.name else "", duplicate_counts)
+            )
+        if db_write_queue is None:
+            # we are in singlethreaded mode. write directly
+            self.loader.flush(get_graph())
+            return
+
+        # hand the data over to the DB writer processes. blocks while the queue is full
+        payload = self.loader.get_payload()
+        self.loader.clear()
+        while True:
+            if db_writer_failed.is_set():
+                raise RuntimeError("A DB writer failed. Stop parsing.")
+            try:
+                db_write_queue.put(payload, timeout=1)
+                break
+            except queue.Full:
+                continue
+        log.info(
+            "{}Queued batch for DB writers. Write queue depth: {}".format(
+                self.name + ": " if self.name else "", _get_queue_depth(db_write_queue)
+            )
+        )
 
     def _build_loader(self):
         c = Json2graphio()
@@ -532,6 +547,8 @@ class Dataloader(object):
         c.config_dict_primarykey_generated_hashed_attrs_by_label = (
             config.JSON2GRAPH_GENERATED_HASH_IDS
         )
+        c.config_str_primarykey_generated_hash_func = config.JSON2GRAPH_GENERATED_HASH_FUNC
+        c.config_int_primarykey_generated_hash_cache_size = config.JSON2GRAPH_GENERATED_HASH_CACHE_SIZE
         c.config_list_skip_collection_hubs = "all"
         c.config_dict_concat_list_attr = config.JSON2GRAPH_CONCAT_LIST_ATTR
         c.config_str_collection_anchor_label = config.JSON2GRAPH_COLLECTION_NODE_LABEL
@@ -539,6 +556,7 @@ class Dataloader(object):
             config.JSON2GRAPH_COLLECTION_EXTRA_LABELS
         )
         c.config_graphio_batch_size = config.COMMIT_INTERVAL
+        c.config_str_dedup_policy = config.JSON2GRAPH_DEDUP_POLICY
         #c.config_dict_primarykey_attr_by_label = config.JSON2GRAPH_ID_ATTR
 
         primarykey_generated_attr_name = "{0}{1}".format(
@@ -557,19 +575,139 @@ class Dataloader(object):
     # https://stackoverflow.com/questions/20886565/using-multiprocessing-process-with-a-maximum-number-of-simultaneous-processes
 
 
-def worker_task(dataset_file, entity_label, from_row: int, to_row: int, worker_name: str,):
+def worker_task(dataset_file, entity_label, from_row: int, to_row: int, worker_name: str, layout=None):
 
     log.info("Start {} -- row {} to row {}".format(worker_name, from_row, to_row))
     # l = 1 / 0
     dataloader = Dataloader(
-        dataset_file, entity_label, from_row=from_row, to_row=to_row, worker_name=worker_name,
+        dataset_file, entity_label, from_row=from_row, to_row=to_row, worker_name=worker_name, layout=layout,
     )
     dataloader.parse()
 
 
-def worker_task_init(l):
-    global db_loading_lock
-    db_loading_lock = l
+def worker_task_init(write_queue, writer_failed):
+    global db_write_queue, db_writer_failed
+    db_write_queue = write_queue
+    db_writer_failed = writer_failed
+
+
+def _get_queue_depth(write_queue):
+    try:
+        return write_queue.qsize()
+    except NotImplementedError:
+        # not available on macOS
+        return "n/a"
+
+
+class DBWriter(object):
+    """Drains graph payloads from the write queue and writes them to the database.
+
+    Payloads of several batches are coalesced until COMMIT_INTERVAL nodes/relations are
+    buffered (or the queue runs dry), so they are written with few large UNWIND batches.
+    """
+
+    def __init__(self, write_queue, writer_failed, name: str):
+        self.write_queue = write_queue
+        self.writer_failed = writer_failed
+        self.name = name
+        self.buffered_count = 0
+        self.written_count = 0
+        self._build_loader()
+
+    def run(self):
+        try:
+            while True:
+                try:
+                    payload = self.write_queue.get(timeout=config.DB_WRITER_FLUSH_TIMEOUT)
+                except queue.Empty:
+                    self.flush()
+                    continue
+                if payload == DB_WRITER_STOP:
+                    break
+                self.buffered_count += self.loader.add_payload(payload)
+                if self.buffered_count >= config.COMMIT_INTERVAL:
+                    self.flush()
+            self.flush()
+        except:
+            self.writer_failed.set()
+            raise
+
+    def flush(self):
+        if not self.buffered_count:
+            return
+        duplicate_counts = self.loader.get_duplicate_counts()
+        if duplicate_counts:
+            log.info("{}: Collapsed duplicates of coalesced batches: {}".format(self.name, duplicate_counts))
+        write_start = time.perf_counter()
+        self.loader.merge(get_graph())
+        write_time = time.perf_counter() - write_start
+        self.written_count += self.buffered_count
+        log.info(
+            "{}: Wrote {} nodes/relations in {:.2f}s ({:.0f} rows/s), {} in total. Write queue depth: {}".format(
+                self.name,
+                self.buffered_count,
+                write_time,
+                self.buffered_count / write_time if write_time else 0,
+                self.written_count,
+                _get_queue_depth(self.write_queue),
+            )
+        )
+        self.buffered_count = 0
+        self.loader.clear()
+
+    def _build_loader(self):
+        self.loader = Json2graphio()
+        self.loader.config_graphio_batch_size = config.COMMIT_INTERVAL
+        self.loader.config_str_dedup_policy = config.JSON2GRAPH_DEDUP_POLICY
+
+
+def db_writer_task(write_queue, writer_failed, writer_name: str):
+
+    global graph
+    # the connection of the parent is inherited on fork, every writer opens its own
+    graph = None
+    log.info("Start {}".format(writer_name))
+    DBWriter(write_queue, writer_failed, writer_name).run()
+    log.info("{} finished".format(writer_name))
+
+
+def start_db_writers(write_queue, writer_failed):
+
+    writers = []
+    for writer_index in range(0, config.NO_OF_DB_WRITERS):
+        writer = multiprocessing.Process(
+            target=db_writer_task,
+            args=(write_queue, writer_failed, "DB_WRITER_{}".format(writer_index)),
+        )
+        writer.start()
+        writers.append(writer)
+    return writers
+
+
+def stop_db_writers(writers, write_queue, writer_failed):
+
+    global exit_code
+    stop_count = 0
+    # a dead writer does not drain the queue any more, so never block on a full queue
+    while stop_count < len(writers) and not writer_failed.is_set() and any(writer.is_alive() for writer in writers):
+        try:
+            write_queue.put(DB_WRITER_STOP, timeout=1)
+            stop_count += 1
+        except queue.Full:
+            continue
+    if stop_count < len(writers):
+        log.error("DB writers failed, stop the remaining ones")
+        exit_code = 1
+        # the queued payloads will never be written, do not wait for them to be flushed on exit
+        write_queue.cancel_join_thread()
+        for writer in writers:
+            if writer.is_alive():
+                writer.terminate()
+    for writer in writers:
+        writer.join()
+        if writer.exitcode != 0:
+            log.error("{} failed with exit code {}".format(writer.name, writer.exitcode))
+            exit_code = 1
 
 
 def worker_task_done(task_name, pool, other_futures, dataset_file, from_row, to_row, future):
@@ -617,10 +755,19 @@ def load_data_mp(worker_count: int, rows_per_worker=None):
     entity_names = ["Compound", "Target", "TargetCompoundMap",
                     "Disease", "DiseaseAssociatesGene", "Anatomy", "DiseaseAnatomyMap"]
 
+    # indexes/constraints are created once up front, the batches are merged without schema round trips
+    create_schema(get_graph())
+
     for dataset_file, entity_name in zip(input_files, entity_names):
 
         log.info("Loading {0} nodes".format(entity_name))
-        row_count_total = len(pandas.read_csv(dataset_file, sep="\t").dropna(how="all"))
+        # the layout is scanned once here and handed to the workers, which only parse their own rows
+        if config.USE_DATASET_INDEX:
+            dataset_layout = load_dataset_index(dataset_file)
+        else:
+            # without offsets the workers fall back to skipping rows while parsing
+            dataset_layout = scan_dataset(dataset_file)._replace(offsets=[])
+        row_count_total = dataset_layout.row_count
         log.info("Loading {0} {1} nodes ...".format(entity_name, row_count_total))
 
         if rows_per_worker is None:
@@ -636,14 +783,17 @@ def load_data_mp(worker_count: int, rows_per_worker=None):
         log.info("Worker instance count = {}".format(worker_instances_count))
         log.info("Leftover row count = {}".format(leftover_rows))
 
-        lock = multiprocessing.Lock()
+        # parsing workers feed the DB writers through a bounded queue
+        write_queue = multiprocessing.Queue(maxsize=config.DB_WRITE_QUEUE_SIZE)
+        writer_failed = multiprocessing.Event()
+        writers = start_db_writers(write_queue, writer_failed)
         rows_distributed = 0
         futures = []
         with ProcessPool(
             max_workers=worker_count,
             max_tasks=1,
             initializer=worker_task_init,
-            initargs=(lock,),
+            initargs=(write_queue, writer_failed),
         ) as pool:
             for worker_index in range(0, worker_instances_count):
                 from_row = rows_distributed
@@ -662,6 +812,7 @@ def load_data_mp(worker_count: int, rows_per_worker=None):
                         from_row,
                         rows_distributed,
                         worker_task_name,
+                        dataset_layout,
                     ),
                 )
 
@@ -678,6 +829,8 @@ def load_data_mp(worker_count: int, rows_per_worker=None):
                 )
                 futures.append(future)
                 rows_distributed += 1
+        # all rows of this entity have to be written before the next entity (e.g. relations to these nodes) is loaded
+        stop_db_writers(writers, write_queue, writer_failed)
     exit(exit_code)
 
 
@@ -688,6 +841,8 @@ def load_data():
         load_compounds(config.DRUGBANK_VOCABULARY_FILE, config.DRUGBANK_XML_FILE, config.TTD_DRUG_DOWNLOAD_FILE, config.TTD_DRUG_XREF_DOWNLOAD_FILE,
                        config.DRUGBANK_COMPOUND_FILE, config.TTD_COMPOUND_FILE, config.COMPOUND_FILE)
 
+    create_schema(get_graph())
+
     entity_label = "Compound"
     dataloader = Dataloader(config.COMPOUND_FILE, entity_label)
     dataloader.parse()
@@ -13,6 +13,7 @@ from disease_ontology_parser import load_disease_file
 from download_data import download
 from drugbank_parser import load_drugbank_file
 from load_data import load_data, load_data_mp
+from stage_manifest import run_stage
 from ttd_target_parser import (load_target_file,
                                load_ttd_target_compound_map_file)
 
@@ -38,17 +39,33 @@ if __name__ == "__main__":
         download()
     with CodeTimer("Importer", unit="s"):
 
-        load_compounds(config.DRUGBANK_VOCABULARY_FILE, config.DRUGBANK_XML_FILE, config.TTD_DRUG_DOWNLOAD_FILE, config.TTD_DRUG_XREF_DOWNLOAD_FILE,
-                       config.DRUGBANK_COMPOUND_FILE, config.TTD_COMPOUND_FILE, config.COMPOUND_FILE)
+        compound_inputs = [config.DRUGBANK_VOCABULARY_FILE, config.DRUGBANK_XML_FILE, config.TTD_DRUG_DOWNLOAD_FILE,
+                           config.TTD_DRUG_XREF_DOWNLOAD_FILE]
+        compound_outputs = [config.DRUGBANK_COMPOUND_FILE, config.TTD_COMPOUND_FILE, config.COMPOUND_FILE]
+        run_stage("compounds", load_compounds, compound_inputs + compound_outputs,
+                  compound_inputs, compound_outputs)
 
-        load_target_file(config.TTD_TARGET_DOWNLOAD_FILE, config.TTD_TARGET_FILE)
-        load_ttd_target_compound_map_file(config.TTD_TARGET_DRUG_MAPPING_DOWNLOAD_FILE,
-                                          config.COMPOUND_FILE, config.TTD_COMPOUND_TARGET_MAP_FILE)
-        load_disease_file(config.DISEASE_OBO_FILE, config.DISEASE_FILE, config.DISEASE_XREF_FILE)
+        run_stage("targets", load_target_file, [config.TTD_TARGET_DOWNLOAD_FILE, config.TTD_TARGET_FILE],
+                  [config.TTD_TARGET_DOWNLOAD_FILE], [config.TTD_TARGET_FILE])
+        run_stage("target_compound_map", load_ttd_target_compound_map_file,
+                  [config.TTD_TARGET_DRUG_MAPPING_DOWNLOAD_FILE, config.COMPOUND_FILE, config.TTD_COMPOUND_TARGET_MAP_FILE],
+                  [config.TTD_TARGET_DRUG_MAPPING_DOWNLOAD_FILE, config.COMPOUND_FILE], [config.TTD_COMPOUND_TARGET_MAP_FILE])
+        run_stage("diseases", load_disease_file, [config.DISEASE_OBO_FILE, config.DISEASE_FILE, config.DISEASE_XREF_FILE],
+                  [config.DISEASE_OBO_FILE], [config.DISEASE_FILE, config.DISEASE_XREF_FILE],
+                  ["DISEASE_FILTER_ANCESTORS"])
 
-        load_mesh_descriptor_files()
-        load_uberon_anatomy_file(config.UBERON_BASIC_OBO_FILE, config.UBERON_TERM_FILE, config.UBERON_XREF_FILE, config.UBERON_SUBSET_FILE,
-                                 config.HUMAN_CONSTRAINTS_FILE, config.MESH_TERM_FILE, config.UBERON_ANATOMY_FILE)
+        run_stage("mesh", load_mesh_descriptor_files, [],
+                  [config.MESH_DESC_FILE, config.MESH_DESC_2005_FILE, config.MESH_DESC_2002_FILE],
+                  [config.MESH_TERM_FILE, config.MESH_TREE_NUMBER_FILE, config.MESH_TERM_2005_FILE,
+                   config.MESH_TREE_NUMBER_2005_FILE, config.MESH_TERM_2002_FILE, config.MESH_TREE_NUMBER_2002_FILE,
+                   config.MESH_LOOKUP_FILE],
+                  ["MESH_WRITE_JSON"])
+        anatomy_outputs = [config.UBERON_TERM_FILE, config.UBERON_XREF_FILE, config.UBERON_SUBSET_FILE,
+                           config.UBERON_ANATOMY_FILE]
+        run_stage("anatomy", load_uberon_anatomy_file,
+                  [config.UBERON_BASIC_OBO_FILE, config.UBERON_TERM_FILE, config.UBERON_XREF_FILE, config.UBERON_SUBSET_FILE,
+                   config.HUMAN_CONSTRAINTS_FILE, config.MESH_TERM_FILE, config.UBERON_ANATOMY_FILE],
+                  [config.UBERON_BASIC_OBO_FILE, config.HUMAN_CONSTRAINTS_FILE, config.MESH_LOOKUP_FILE], anatomy_outputs)
 
         get_anatomy_pmid_file(
             config.UBERON_ANATOMY_FILE, config.ANATOMY_PMID_FILE, config.REGEN_PMID_FILES)
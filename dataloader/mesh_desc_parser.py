@@ -1,11 +1,16 @@
+import csv
 import os
 import pandas as pd
 import re
 import logging
 import gzip
 import json
+import time
 import xml.etree.ElementTree as ET
 from Configs import getConfig
+from pebble import ProcessPool
+
+from mesh_lookup import build_mesh_lookup
 
 config = getConfig()
 log = logging.getLogger(__name__)
@@ -44,18 +49,39 @@ def parse_mesh_desc_entries(mesh_desc_file):
     
     return term_df
 
+# Stream the descriptor records of a MeSH xml release.
+# Every record is dropped from the tree after the caller is done with it, so only one is held in memory
+def iter_mesh_descriptors(xml_file):
+    depth = 0
+    root = None
+    for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            yield elem
+            root.clear()
+
+# Parse a MeSH descriptor record
+def parse_mesh_descriptor(elem):
+    term = dict()
+    term['mesh_id'] = elem.findtext('DescriptorUI')
+    term['mesh_name'] = elem.findtext('DescriptorName/String')
+    term['semantic_types'] = list({x.text for x in elem.findall(
+        'ConceptList/Concept/SemanticTypeList/SemanticType/SemanticTypeUI')})
+    term['tree_numbers'] = [x.text for x in elem.findall('TreeNumberList/TreeNumber')]
+
+    return term
+
 # Parse MeSH xml release
 def parse_mesh_xml(root):
     terms = list()
 
     for elem in root:
-        term = dict()
-        term['mesh_id'] = elem.findtext('DescriptorUI')
-        term['mesh_name'] = elem.findtext('DescriptorName/String')
-        term['semantic_types'] = list({x.text for x in elem.findall(
-            'ConceptList/Concept/SemanticTypeList/SemanticType/SemanticTypeUI')})
-        term['tree_numbers'] = [x.text for x in elem.findall('TreeNumberList/TreeNumber')]
-        terms.append(term)
+        terms.append(parse_mesh_descriptor(elem))
         
     return terms
 
@@ -80,14 +106,6 @@ def write_mesh_json(terms, file_name):
     with open(path, 'w') as write_file:
         json.dump(terms, write_file, indent=2)
 
-# read MeSH json file
-def read_mesh_json(file_name):
-    path = os.path.join('data', file_name)
-    with open(path) as read_file:
-        mesh = json.load(read_file)
-        
-    return mesh
-
 def get_mesh_tree_numbers(mesh):
     # Extract (mesh_id, mesh_tree_number) pairs
     rows = []
@@ -103,27 +121,66 @@ def get_mesh_tree_numbers(mesh):
 
 def load_mesh_descriptor_file(mesh_descriptor_input_file, mesh_terms_output_file, mesh_tree_numbers_output_file):
 
-    # Read MeSH xml release
-    with gzip.open(mesh_descriptor_input_file) as xml_file:
-        tree = ET.parse(xml_file)
-    root = tree.getroot()
+    # The descriptors are streamed from the xml release straight into the term and tree number files.
+    # Only the optional json output (config.MESH_WRITE_JSON) needs all terms in memory, for their parents
+    terms = list() if config.MESH_WRITE_JSON else None
+
+    with gzip.open(mesh_descriptor_input_file) as xml_file, \
+            open(mesh_terms_output_file, 'w', newline='', encoding='utf-8') as terms_file, \
+            open(mesh_tree_numbers_output_file, 'w', newline='', encoding='utf-8') as tree_numbers_file:
+        # same format as pandas.DataFrame.to_csv(sep='\t', index=False)
+        terms_writer = csv.writer(terms_file, delimiter='\t', lineterminator='\n')
+        tree_numbers_writer = csv.writer(tree_numbers_file, delimiter='\t', lineterminator='\n')
+        terms_writer.writerow(['mesh_id', 'mesh_name'])
+        tree_numbers_writer.writerow(['mesh_id', 'mesh_name', 'mesh_tree_number'])
+
+        for descriptor in iter_mesh_descriptors(xml_file):
+            term = parse_mesh_descriptor(descriptor)
+            terms_writer.writerow([term['mesh_id'], term['mesh_name']])
+            tree_numbers_writer.writerows(
+                [term['mesh_id'], term['mesh_name'], tree_number] for tree_number in term['tree_numbers'])
+            if terms is not None:
+                terms.append(term)
+
+    if terms is not None:
+        update_mesh_parents(terms)
+
+        file_base_name = os.path.basename(mesh_descriptor_input_file)
+        file_base_name = os.path.splitext(file_base_name)[0]
+        output_dir = os.path.dirname(mesh_terms_output_file)
+
+        mesh_descriptor_json_file = os.path.join(output_dir, "mesh_{0}.json".format(file_base_name))
+        write_mesh_json(terms, mesh_descriptor_json_file)
+
+
+def load_mesh_descriptor_file_timed(mesh_descriptor_input_file, mesh_terms_output_file, mesh_tree_numbers_output_file):
 
-    terms = parse_mesh_xml(root)
-    update_mesh_parents(terms)
+    log.info("Parse {0}".format(mesh_descriptor_input_file))
+    start = time.perf_counter()
+    load_mesh_descriptor_file(mesh_descriptor_input_file, mesh_terms_output_file, mesh_tree_numbers_output_file)
+    elapsed = time.perf_counter() - start
+    log.info("Parsed {0} in {1:.2f}s".format(mesh_descriptor_input_file, elapsed))
 
-    file_base_name = os.path.basename(mesh_descriptor_input_file)
-    file_base_name = os.path.splitext(file_base_name)[0]
-    output_dir = os.path.dirname(mesh_terms_output_file)
+    return elapsed
 
-    mesh_descriptor_json_file = os.path.join(output_dir, "mesh_{0}.json".format(file_base_name))
-    write_mesh_json(terms, mesh_descriptor_json_file)
-    mesh = read_mesh_json(mesh_descriptor_json_file)
 
-    mesh_df = pd.DataFrame.from_dict(mesh)[['mesh_id', 'mesh_name']]
-    mesh_df.to_csv(mesh_terms_output_file, sep='\t', index=False)
+def load_mesh_descriptor_file_list(files, worker_count):
 
-    tn_df = get_mesh_tree_numbers(mesh)
-    tn_df.to_csv(mesh_tree_numbers_output_file, sep='\t', index=False)
+    # files: list of (input file, terms output file, tree numbers output file).
+    # The releases are independent and every one has its own output files, so they are parsed in parallel
+    worker_count = max(min(worker_count, len(files)), 1)
+    start = time.perf_counter()
+    if worker_count == 1:
+        for file_names in files:
+            load_mesh_descriptor_file_timed(*file_names)
+    else:
+        with ProcessPool(max_workers=worker_count) as pool:
+            futures = [pool.schedule(load_mesh_descriptor_file_timed, args=file_names) for file_names in files]
+        for future in futures:
+            # raises the exception of a failed release
+            future.result()
+    log.info("Parsed {0} MeSH releases with {1} process(es) in {2:.2f}s".format(
+        len(files), worker_count, time.perf_counter() - start))
 
 
 def load_mesh_descriptor_files():
@@ -132,8 +189,9 @@ def load_mesh_descriptor_files():
     terms_output_files = [config.MESH_TERM_FILE, config.MESH_TERM_2005_FILE, config.MESH_TERM_2002_FILE]
     tree_numbers_output_files = [config.MESH_TREE_NUMBER_FILE, config.MESH_TREE_NUMBER_2005_FILE, config.MESH_TREE_NUMBER_2002_FILE]
 
-    for (input_file, term_output_file, tree_number_output_file) in zip(input_files, terms_output_files, tree_numbers_output_files):
-        load_mesh_descriptor_file(input_file, term_output_file, tree_number_output_file)        
+    files = list(zip(input_files, terms_output_files, tree_numbers_output_files))
+    load_mesh_descriptor_file_list(files, config.NO_OF_PROCESSES)
+    build_mesh_lookup()
 
     
 if __name__ == "__main__":
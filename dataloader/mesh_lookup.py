@@ -0,0 +1,92 @@
+import collections
+import logging
+import os
+import pickle
+
+import pandas as pd
+from Configs import getConfig
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# tree_number_to_id: MeSH tree number -> descriptor id, over the current and the legacy releases
+# id_to_name: descriptor id -> descriptor name of the current release
+MeshLookup = collections.namedtuple("MeshLookup", ["tree_number_to_id", "id_to_name"])
+
+# (lookup file, term file) -> MeshLookup
+_mesh_lookups = {}
+
+
+def get_tree_number_files():
+    # https://www.nlm.nih.gov/mesh/intro_trees.html : The numbers are subject to change
+    # when new descriptors are added or the hierarchical arrangement is revised to reflect vocabulary changes.
+    # Ordered by precedence: tree numbers of the current release win over the legacy ones and,
+    # as in the anatomy xref update this lookup replaced, the 2002 release wins over the 2005 release
+    return [config.MESH_TREE_NUMBER_FILE, config.MESH_TREE_NUMBER_2002_FILE, config.MESH_TREE_NUMBER_2005_FILE]
+
+
+def _get_source_stats(mesh_term_file):
+
+    stats = {}
+    for source_file in get_tree_number_files() + [mesh_term_file]:
+        stat = os.stat(source_file)
+        stats[source_file] = (stat.st_size, stat.st_mtime_ns)
+    return stats
+
+
+def build_mesh_lookup(lookup_file=None, mesh_term_file=None):
+    """Compile the MeSH tree number and term files of all releases into one lookup file.
+
+    Written by the MeSH stage once the releases are parsed. The sizes and mtimes of the
+    source files are stored with the lookup, so a lookup of older files is rebuilt on load.
+    """
+    lookup_file = lookup_file or config.MESH_LOOKUP_FILE
+    mesh_term_file = mesh_term_file or config.MESH_TERM_FILE
+    tree_number_files = get_tree_number_files()
+
+    tree_number_to_id = {}
+    # lowest precedence first, so the current release overwrites legacy tree numbers
+    for tree_number_file in reversed(tree_number_files):
+        tree_number_df = pd.read_table(tree_number_file)
+        tree_number_to_id.update(zip(tree_number_df.mesh_tree_number, tree_number_df.mesh_id))
+
+    mesh_df = pd.read_table(mesh_term_file)
+    id_to_name = dict(zip(mesh_df.mesh_id, mesh_df.mesh_name))
+
+    lookup = MeshLookup(tree_number_to_id, id_to_name)
+    content = {
+        "sources": _get_source_stats(mesh_term_file),
+        "tree_number_to_id": tree_number_to_id,
+        "id_to_name": id_to_name,
+    }
+    # other processes may load the lookup at the same time, never let them see a partial file
+    temp_file = "{0}.{1}.tmp".format(lookup_file, os.getpid())
+    with open(temp_file, "wb") as out_file:
+        pickle.dump(content, out_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, lookup_file)
+    log.info("Wrote MeSH lookup {0} ({1} tree numbers, {2} descriptors)".format(
+        lookup_file, len(tree_number_to_id), len(id_to_name)))
+
+    return lookup
+
+
+def load_mesh_lookup(lookup_file=None, mesh_term_file=None):
+    """Get the MeSH lookup. It is read once per process and (re)built if missing or outdated."""
+    lookup_file = lookup_file or config.MESH_LOOKUP_FILE
+    mesh_term_file = mesh_term_file or config.MESH_TERM_FILE
+    key = (lookup_file, mesh_term_file)
+    if key in _mesh_lookups:
+        return _mesh_lookups[key]
+
+    if os.path.isfile(lookup_file):
+        with open(lookup_file, "rb") as in_file:
+            content = pickle.load(in_file)
+        if content["sources"] == _get_source_stats(mesh_term_file):
+            _mesh_lookups[key] = MeshLookup(content["tree_number_to_id"], content["id_to_name"])
+            return _mesh_lookups[key]
+        log.info("MeSH files changed since {0} was built".format(lookup_file))
+
+    _mesh_lookups[key] = build_mesh_lookup(lookup_file, mesh_term_file)
+    return _mesh_lookups[key]
@@ -0,0 +1,107 @@
+import gzip
+import logging
+import re
+
+from Configs import getConfig
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# Streaming reader for the [Term] stanzas of OBO files.
+# Tag lines are split like obonet.read_obo does, without building a networkx graph of the ontology.
+
+# obonet's regular expression for tag-value lines
+TAG_LINE_PATTERN = re.compile(
+    r"""^
+    (?P<tag>.+?):\s*             # tag and separator
+    (?P<value>.*?)               # value: match anything (non-greedy)
+    (?:\s                        # optional trailing modifier
+        (?P<trailing_modifier>
+            (?<!\\)\{[^{}]*\}    # match unescaped {...}
+        )
+    )?
+    (?:\s
+        (?P<comment>            # optional comment
+            (?<!\\)![^\n]*      # match unescaped ! followed by any characters
+        )
+    )?
+    \s*$                        # optional trailing whitespace
+    """,
+    re.VERBOSE,
+)
+
+# Term tags that occur at most once, like in obonet. All other tags are collected in lists
+TERM_TAG_SINGULARITY = {
+    "id": True,
+    "is_anonymous": True,
+    "name": True,
+    "namespace": True,
+    "def": True,
+    "comment": True,
+    "is_obsolete": True,
+    "builtin": True,
+    "created_by": True,
+    "creation_date": True,
+}
+
+
+def open_obo_file(obo_file):
+
+    if obo_file.endswith(".gz"):
+        return gzip.open(obo_file, "rt", encoding="utf-8")
+    return open(obo_file, encoding="utf-8")
+
+
+def parse_tag_value(line):
+
+    match = TAG_LINE_PATTERN.match(line)
+    if match is None:
+        raise ValueError("Tag-value pair parsing failed for:\n{0}".format(line))
+    return match.group("value")
+
+
+def iter_obo_terms(obo_file, tags=None, ignore_obsolete=True):
+    """Yield the [Term] stanzas of an OBO file one by one as dicts {tag: value or list of values}.
+
+    Only the given tags (default: all) are parsed, 'id' and 'is_obsolete' always are. Obsolete
+    terms are skipped unless ignore_obsolete is False. Unlike in an obonet graph, terms with the
+    same id are not merged and ids that are only referenced (e.g. by is_a) are not yielded.
+    """
+    if tags is not None:
+        tags = set(tags) | {"id", "is_obsolete"}
+
+    with open_obo_file(obo_file) as lines:
+        # a stanza is a block of non blank lines, its first line is the stanza type
+        in_stanza = False
+        term = None
+        for line in lines:
+            if not line.strip():
+                if term is not None and not (ignore_obsolete and term.get("is_obsolete", "false") == "true"):
+                    yield term
+                in_stanza = False
+                term = None
+                continue
+            if not in_stanza:
+                in_stanza = True
+                if line.startswith("[Term]"):
+                    term = {}
+                continue
+            if term is None or line.startswith("!"):
+                continue
+
+            separator = line.find(":", 1)
+            if separator < 0:
+                raise ValueError("Tag-value pair parsing failed for:\n{0}".format(line))
+            tag = line[:separator]
+            if tags is not None and tag not in tags:
+                continue
+            value = parse_tag_value(line)
+            if TERM_TAG_SINGULARITY.get(tag, False):
+                term[tag] = value
+            else:
+                term.setdefault(tag, []).append(value)
+
+        if term is not None and not (ignore_obsolete and term.get("is_obsolete", "false") == "true"):
+            yield term
@@ -0,0 +1,103 @@
+import collections
+import concurrent.futures
+import datetime
+import logging
+import sqlite3
+
+from Configs import getConfig
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# SQLite cache of the PMIDs found for each esearch term query, so regenerating the PMID files
+# only queries PubMed for new terms and for articles added since a query was last fetched.
+# Entries younger than PMID_CACHE_TTL_DAYS are used as they are, older ones are refreshed with an
+# esearch restricted to the Entrez date since the last fetch. Articles removed from PubMed stay in
+# the cache until it is deleted.
+
+PmidCacheEntry = collections.namedtuple("PmidCacheEntry", ["pmids", "fetched"])
+
+
+class PmidCache:
+
+    def __init__(self, cache_file=None):
+
+        self.cache_file = cache_file or config.PMID_CACHE_FILE
+        self.connection = sqlite3.connect(self.cache_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS pmid_query "
+                                "(term_query TEXT PRIMARY KEY, pmids TEXT NOT NULL, fetched TEXT NOT NULL)")
+
+    def close(self):
+
+        self.connection.close()
+
+    def get(self, term_query):
+
+        row = self.connection.execute("SELECT pmids, fetched FROM pmid_query WHERE term_query = ?",
+                                      (term_query,)).fetchone()
+        if row is None:
+            return None
+        pmids, fetched = row
+        return PmidCacheEntry(pmids.split("|") if pmids else [], datetime.datetime.strptime(fetched, "%Y-%m-%d").date())
+
+    def put(self, term_query, pmids, fetched):
+
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO pmid_query (term_query, pmids, fetched) VALUES (?, ?, ?)",
+                                    (term_query, "|".join(pmids), fetched.isoformat()))
+
+
+def search_cached(client, cache, term_queries, retmax=100, ttl_days=None, today=None):
+    """Get the PMIDs of each of term_queries like client.esearch_many, through the PMID cache.
+
+    Queries missing from the cache are fetched in full. Cached queries older than ttl_days are
+    refreshed with the PMIDs of the articles added since their last fetch, which are put in front
+    like in esearch's most recent first order.
+
+    Every query is stored as soon as it is fetched. Failed queries are logged and the first
+    error is raised once the other queries are done, the next run only fetches the failed ones.
+    """
+    ttl_days = config.PMID_CACHE_TTL_DAYS if ttl_days is None else ttl_days
+    today = today or datetime.date.today()
+
+    results = [None] * len(term_queries)
+    cached = {}
+    # (index of the query, esearch params) of the queries to fetch
+    searches = []
+    for i, term_query in enumerate(term_queries):
+        entry = cache.get(term_query)
+        if entry is None:
+            searches.append((i, None))
+        elif (today - entry.fetched).days < ttl_days:
+            results[i] = entry.pmids
+        else:
+            cached[i] = entry.pmids
+            # the fetch day itself is searched again, as articles may have been added after the fetch
+            searches.append((i, {"datetype": "edat", "mindate": entry.fetched.strftime("%Y/%m/%d"),
+                                 "maxdate": today.strftime("%Y/%m/%d")}))
+    log.info("PMID cache: {0} queries up to date, {1} to refresh, {2} to fetch".format(
+        len(term_queries) - len(searches), len(cached), len(searches) - len(cached)))
+
+    errors = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=client.worker_count) as executor:
+        futures = {executor.submit(client.search, term_queries[i], retmax, params=params): i for i, params in searches}
+        # the cache is written from this thread only, sqlite connections are not shared between threads
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            try:
+                pmids = future.result()
+            except Exception as e:
+                log.error("PubMed query {0} failed: {1}".format(term_queries[i], e))
+                errors.append(e)
+                continue
+            if i in cached:
+                known = set(cached[i])
+                pmids = [pmid for pmid in pmids if pmid not in known] + cached[i]
+            results[i] = pmids
+            cache.put(term_queries[i], pmids, today)
+
+    if errors:
+        raise errors[0]
+    return results
@@ -2,15 +2,15 @@ import io
 import os
 import gzip
 import pandas as pd
-import requests
-import networkx
-import time
 import logging
 import itertools
 import scipy.stats
-import xml.etree.ElementTree as ET
 from Configs import getConfig
 
+from eutils_client import EutilsClient
+from mesh_lookup import load_mesh_lookup
+from pmid_cache import PmidCache, search_cached
+
 config = getConfig()
 log = logging.getLogger(__name__)
 log.addHandler(logging.StreamHandler())
@@ -18,23 +18,35 @@ log.setLevel(getattr(logging, config.LOG_LEVEL))
 
 # Reference:  https://github.com/dhimmel/medline/blob/gh-pages/cooccurrence.py
 
-def esearch_query(payload, retmax = 100, sleep=2):
+_eutils_client = None
+
+
+def get_eutils_client():
+
+    global _eutils_client
+    if _eutils_client is None:
+        _eutils_client = EutilsClient()
+    return _eutils_client
+
+
+def esearch_query(payload, retmax = 100):
     """
-    Query the esearch E-utility.
+    Query the esearch E-utility. Requests are rate limited by the shared E-utilities client.
     """
-    url = 'http://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi'
-    payload['retmax'] = retmax
-    payload['retstart'] = 0
-    ids = list()
-    count = 1
-    while payload['retstart'] < count:
-        response = requests.get(url, params=payload)
-        xml = ET.fromstring(response.content)
-        count = int(xml.findtext('Count'))
-        ids += [xml_id.text for xml_id in xml.findall('IdList/Id')]
-        payload['retstart'] += retmax
-        time.sleep(sleep)
-    return ids
+    return get_eutils_client().search(payload['term'], retmax, payload.get('db', 'pubmed'))
+
+
+def esearch_queries(term_queries, retmax = 100):
+    """
+    Query the esearch E-utility for several terms at once, returns the PMID lists in the order of term_queries.
+    Only new queries and the articles added since a query was last fetched are requested, see pmid_cache.
+    """
+    cache = PmidCache()
+    try:
+        return search_cached(get_eutils_client(), cache, term_queries, retmax)
+    finally:
+        cache.close()
+
 
 def make_gzip_pmid_file(rows, output_file):
 
@@ -60,9 +72,8 @@ def download_disease_pmids(disease_file, disease_xref_file, disease_mesh_xref_fi
     disease_df.loc[disease_df.doid == "DOID:0080642", "mesh_id"] = "D065207"
     disease_df.loc[disease_df.doid == "DOID:0080599", "mesh_id"] = "D018352"
 
-    # merge mesh names
-    mesh_df = pd.read_table(mesh_term_file)
-    disease_df = disease_df.merge(mesh_df, how='left')
+    # merge mesh names (names of the current release, see mesh_lookup.py)
+    disease_df['mesh_name'] = disease_df.mesh_id.map(load_mesh_lookup(mesh_term_file=mesh_term_file).id_to_name)
 
     # manually add supplementary concepts (list should be expanded)
     disease_df.loc[disease_df.doid == "DOID:0080600", "mesh_sc_id"] = "C000657245"
@@ -96,15 +107,17 @@ def download_disease_pmids(disease_file, disease_xref_file, disease_mesh_xref_fi
         if term_query == "":
             continue
 
-        payload = {'db': 'pubmed', 'term': term_query}
-        pmids = esearch_query(payload, retmax = 10000)
         row['mesh_id'] = '|'.join(mesh_ids)
         row['mesh_name'] = '|'.join(mesh_names)
         row['term_query'] = term_query
+        rows_out.append(row)
+
+    # the terms are queried concurrently
+    queries = [row['term_query'] for row in rows_out]
+    for row, pmids in zip(rows_out, esearch_queries(queries, retmax = 10000)):
         row['n_articles'] = len(pmids)
         row['pubmed_ids'] = '|'.join(pmids)
-        rows_out.append(row)
-        print('{} articles for {}'.format(len(pmids), '|'.join(mesh_names)))
+        log.info('{} articles for {}'.format(len(pmids), row['mesh_name']))
 
     make_gzip_pmid_file(rows_out, disease_pmid_file)
 
@@ -114,7 +127,6 @@ def download_anatomy_pmids(anatomy_file, anatomy_pmid_file):
 
     rows_out = list()
 
-    # this will take about 90 minutes
     for i, row in anatomy_df.iterrows():
         mesh_term_list = row.mesh_name.split('|')
         term_query = ""
@@ -122,12 +134,14 @@ def download_anatomy_pmids(anatomy_file, anatomy_pmid_file):
             term_query += ' AND {tissue}[MeSH Terms:noexp]'.format(tissue = mesh_term.lower())
         #term_query = '{tissue}[MeSH Terms:noexp]'.format(tissue = row.mesh_name.lower())
         term_query = term_query.lstrip(" AND ")
-        payload = {'db': 'pubmed', 'term': term_query}
-        pmids = esearch_query(payload, retmax = 5000, sleep=2)
         row['term_query'] = term_query
+        rows_out.append(row)
+
+    # the terms are queried concurrently
+    queries = [row['term_query'] for row in rows_out]
+    for row, pmids in zip(rows_out, esearch_queries(queries, retmax = 5000)):
         row['n_articles'] = len(pmids)
         row['pubmed_ids'] = '|'.join(pmids)
-        rows_out.append(row)
         log.info('{} articles for {}'.format(len(pmids), row.mesh_name))
 
     make_gzip_pmid_file(rows_out, anatomy_pmid_file)
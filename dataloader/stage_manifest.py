@@ -0,0 +1,103 @@
+import hashlib
+import json
+import logging
+import os
+
+from Configs import getConfig
+
+config = getConfig()
+log = logging.getLogger(__name__)
+log.addHandler(logging.StreamHandler())
+log.setLevel(getattr(logging, config.LOG_LEVEL))
+
+# The manifest records for every preprocessing stage the size and mtime of its input and
+# output files and a fingerprint of the config values it depends on:
+# {stage name: {"inputs": {file: [size, mtime_ns]}, "config": fingerprint, "outputs": {file: [size, mtime_ns]}}}
+# A stage is skipped if none of these changed since its last successful run. As the outputs
+# of a stage are inputs of its dependents, a rebuilt stage causes its dependents to be rebuilt.
+
+
+def get_file_stats(files):
+
+    stats = {}
+    for file_name in files:
+        try:
+            stat = os.stat(file_name)
+            stats[file_name] = [stat.st_size, stat.st_mtime_ns]
+        except FileNotFoundError:
+            stats[file_name] = None
+    return stats
+
+
+def get_changed_files(previous_stats, stats):
+
+    return [file_name for file_name in stats if previous_stats.get(file_name) != stats[file_name]]
+
+
+def get_config_fingerprint(config_keys):
+
+    values = {key: getattr(config, key) for key in config_keys}
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_manifest(manifest_file=None):
+
+    manifest_file = manifest_file or config.STAGE_MANIFEST_FILE
+    if not os.path.isfile(manifest_file):
+        return {}
+    with open(manifest_file) as in_file:
+        return json.load(in_file)
+
+
+def save_manifest(manifest, manifest_file=None):
+
+    manifest_file = manifest_file or config.STAGE_MANIFEST_FILE
+    temp_file = "{0}.{1}.tmp".format(manifest_file, os.getpid())
+    with open(temp_file, "w") as out_file:
+        json.dump(manifest, out_file, indent=2, sort_keys=True)
+    os.replace(temp_file, manifest_file)
+
+
+def is_stage_up_to_date(name, input_files, output_files, config_keys=(), manifest=None):
+
+    manifest = load_manifest() if manifest is None else manifest
+    entry = manifest.get(name)
+    if entry is None:
+        return False
+    outputs = get_file_stats(output_files)
+    return (entry["inputs"] == get_file_stats(input_files)
+            and entry["config"] == get_config_fingerprint(config_keys)
+            and entry["outputs"] == outputs
+            and None not in outputs.values())
+
+
+def run_stage(name, func, args, input_files, output_files, config_keys=()):
+    """Run func(*args) unless the stage is up to date according to the stage manifest.
+
+    input_files are the files func reads, output_files the files it writes and config_keys
+    the names of the config values that change its result. Returns True if the stage ran.
+    """
+    manifest = load_manifest()
+    if not config.FORCE_STAGE_REBUILD and is_stage_up_to_date(name, input_files, output_files, config_keys, manifest):
+        log.info("Skip stage '{0}', its inputs are unchanged.".format(name))
+        return False
+
+    # the inputs are recorded before the run, so an input written in the meantime causes a rebuild next time
+    inputs = get_file_stats(input_files)
+    if name in manifest:
+        changed_inputs = get_changed_files(manifest[name]["inputs"], inputs)
+        log.info("Run stage '{0}', changed inputs: {1}".format(name, ", ".join(changed_inputs) or "none"))
+    missing_inputs = [file_name for file_name, stats in inputs.items() if stats is None]
+    if missing_inputs:
+        log.warning("Stage '{0}' is missing the input file(s) {1}".format(name, missing_inputs))
+
+    func(*args)
+
+    manifest = load_manifest()
+    manifest[name] = {
+        "inputs": inputs,
+        "config": get_config_fingerprint(config_keys),
+        "outputs": get_file_stats(output_files),
+    }
+    save_manifest(manifest)
+    return True
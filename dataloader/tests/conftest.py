@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the loader modules import each other by module name, like when run from the dataloader directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
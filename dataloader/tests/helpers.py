@@ -0,0 +1,613 @@
+import gzip
+import hashlib
+import http.server
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from xml.sax.saxutils import escape
+
+import numpy
+import pandas
+from Configs import getConfig
+
+config = getConfig()
+
+# Data generators, stand-in servers and reference implementations of the replaced code paths,
+# shared by the tests and benchmark.py
+
+
+def make_entity_frame(entity_name, row_count=20000, null_ratio=0.3, seed=0):
+
+    rng = numpy.random.RandomState(seed)
+    data = {}
+    for column in config.ENTITY_PROPERTY_COLUMNS[entity_name]:
+        values = numpy.array(["{0}-{1}".format(column, i) for i in range(row_count)], dtype=object)
+        values[rng.random_sample(row_count) < null_ratio] = numpy.nan
+        data[column] = values
+    if entity_name == "Disease":
+        data["parents"] = ["DOID:{0},DOID:{1}".format(i, i + 1) for i in range(row_count)]
+
+    return pandas.DataFrame(data)
+
+
+class CypherCountingGraph(object):
+    # stand-in for py2neo.Graph, counts the statements and parameter rows graphio sends
+
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def run(self, cypher, *args, **parameters):
+        self.statements += 1
+        for value in parameters.values():
+            if isinstance(value, list):
+                self.rows += len(value)
+
+
+def make_loader():
+
+    from json2graphio import Json2graphio
+
+    loader = Json2graphio()
+    loader.config_dict_primarykey_generated_hashed_attrs_by_label = config.JSON2GRAPH_GENERATED_HASH_IDS
+    loader.config_str_primarykey_generated_hash_func = config.JSON2GRAPH_GENERATED_HASH_FUNC
+    loader.config_int_primarykey_generated_hash_cache_size = config.JSON2GRAPH_GENERATED_HASH_CACHE_SIZE
+    loader.config_list_skip_collection_hubs = "all"
+    loader.config_graphio_batch_size = config.COMMIT_INTERVAL
+    loader.config_str_dedup_policy = config.JSON2GRAPH_DEDUP_POLICY
+    return loader
+
+
+def make_target_compound_rows(row_count):
+
+    moas = ["Inhibitor", "Agonist", "Modulator", numpy.nan]
+    return [
+        {
+            "drugbank_id": "DB{0:05d}".format(i % 2000),
+            "ttd_drug_id": "D{0:05d}".format(i % 3000),
+            "ttd_id": "T{0:05d}".format(i % 500),
+            "moa": moas[i % len(moas)],
+            "activity": numpy.nan,
+            "reference": "PMID{0}".format(i),
+        }
+        for i in range(row_count)
+    ]
+
+
+def reference_hash_id(node, hash_attrs):
+    # the id generation before the per label caches
+    id_hash = hashlib.md5()
+    node_dict = dict(node)
+    for key in sorted(node_dict.keys()):
+        if key in hash_attrs:
+            id_hash.update(node_dict[key].encode())
+    return id_hash.hexdigest()
+
+
+def make_drugbank_xml(xml_file, drug_count=5000, seed=0):
+    # writes a gzipped xml file with the structure of a DrugBank release. Every drug gets a few
+    # targets with long sequences, which the parser skips but the full tree holds in memory
+
+    rng = numpy.random.RandomState(seed)
+    resources = ["ChEBI", "PubChem Compound", "PubChem Substance", "KEGG Compound", "KEGG Drug", "ChemSpider"]
+    with gzip.open(xml_file, "wt", encoding="utf-8") as out_file:
+        out_file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out_file.write('<drugbank xmlns="http://www.drugbank.ca" version="5.1">\n')
+        for i in range(drug_count):
+            drugbank_id = "DB{0:05d}".format(i)
+            out_file.write('<drug type="{0}" created="2005-06-13">\n'.format("small molecule" if i % 3 else "biotech"))
+            out_file.write('<drugbank-id primary="true">{0}</drugbank-id><drugbank-id>APRD{1:05d}</drugbank-id>\n'.format(
+                drugbank_id, i))
+            out_file.write("<name>Drug &amp; {0}</name>\n".format(i))
+            out_file.write("<description>{0}</description>\n".format(escape("Description <{0}> ".format(i) * 20)))
+            if i % 5:
+                out_file.write("<cas-number>{0}-{1}-5</cas-number>\n".format(i, i % 97))
+            else:
+                out_file.write("<cas-number/>\n")
+            out_file.write("<groups>{0}</groups>\n".format("".join(
+                "<group>{0}</group>".format(group) for group in ["approved", "investigational"][:1 + i % 2])))
+            out_file.write("<indication>Indication {0}</indication>\n".format(i))
+            out_file.write("<mechanism-of-action>{0}</mechanism-of-action>\n".format("Mechanism " * (i % 4)))
+            out_file.write("<synonyms>{0}</synonyms>\n".format("".join(
+                '<synonym language="{0}" coder="">Synonym {1} {2}</synonym>'.format(
+                    ["English", "French", ""][j % 3], i, j) for j in range(rng.randint(0, 6)))))
+            out_file.write("<international-brands>{0}</international-brands>\n".format("".join(
+                "<international-brand>Brand {0} {1}</international-brand>".format(i, j)
+                for j in range(i % 3))))
+            out_file.write("<products>{0}</products>\n".format("".join(
+                "<product><name>Product {0}</name><labeller>Labeller</labeller></product>".format(i % 50)
+                for j in range(i % 4))))
+            out_file.write("<categories>{0}</categories>\n".format("".join(
+                "<category><category>Category {0}</category><mesh-id>D{0:06d}</mesh-id></category>".format(j)
+                for j in range(i % 5))))
+            out_file.write("<atc-codes>{0}</atc-codes>\n".format("".join(
+                '<atc-code code="A{0:02d}BC{1:02d}"><level code="A{0:02d}B">Level</level></atc-code>'.format(i % 90, j)
+                for j in range(i % 3))))
+            out_file.write("<targets>{0}</targets>\n".format("".join(
+                '<target position="{0}"><id>BE{1:07d}</id><polypeptide id="P{1:05d}"><amino-acid-sequence format="FASTA">'
+                "{2}</amino-acid-sequence></polypeptide></target>".format(j, i * 10 + j, "MKTAYIAKQR" * 100)
+                for j in range(5))))
+            if i % 7:
+                # some drugs have a property without value, which has to be skipped
+                out_file.write("<calculated-properties>{0}{1}</calculated-properties>\n".format(
+                    "" if i % 11 else "<property><kind>InChI</kind></property>", "".join(
+                        "<property><kind>{0}</kind><value>{1}</value><source>ChemAxon</source></property>".format(
+                            kind, value)
+                        for kind, value in [("logP", "1.5"), ("InChI", "InChI=1S/C{0}H{0}".format(i)),
+                                            ("InChIKey", "InChIKey=KEY{0}".format(i)), ("SMILES", "CC")])))
+            # the first identifier of a resource counts
+            out_file.write("<external-identifiers>{0}</external-identifiers>\n".format("".join(
+                "<external-identifier><resource>{0}</resource><identifier>{1}{2}</identifier></external-identifier>".format(
+                    resource_name, j, i) for j, resource_name in enumerate(resources + resources[:2]) if (i + j) % 4)))
+            out_file.write("</drug>\n")
+        out_file.write("</drugbank>\n")
+
+
+def make_mesh_xml(xml_file, descriptor_count=20000, seed=0):
+    # writes a gzipped xml file with the structure of a MeSH descriptor release
+
+    rng = numpy.random.RandomState(seed)
+    with gzip.open(xml_file, "wt", encoding="utf-8") as out_file:
+        out_file.write('<?xml version="1.0"?>\n<DescriptorRecordSet LanguageCode="eng">\n')
+        tree_numbers = {}
+        for i in range(descriptor_count):
+            out_file.write('<DescriptorRecord DescriptorClass="1">\n<DescriptorUI>D{0:06d}</DescriptorUI>\n'.format(i))
+            if i % 101:
+                # names with quotes and tabs need quoting in the tsv files
+                name = ['Disease {0}', 'Disease "{0}"', 'Disease\t{0}', 'Diseases, {0}'][i % 4].format(i)
+                out_file.write("<DescriptorName><String>{0}</String></DescriptorName>\n".format(escape(name)))
+            # descriptor i is below descriptor (i - 1) // 4. leaves may have no or an extra top level tree number
+            tree_numbers[i] = "C01" if i == 0 else "{0}.{1:03d}".format(tree_numbers[(i - 1) // 4], (i - 1) % 4)
+            leaf_tree_numbers = [[], [tree_numbers[i]], [tree_numbers[i], "Z{0:02d}".format(i % 50)]]
+            out_file.write("<TreeNumberList>{0}</TreeNumberList>\n".format("".join(
+                "<TreeNumber>{0}</TreeNumber>".format(tree_number) for tree_number in
+                (leaf_tree_numbers[rng.randint(0, 3)] if i > descriptor_count // 4 else [tree_numbers[i]]))))
+            out_file.write("<ConceptList>{0}</ConceptList>\n".format("".join(
+                '<Concept PreferredConceptYN="Y"><ConceptUI>M{0:07d}</ConceptUI>'
+                "<SemanticTypeList><SemanticType><SemanticTypeUI>T{1:03d}</SemanticTypeUI></SemanticType></SemanticTypeList>"
+                '<TermList><Term ConceptPreferredTermYN="Y"><TermUI>T{0:07d}</TermUI><String>Term {0}</String>'
+                "</Term></TermList></Concept>".format(i * 10 + j, j) for j in range(1 + i % 3))))
+            out_file.write("</DescriptorRecord>\n")
+        out_file.write("</DescriptorRecordSet>\n")
+
+
+def make_obo_file(obo_file, term_count=20000, prefix="DOID", unnamed_ratio=0.0, depiction_ratio=0.0, seed=0):
+    # an ontology with header, typedefs, obsolete terms and the tag line variants of DOID and Uberon.
+    # Obsolete terms are not referenced by other terms. Uberon has terms without a name and
+    # depicted_by relationships to image urls
+    rng = numpy.random.RandomState(seed)
+    obsolete = rng.random_sample(term_count) < 0.02
+    vocabularies = ["MESH", "UMLS_CUI", "ICD10CM", "NCI", "SNOMEDCT_US_2020_03_01", "FMA"]
+    subsets = ["uberon_slim", "pheno_slim", "non_informative", "upper_level", "grouping_class", "DO_rare_slim"]
+    with open(obo_file, "w") as out_file:
+        out_file.write("format-version: 1.2\ndata-version: releases/2020-01-01\nsubsetdef: uberon_slim \"slim\"\n"
+                       "ontology: {0}\n\n".format(prefix.lower()))
+        for term in range(term_count):
+            term_id = "{0}:{1:07d}".format(prefix, term)
+            lines = ["[Term]", "id: " + term_id]
+            if obsolete[term]:
+                lines.append("is_obsolete: true")
+            if rng.random_sample() >= unnamed_ratio:
+                lines.append("name: term {0} of {1}".format(term, prefix))
+            if rng.random_sample() < 0.7:
+                lines.append('def: "Definition of term {0} ! with {{braces}}." [url:http://example.org/{0}]'.format(term))
+            lines.append("! a comment line")
+            for xref in range(rng.randint(5)):
+                vocabulary = vocabularies[rng.randint(len(vocabularies))]
+                modifier = ' {source="MONDO:equivalentTo"}' if rng.random_sample() < 0.3 else ""
+                comment = " ! some comment" if rng.random_sample() < 0.2 else ""
+                lines.append("xref: {0}:{1}{2}{3}".format(vocabulary, rng.randint(100000), modifier, comment))
+            for subset in set(rng.randint(len(subsets), size=rng.randint(3))):
+                lines.append("subset: " + subsets[subset])
+            if term:
+                for parent in set(rng.randint(term // 2, term, size=2 if rng.random_sample() < 0.1 else 1)):
+                    if not obsolete[parent]:
+                        lines.append("is_a: {0}:{1:07d} ! term {1} of {0}".format(prefix, parent))
+                target = rng.randint(term)
+                if rng.random_sample() < 0.3 and not obsolete[target]:
+                    lines.append("relationship: part_of {0}:{1:07d}".format(prefix, target))
+                if rng.random_sample() < depiction_ratio:
+                    lines.append("relationship: depicted_by https://example.org/images/{0}.png".format(term))
+            out_file.write("\n".join(lines) + "\n\n")
+        out_file.write("[Typedef]\nid: part_of\nname: part of\nis_transitive: true\n")
+
+
+def reference_parse_drug(drug):
+    # the findtext/findall based extraction parse_drug replaced
+
+    ns = '{http://www.drugbank.ca}'
+    inchikey_template = "{ns}calculated-properties/{ns}property[{ns}kind='InChIKey']/{ns}value"
+    inchi_template = "{ns}calculated-properties/{ns}property[{ns}kind='InChI']/{ns}value"
+    identifier_template = "{ns}external-identifiers/{ns}external-identifier[{ns}resource='{resource}']/{ns}identifier"
+
+    row = {}
+    row['type'] = drug.get('type')
+    row['drugbank_id'] = drug.findtext(ns + "drugbank-id[@primary='true']")
+    row['name'] = drug.findtext(ns + "name")
+    row['description'] = drug.findtext(ns + "description")
+    row['cas_number'] = drug.findtext(ns + "cas-number")
+    row['groups'] = [group.text for group in drug.findall("{ns}groups/{ns}group".format(ns=ns))]
+    row['atc_codes'] = [code.get('code') for code in drug.findall("{ns}atc-codes/{ns}atc-code".format(ns=ns))]
+    row['categories'] = [x.findtext(ns + 'category') for x in
+                         drug.findall("{ns}categories/{ns}category".format(ns=ns))]
+    row['inchi'] = drug.findtext(inchi_template.format(ns=ns))
+    row['inchikey'] = drug.findtext(inchikey_template.format(ns=ns))
+    row['indication'] = drug.findtext(ns + "indication")
+    row['mechanism'] = drug.findtext(ns + "mechanism-of-action")
+    for key, resource_name in [("chebi_id", "ChEBI"), ("pubchem_id", "PubChem Compound"), ("kegg_id", "KEGG Compound"),
+                               ("kegg_drug_id", "KEGG Drug"), ("chemspider_id", "ChemSpider")]:
+        row[key] = drug.findtext(identifier_template.format(ns=ns, resource=resource_name))
+    aliases = {
+        elem.text for elem in
+        drug.findall("{ns}international-brands/{ns}international-brand".format(ns=ns)) +
+        drug.findall("{ns}synonyms/{ns}synonym[@language='English']".format(ns=ns)) +
+        drug.findall("{ns}products/{ns}product/{ns}name".format(ns=ns))
+    }
+    aliases.add(row['name'])
+    row['aliases'] = sorted(aliases)
+    row['license'] = 'het CC0 1.0'
+    row['source'] = 'DrugBank'
+    row['source_url'] = "https://www.drugbank.ca/drugs/{0}".format(row['drugbank_id'])
+    return row
+
+
+def make_xref_frame(row_count=100000, mesh_ratio=0.1, seed=0):
+    # Like the Uberon xref table, a minority of MeSH descriptors and tree numbers (known, unknown and
+    # outdated ones) among other vocabularies and malformed values. Returns the frame and the tree number lookup
+    from uberon_parser import MESH_XREF_MAP
+
+    rng = numpy.random.RandomState(seed)
+    tn_to_id = {"A{0:02d}.{1:03d}".format(i % 100, i // 100): "D{0:06d}".format(i) for i in range(20000)}
+    tree_numbers = list(tn_to_id)
+    mapped_tree_numbers = list(MESH_XREF_MAP)
+    mesh_makers = [
+        lambda i: "MESH:D{0:06d}".format(i),
+        lambda i: "MESH:" + tree_numbers[i % len(tree_numbers)],
+        lambda i: "MESH:B{0:02d}.{1:03d}".format(i % 100, i % 1000),
+        lambda i: "MESH:" + mapped_tree_numbers[i % len(mapped_tree_numbers)],
+        lambda i: "MESH:{0}D{1:06d}".format(mapped_tree_numbers[i % len(mapped_tree_numbers)], i),
+        lambda i: "MESH:A01:{0}".format(i),
+        lambda i: "MESH:",
+    ]
+    other_makers = [
+        lambda i: "FMA:{0}".format(i),
+        lambda i: "UMLS:C{0:07d}".format(i),
+        lambda i: "NCIT:C{0}".format(i),
+        lambda i: "mesh:A01.{0:03d}".format(i % 1000),
+        lambda i: "no-vocab-{0}".format(i),
+        lambda i: None,
+        lambda i: numpy.nan,
+    ]
+    xrefs = []
+    for i in range(row_count):
+        makers = mesh_makers if rng.random_sample() < mesh_ratio else other_makers
+        xrefs.append(makers[rng.randint(len(makers))](i))
+    df = pandas.DataFrame({"uberon_id": ["UBERON:{0:07d}".format(i) for i in range(row_count)], "xref": xrefs})
+
+    return df, tn_to_id
+
+
+def reference_update_xrefs(xrefs, tn_to_id):
+    # the per row closure update_mesh_xrefs replaced
+    import re
+
+    from uberon_parser import MESH_XREF_MAP as xref_map
+
+    def update_xref(x):
+        try:
+            vocab, identifier = x.split(':', 1)
+            if vocab == 'MESH':
+                if re.search('D[0-9]{6}', identifier):
+                    if identifier in xref_map:
+                        return 'MESH:' + xref_map.get(identifier)
+                    return x
+                return 'MESH:' + (xref_map.get(identifier) or tn_to_id.get(identifier) or identifier)
+        except Exception:
+            pass
+
+        return x
+
+    return xrefs.map(update_xref)
+
+
+def make_disease_dag(node_count=20000, multi_parent_ratio=0.1, seed=0):
+    # child_dict of an is_a DAG like DOID: one root, about 15 levels deep, some terms with two parents
+    rng = numpy.random.RandomState(seed)
+    child_dict = {}
+    for node in range(1, node_count):
+        parent_count = 2 if rng.random_sample() < multi_parent_ratio else 1
+        for parent in set(rng.randint(node // 2, node, size=parent_count)):
+            child_dict.setdefault("DOID:{0}".format(parent), []).append("DOID:{0}".format(node))
+
+    return child_dict
+
+
+def reference_filter_nodes_by_ancestor(disease_id, child_dict):
+    # the recursive version build_descendant_index replaced
+
+    children = []
+
+    if not disease_id in child_dict:
+        return [disease_id]
+    else:
+        for child in child_dict[disease_id]:
+            children += [child] + reference_filter_nodes_by_ancestor(child, child_dict)
+
+    return children
+
+
+def reference_load_disease_file(disease_download_file, disease_output_file, disease_xref_output_file):
+    # the obonet graph based extraction load_disease_file replaced
+    import csv
+
+    import obonet
+
+    from disease_ontology_parser import parse_ontology_entry
+
+    ont = obonet.read_obo(disease_download_file)
+    xref_list = []
+    with open(disease_output_file, "w", newline='') as outfile:
+        writer = csv.writer(outfile, delimiter="\t")
+        writer.writerow(["doid", "name", "definition", "parents", "link", "source", "license"])
+        for id_, data in ont.nodes(data=True):
+            writer.writerow(parse_ontology_entry(id_, data))
+            for xref in data.get('xref', []):
+                xref_list.append({'doid': id_, 'xref': xref})
+
+    pandas.DataFrame(xref_list).to_csv(disease_xref_output_file, sep="\t", index=False)
+
+
+def reference_parse_anatomy_entries(basic_obo_file):
+    # the graph based extraction parse_anatomy_entries replaced, with obonet in place of the obo package
+    import obonet
+
+    basic = obonet.read_obo(basic_obo_file, ignore_obsolete=False)
+    term_rows = []
+    xref_rows = []
+    subset_rows = []
+    for node, data in basic.nodes(data=True):
+        # nodes that are only relationship targets have no data
+        if 'name' not in data:
+            continue
+        term_rows.append((node, data['name']))
+        for xref in data.get('xref', []):
+            xref_rows.append((node, xref))
+        for subset in data.get('subset', []):
+            subset_rows.append((node, subset))
+
+    term_df = pandas.DataFrame(term_rows, columns=['uberon_id', 'uberon_name']).sort_values(['uberon_id', 'uberon_name'])
+    xref_df = pandas.DataFrame(xref_rows, columns=['uberon_id', 'xref']).sort_values(['uberon_id', 'xref'])
+    subset_df = pandas.DataFrame(subset_rows, columns=['uberon_id', 'subset']).sort_values(['uberon_id', 'subset'])
+    return (term_df, xref_df, subset_df)
+
+
+class StandInHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    # http.server.ThreadingHTTPServer needs python 3.7
+    daemon_threads = True
+
+
+class StandInHTTPRequestHandler(http.server.BaseHTTPRequestHandler):
+    # serves the files of server.files {path: bytes} with ETag, Last-Modified, conditional and range requests.
+    # server.truncate_once {path: byte count} cuts the next response of a file after that many bytes
+    # server.delay is slept per 64 KiB, to give the transfers some latency
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+
+        content = self.server.files.get(self.path)
+        if content is None:
+            self.send_error(404)
+            return
+        etag = '"{0}"'.format(hashlib.sha256(content).hexdigest()[:16])
+        self.server.requests.append((self.path, dict(self.headers)))
+
+        if_none_match = self.headers.get("If-None-Match")
+        if (if_none_match == etag or
+                (if_none_match is None and self.headers.get("If-Modified-Since") == self.server.last_modified)):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) in (etag, self.server.last_modified):
+            start = int(range_header.split("=")[1].split("-")[0])
+            if start >= len(content):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {0}-{1}/{2}".format(start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(content) - start))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", self.server.last_modified)
+        self.end_headers()
+
+        end = len(content)
+        if self.path in self.server.truncate_once:
+            end = min(end, start + self.server.truncate_once.pop(self.path))
+        for offset in range(start, end, 2 ** 16):
+            time.sleep(self.server.delay)
+            self.wfile.write(content[offset:min(offset + 2 ** 16, end)])
+        self.close_connection = True
+
+
+def start_http_stand_in(files, delay=0.0):
+
+    server = StandInHTTPServer(("127.0.0.1", 0), StandInHTTPRequestHandler)
+    server.files = files
+    server.truncate_once = {}
+    server.delay = delay
+    server.requests = []
+    server.last_modified = "Wed, 01 Jan 2020 00:00:00 GMT"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}".format(server.server_address[1])
+
+
+class StandInFTPHandler(socketserver.StreamRequestHandler):
+    # a minimal passive mode FTP server for the files of server.files {path: bytes}, with SIZE, MDTM and REST.
+    # server.truncate_once and server.delay work like for the HTTP stand-in
+
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+
+        self.reply("220 stand-in")
+        rest = 0
+        data_socket = None
+        for line in self.rfile:
+            command, _, argument = line.decode().strip().partition(" ")
+            command = command.upper()
+            self.server.requests.append((command, argument))
+            if command == "USER":
+                self.reply("331 password please")
+            elif command in ("PASS", "TYPE"):
+                self.reply("230 ok" if command == "PASS" else "200 ok")
+            elif command in ("SIZE", "MDTM"):
+                if argument not in self.server.files:
+                    self.reply("550 no such file")
+                elif command == "SIZE":
+                    self.reply("213 {0}".format(len(self.server.files[argument])))
+                else:
+                    self.reply("213 {0}".format(self.server.mdtm.get(argument, "20200101000000")))
+            elif command == "PASV":
+                data_socket = socket.socket()
+                data_socket.bind(("127.0.0.1", 0))
+                data_socket.listen(1)
+                port = data_socket.getsockname()[1]
+                self.reply("227 Entering Passive Mode (127,0,0,1,{0},{1})".format(port // 256, port % 256))
+            elif command == "REST":
+                rest = int(argument)
+                self.reply("350 restarting at {0}".format(rest))
+            elif command == "RETR":
+                content = self.server.files[argument]
+                self.reply("150 sending")
+                connection, _ = data_socket.accept()
+                end = len(content)
+                if argument in self.server.truncate_once:
+                    end = min(end, rest + self.server.truncate_once.pop(argument))
+                with connection:
+                    for offset in range(rest, end, 2 ** 16):
+                        time.sleep(self.server.delay)
+                        connection.sendall(content[offset:min(offset + 2 ** 16, end)])
+                data_socket.close()
+                rest = 0
+                self.reply("226 done" if end == len(content) else "426 connection closed")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+def start_ftp_stand_in(files, delay=0.0):
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), StandInFTPHandler)
+    server.daemon_threads = True
+    server.files = files
+    server.truncate_once = {}
+    server.delay = delay
+    server.requests = []
+    server.mdtm = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "ftp://127.0.0.1:{0}".format(server.server_address[1])
+
+
+class StandInEutilsHandler(http.server.BaseHTTPRequestHandler):
+    # a fake NCBI esearch: every term matches server.get_ids(term), returned in pages of retmax ids.
+    # With usehistory=y the result is stored under a WebEnv and its pages can be fetched with efetch,
+    # unless server.history is False. server.new_ids {term: ids} are the articles added since the last fetch,
+    # only they are found with a mindate. More than server.rate requests in a second are answered with 429, every server.fail_every-th request
+    # with 503 and every response takes server.delay seconds
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body=b""):
+
+        self.send_response(status)
+        self.send_header("Content-Type", "text/xml")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+
+        url = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        now = time.monotonic()
+        with self.server.lock:
+            self.server.requests.append((url.path, params))
+            # rejected requests do not count against the limit
+            recent = [t for t in self.server.request_times if t > now - 1.0]
+            rate_limited = len(recent) >= self.server.rate
+            self.server.request_times = recent if rate_limited else recent + [now]
+            request_number = len(self.server.requests)
+        if rate_limited:
+            self.server.rejected.append(429)
+            self.reply(429)
+            return
+        if self.server.fail_every and request_number % self.server.fail_every == 0:
+            self.server.rejected.append(503)
+            self.reply(503)
+            return
+        time.sleep(self.server.delay)
+
+        retstart = int(params.get("retstart", 0))
+        retmax = int(params.get("retmax", 20))
+        if url.path == "/esearch.fcgi":
+            ids = self.server.new_ids.get(params["term"], [])
+            if "mindate" not in params:
+                ids = ids + self.server.get_ids(params["term"])
+            history = ""
+            if params.get("usehistory") == "y" and self.server.history:
+                with self.server.lock:
+                    web_env = "MCID_{0}".format(request_number)
+                    self.server.history_sets[web_env] = ids
+                history = "<QueryKey>1</QueryKey><WebEnv>{0}</WebEnv>".format(web_env)
+            body = "<eSearchResult><Count>{0}</Count><RetMax>{1}</RetMax><RetStart>{2}</RetStart>{3}<IdList>{4}</IdList></eSearchResult>".format(
+                len(ids), retmax, retstart, history,
+                "".join("<Id>{0}</Id>".format(pmid) for pmid in ids[retstart:retstart + retmax]))
+        elif url.path == "/efetch.fcgi":
+            ids = self.server.history_sets.get(params.get("WebEnv"))
+            if ids is None or params.get("query_key") != "1":
+                body = "<eFetchResult><ERROR>Unable to obtain query #1</ERROR></eFetchResult>"
+            else:
+                body = "<IdList>{0}</IdList>".format(
+                    "".join("<Id>{0}</Id>".format(pmid) for pmid in ids[retstart:retstart + retmax]))
+        else:
+            self.reply(404)
+            return
+        self.reply(200, body.encode())
+
+
+def get_stand_in_pmids(term, max_count=250):
+    # deterministic, descending PMIDs per term like esearch's default sort
+    rng = numpy.random.RandomState(int(hashlib.sha256(term.encode()).hexdigest()[:8], 16))
+    pmids = set(rng.randint(1, 30000000, rng.randint(0, max_count)))
+    return [str(pmid) for pmid in sorted(pmids, reverse=True)]
+
+
+def start_eutils_stand_in(rate=10, fail_every=0, delay=0.0):
+
+    server = StandInHTTPServer(("127.0.0.1", 0), StandInEutilsHandler)
+    server.get_ids = get_stand_in_pmids
+    server.rate = rate
+    server.fail_every = fail_every
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.requests = []
+    server.request_times = []
+    server.rejected = []
+    server.history = True
+    server.history_sets = {}
+    server.new_ids = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{0}/".format(server.server_address[1])
@@ -0,0 +1,164 @@
+import json
+import os
+
+import pandas
+import pytest
+
+import dataset_reader
+from dataset_reader import get_index_file, load_dataset_index, read_dataset, scan_dataset
+
+ROW_COUNT = 53
+INTERVAL = 10
+
+
+def write_dataset(dataset_file, row_count=ROW_COUNT):
+    # score only has missing values and float values after row 30 and flag only has missing values
+    # in the second half, so slices parsed on their own would get other column types than the whole file
+    lines = ["id\tname\tcount\tscore\tflag"]
+    for row in range(row_count):
+        name = ['name {0}', '"name\t{0}"', '"multi\nline ""name"" {0}"', 'name, {0}'][row % 4].format(row)
+        score = "" if row > 30 and row % 3 == 0 else str(row) if row <= 30 else "{0}.5".format(row)
+        flag = "" if row > row_count // 2 and row % 5 == 0 else ["True", "false"][row % 2]
+        lines.append("ID{0}\t{1}\t{2}\t{3}\t{4}".format(row, name, row * 2, score, flag))
+        if row % 17 == 0:
+            lines.append("")
+    with open(dataset_file, "w") as out_file:
+        out_file.write("\n".join(lines) + "\n")
+
+
+@pytest.fixture
+def dataset_file(tmp_path):
+
+    dataset_file = str(tmp_path / "dataset.csv")
+    write_dataset(dataset_file)
+    return dataset_file
+
+
+@pytest.mark.parametrize("with_offsets", [True, False])
+@pytest.mark.parametrize("from_row, to_row", [(0, 10), (0, 4), (3, 9), (18, 30), (23, 37), (40, ROW_COUNT), (15, 15),
+                                              (50, ROW_COUNT + 10), (ROW_COUNT + 1, ROW_COUNT + 5)])
+def test_slice_matches_full_read(dataset_file, with_offsets, from_row, to_row):
+
+    expected = pandas.read_csv(dataset_file, sep="\t")[from_row:to_row]
+    layout = scan_dataset(dataset_file, INTERVAL)
+    if not with_offsets:
+        layout = layout._replace(offsets=[])
+
+    data = read_dataset(dataset_file, from_row, to_row, layout=layout)
+
+    if len(expected):
+        pandas.testing.assert_frame_equal(data, expected)
+    else:
+        # pandas can only guess the types of the columns without hints from an empty slice
+        assert list(data.columns) == list(expected.columns)
+        assert len(data) == 0
+
+
+def test_slice_with_renamed_columns(tmp_path):
+
+    dataset_file = str(tmp_path / "dataset.csv")
+    with open(dataset_file, "w") as out_file:
+        out_file.write("id\tid\t\n" + "".join('a{0}\t"b\n{0}"\t{0}\n'.format(row) for row in range(30)))
+    layout = scan_dataset(dataset_file, INTERVAL)
+
+    pandas.testing.assert_frame_equal(read_dataset(dataset_file, 12, 25, layout=layout),
+                                      pandas.read_csv(dataset_file, sep="\t")[12:25])
+
+
+def test_bool_column_with_missing_values_is_object_in_every_slice(dataset_file):
+
+    layout = scan_dataset(dataset_file, INTERVAL)
+
+    # the first half of the flag column has no missing values
+    for from_row, to_row in [(0, 20), (30, ROW_COUNT)]:
+        flags = read_dataset(dataset_file, from_row, to_row, layout=layout)["flag"]
+        assert flags.dtype == object
+        assert set(flags.dropna()) <= {True, False}
+
+
+@pytest.fixture
+def scan_count(monkeypatch):
+    # counts the index builds
+    calls = []
+
+    def counting_scan_dataset(*args, **kwargs):
+        calls.append(args)
+        return scan_dataset(*args, **kwargs)
+
+    monkeypatch.setattr(dataset_reader, "scan_dataset", counting_scan_dataset)
+    monkeypatch.setattr(dataset_reader.config, "DATASET_INDEX_INTERVAL", INTERVAL)
+    return calls
+
+
+def test_index_is_reused_until_the_file_changes(dataset_file, scan_count):
+
+    layout = load_dataset_index(dataset_file)
+    assert load_dataset_index(dataset_file) == layout
+    assert len(scan_count) == 1
+
+    # same size, other mtime
+    stat = os.stat(dataset_file)
+    os.utime(dataset_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_dataset_index(dataset_file) == layout
+    assert len(scan_count) == 2
+
+    # other size
+    write_dataset(dataset_file, ROW_COUNT + 5)
+    assert load_dataset_index(dataset_file).row_count == ROW_COUNT + 5
+    assert len(scan_count) == 3
+    assert load_dataset_index(dataset_file).row_count == ROW_COUNT + 5
+    assert len(scan_count) == 3
+
+
+def test_index_is_rebuilt_for_another_interval(dataset_file, scan_count, monkeypatch):
+
+    load_dataset_index(dataset_file)
+    monkeypatch.setattr(dataset_reader.config, "DATASET_INDEX_INTERVAL", INTERVAL * 2)
+
+    layout = load_dataset_index(dataset_file)
+
+    assert len(scan_count) == 2
+    assert layout.interval == INTERVAL * 2
+    assert layout == scan_dataset(dataset_file, INTERVAL * 2)
+
+
+@pytest.mark.parametrize("content", ["", '{"size": 1', "[]", '{"size": 1}'])
+def test_unreadable_index_is_rebuilt(dataset_file, scan_count, content):
+
+    with open(get_index_file(dataset_file), "w") as out_file:
+        out_file.write(content)
+
+    assert load_dataset_index(dataset_file) == scan_dataset(dataset_file, INTERVAL)
+    assert len(scan_count) == 1
+    with open(get_index_file(dataset_file)) as in_file:
+        assert json.load(in_file)["row_count"] == ROW_COUNT
+
+
+def test_stale_index_is_not_trusted(dataset_file, scan_count):
+
+    load_dataset_index(dataset_file)
+    # an index of another version of the file, e.g. copied along with an older dataset
+    with open(get_index_file(dataset_file)) as in_file:
+        index = json.load(in_file)
+    index["size"] -= 1
+    index["offsets"] = [offset + 1 for offset in index["offsets"]]
+    with open(get_index_file(dataset_file), "w") as out_file:
+        json.dump(index, out_file)
+
+    assert load_dataset_index(dataset_file) == scan_dataset(dataset_file, INTERVAL)
+    assert len(scan_count) == 2
+
+
+@pytest.mark.parametrize("from_row, to_row", [(0, 10), (9, 11), (10, 20), (23, 37), (40, ROW_COUNT), (45, None)])
+def test_indexed_read_matches_read_without_index(dataset_file, scan_count, from_row, to_row):
+
+    # like load_data with USE_DATASET_INDEX = False
+    without_index = read_dataset(dataset_file, from_row, to_row, layout=scan_dataset(dataset_file)._replace(offsets=[]))
+
+    layout = load_dataset_index(dataset_file)
+    assert layout.offsets
+    # from the index file this time
+    assert load_dataset_index(dataset_file) == layout
+    data = read_dataset(dataset_file, from_row, to_row, layout=layout)
+
+    pandas.testing.assert_frame_equal(data, without_index)
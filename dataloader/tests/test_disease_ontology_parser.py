@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+from disease_ontology_parser import build_descendant_index, filter_nodes_by_ancestor, load_disease_file
+from helpers import make_disease_dag, make_obo_file, reference_filter_nodes_by_ancestor, reference_load_disease_file
+
+
+def test_descendant_index_matches_recursive_filter():
+
+    child_dict = make_disease_dag(500)
+    queries = ["DOID:{0}".format(node) for node in range(0, 500, 7)]
+
+    descendant_index = build_descendant_index(child_dict, queries)
+
+    assert ([filter_nodes_by_ancestor(query, child_dict, descendant_index) for query in queries] ==
+            [set(reference_filter_nodes_by_ancestor(query, child_dict)) for query in queries])
+
+
+def test_filter_deeper_than_the_recursion_limit():
+
+    chain = {"DOID:{0}".format(node): ["DOID:{0}".format(node + 1)] for node in range(2 * sys.getrecursionlimit())}
+
+    assert len(filter_nodes_by_ancestor("DOID:0", chain)) == len(chain)
+
+
+def test_load_disease_file_matches_obonet_graph(tmp_path):
+
+    # the graph based reference needs obonet, which the loader itself does not use anymore
+    pytest.importorskip("obonet")
+    obo_file = str(tmp_path / "doid.obo")
+    make_obo_file(obo_file, 500)
+    outputs = []
+    for load in [reference_load_disease_file, load_disease_file]:
+        output_files = [os.path.join(str(tmp_path), "{0}-{1}.csv".format(name, load.__name__)) for name in ["doid", "doid-xref"]]
+        load(obo_file, *output_files)
+        outputs.append([])
+        for output_file in output_files:
+            with open(output_file, "rb") as in_file:
+                outputs[-1].append(in_file.read())
+
+    assert outputs[0] == outputs[1]
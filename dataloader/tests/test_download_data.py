@@ -0,0 +1,106 @@
+import ftplib
+import hashlib
+import json
+import os
+
+import numpy
+import pytest
+
+from download_data import DownloadJob, download_jobs, get_part_file
+from helpers import start_ftp_stand_in, start_http_stand_in
+
+FILE_SIZE = 2 ** 18
+
+
+@pytest.fixture
+def stand_ins():
+    rng = numpy.random.RandomState(0)
+    files = {"/file{0}.gz".format(i): rng.bytes(FILE_SIZE) for i in range(2)}
+    http_server, http_url = start_http_stand_in(files)
+    ftp_server, ftp_url = start_ftp_stand_in(files)
+    yield files, {"http": (http_server, http_url), "ftp": (ftp_server, ftp_url)}
+    http_server.shutdown()
+    ftp_server.shutdown()
+
+
+def make_jobs(files, urls, dest_dir):
+    return [DownloadJob(url + path, os.path.join(dest_dir, protocol, path.strip("/")))
+            for path in files for protocol, url in urls]
+
+
+def read(file_name):
+    with open(file_name, "rb") as in_file:
+        return in_file.read()
+
+
+def test_download_jobs(stand_ins, tmp_path):
+
+    files, servers = stand_ins
+    jobs = make_jobs(files, [(protocol, url) for protocol, (server, url) in servers.items()], str(tmp_path))
+
+    changed_files = download_jobs(jobs, 2, str(tmp_path / "download-manifest.json"))
+
+    assert sorted(changed_files) == sorted(job.dest_file for job in jobs)
+    for job in jobs:
+        assert read(job.dest_file) == files["/" + os.path.basename(job.dest_file)]
+
+
+def test_unchanged_files_are_not_fetched_again(stand_ins, tmp_path):
+
+    files, servers = stand_ins
+    http_server, http_url = servers["http"]
+    ftp_server, ftp_url = servers["ftp"]
+    jobs = make_jobs(files, [("http", http_url), ("ftp", ftp_url)], str(tmp_path))
+    manifest_file = str(tmp_path / "download-manifest.json")
+    download_jobs(jobs, 2, manifest_file)
+    mtimes = {job.dest_file: os.stat(job.dest_file).st_mtime_ns for job in jobs}
+    del http_server.requests[:]
+    del ftp_server.requests[:]
+
+    assert download_jobs(jobs, 2, manifest_file) == []
+
+    assert {job.dest_file: os.stat(job.dest_file).st_mtime_ns for job in jobs} == mtimes
+    assert all("If-None-Match" in headers for path, headers in http_server.requests)
+    assert not [request for request in ftp_server.requests if request[0] == "RETR"]
+
+
+def test_changed_files_are_fetched(stand_ins, tmp_path):
+
+    files, servers = stand_ins
+    ftp_server, ftp_url = servers["ftp"]
+    jobs = make_jobs(files, [("http", servers["http"][1]), ("ftp", ftp_url)], str(tmp_path))
+    manifest_file = str(tmp_path / "download-manifest.json")
+    download_jobs(jobs, 2, manifest_file)
+
+    files["/file1.gz"] = b"changed" * 1000
+    ftp_server.mdtm["/file1.gz"] = "20200202000000"
+    changed_files = download_jobs(jobs, 2, manifest_file)
+
+    assert sorted(changed_files) == sorted(job.dest_file for job in jobs if job.dest_file.endswith("file1.gz"))
+    for job in jobs:
+        assert read(job.dest_file) == files["/" + os.path.basename(job.dest_file)]
+
+
+@pytest.mark.parametrize("protocol", ["http", "ftp"])
+def test_interrupted_download_is_resumed(stand_ins, tmp_path, protocol):
+
+    files, servers = stand_ins
+    server, url = servers[protocol]
+    path = "/file0.gz"
+    dest_file = str(tmp_path / "file0.gz")
+    manifest_file = str(tmp_path / "download-manifest.json")
+    server.truncate_once[path] = FILE_SIZE // 3
+
+    with pytest.raises((IOError, ftplib.Error)):
+        download_jobs([DownloadJob(url + path, dest_file)], 1, manifest_file)
+    assert os.path.getsize(get_part_file(dest_file)) == FILE_SIZE // 3 and not os.path.exists(dest_file)
+
+    del server.requests[:]
+    download_jobs([DownloadJob(url + path, dest_file)], 1, manifest_file)
+
+    assert read(dest_file) == files[path]
+    assert [request for request in server.requests
+            if request[0] == "REST" or (request[0] == path and "Range" in request[1])]
+    with open(manifest_file) as in_file:
+        entry = json.load(in_file)[dest_file]
+    assert entry["size"] == FILE_SIZE and entry["sha256"] == hashlib.sha256(files[path]).hexdigest()
@@ -0,0 +1,30 @@
+import gzip
+import os
+import xml.etree.ElementTree as ET
+
+from drugbank_parser import load_drugbank_file, parse_drug
+from helpers import make_drugbank_xml, reference_parse_drug
+
+
+def test_streaming_matches_full_parse(tmp_path):
+
+    xml_file = str(tmp_path / "drugbank.xml.gz")
+    make_drugbank_xml(xml_file, drug_count=50)
+    outputs = []
+    for streaming in [False, True]:
+        output_file = os.path.join(str(tmp_path), "drugbank-compound-dataset-{0}.csv".format(streaming))
+        load_drugbank_file(None, xml_file, output_file, streaming=streaming)
+        with open(output_file, "rb") as in_file:
+            outputs.append(in_file.read())
+
+    assert outputs[0] == outputs[1]
+
+
+def test_parse_drug_matches_findtext_extraction(tmp_path):
+
+    xml_file = str(tmp_path / "drugbank.xml.gz")
+    make_drugbank_xml(xml_file, drug_count=50)
+    with gzip.open(xml_file) as in_file:
+        drugs = list(ET.parse(in_file).getroot())
+
+    assert [dict(parse_drug(drug)) for drug in drugs] == [reference_parse_drug(drug) for drug in drugs]
@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from eutils_client import EutilsClient, EutilsError, TokenBucket
+from helpers import get_stand_in_pmids, start_eutils_stand_in
+
+TERMS = ["term {0}[MeSH Terms:noexp]".format(i) for i in range(8)]
+
+
+@pytest.fixture
+def eutils_server():
+    server, base_url = start_eutils_stand_in(rate=1000)
+    yield server, base_url
+    server.shutdown()
+
+
+def make_client(base_url, **kwargs):
+    kwargs.setdefault("requests_per_second", 1000)
+    kwargs.setdefault("use_history", False)
+    kwargs.setdefault("backoff", 0.01)
+    return EutilsClient(base_url, worker_count=4, **kwargs)
+
+
+def test_token_bucket_limits_the_rate():
+
+    bucket = TokenBucket(50)
+    start = time.monotonic()
+    for i in range(11):
+        bucket.acquire()
+
+    assert time.monotonic() - start >= 10 / 50 * 0.9
+
+
+def test_esearch_many_pages_in_term_order(eutils_server):
+
+    server, base_url = eutils_server
+    client = make_client(base_url)
+
+    results = client.esearch_many(TERMS, retmax=50)
+    client.close()
+
+    assert results == [get_stand_in_pmids(term) for term in TERMS]
+    assert max(int(params["retstart"]) for path, params in server.requests) > 0
+
+
+def test_server_errors_are_retried(eutils_server):
+
+    server, base_url = eutils_server
+    server.fail_every = 3
+    client = make_client(base_url)
+
+    results = client.esearch_many(TERMS, retmax=50)
+    client.close()
+
+    assert results == [get_stand_in_pmids(term) for term in TERMS]
+    assert server.rejected.count(503) > 0
+
+
+def test_rate_limited_client_recovers(eutils_server):
+
+    server, base_url = eutils_server
+    server.rate = 20
+    # above the server's limit, the 429s slow the client down
+    client = make_client(base_url, requests_per_second=40, backoff=0.2)
+
+    results = client.esearch_many(TERMS, retmax=50)
+    client.close()
+
+    assert results == [get_stand_in_pmids(term) for term in TERMS]
+    assert server.rejected.count(429) > 0
+
+
+def test_gives_up_after_max_retries(eutils_server):
+
+    server, base_url = eutils_server
+    server.fail_every = 1
+    client = make_client(base_url, max_retries=2)
+
+    with pytest.raises(EutilsError):
+        client.esearch(TERMS[0])
+    client.close()
+
+    assert len(server.requests) == 3
+
+
+def test_history_server_pages(eutils_server):
+
+    server, base_url = eutils_server
+    server.get_ids = lambda term: get_stand_in_pmids(term, 3000)
+    client = make_client(base_url, use_history=True, history_page_size=200)
+
+    results = client.esearch_many(TERMS[:3])
+    client.close()
+
+    assert results == [server.get_ids(term) for term in TERMS[:3]]
+    assert not [params for path, params in server.requests if path == "/esearch.fcgi" and "retstart" in params]
+    assert [params for path, params in server.requests if path == "/efetch.fcgi"]
+
+
+def test_history_server_falls_back_to_paging(eutils_server):
+
+    server, base_url = eutils_server
+    server.get_ids = lambda term: get_stand_in_pmids(term, 3000)
+    server.history = False
+    client = make_client(base_url, use_history=True, history_page_size=200)
+
+    result = client.search(TERMS[0], retmax=200)
+    client.close()
+
+    assert result == server.get_ids(TERMS[0])
+    assert not [params for path, params in server.requests if path == "/efetch.fcgi"]
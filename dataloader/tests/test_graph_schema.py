@@ -0,0 +1,79 @@
+import pytest
+
+import graph_schema
+
+
+class FakeSchema(object):
+    # answers like py2neo's Schema: uniqueness constraints by their property name,
+    # indexes (unique ones included) by tuples of property names
+
+    def __init__(self, constraints, indexes):
+        self.constraints = constraints
+        self.indexes = indexes
+        self.created = []
+
+    def get_uniqueness_constraints(self, label):
+        return list(self.constraints.get(label, []))
+
+    def get_indexes(self, label):
+        return list(self.indexes.get(label, [])) + [(key,) for key in self.constraints.get(label, [])]
+
+    def create_uniqueness_constraint(self, label, property_key):
+        self.created.append(("constraint", label, property_key))
+
+    def create_index(self, label, *property_keys):
+        self.created.append(("index", label) + property_keys)
+
+
+class FakeResult(object):
+
+    def close(self):
+        pass
+
+
+class FakeGraph(object):
+
+    def __init__(self, schema):
+        self.schema = schema
+
+    def run(self, cypher):
+        return FakeResult()
+
+
+@pytest.fixture(autouse=True)
+def schema_config(monkeypatch):
+
+    monkeypatch.setattr(graph_schema.config, "JSON2GRAPH_GENERATED_HASH_ID_ATTR_NAME", "_id")
+    monkeypatch.setattr(graph_schema.config, "JSON2GRAPH_GENERATED_HASH_IDS", {"Disease": ["doid"]})
+    monkeypatch.setattr(graph_schema.config, "JSON2GRAPH_INDEXED_ATTRS", {"Gene": ["GeneID"]})
+    monkeypatch.setattr(graph_schema.config, "JSON2GRAPH_RELTYPE", {"DISEASE:GENE": "ASSOCIATES_DaG"})
+
+
+def test_existing_constraint_is_kept(caplog):
+
+    schema = FakeSchema({"Disease": ["_id"]}, {"Gene": [("GeneID",)]})
+
+    graph_schema.create_schema(FakeGraph(schema))
+
+    assert schema.created == []
+    assert "WARNING" not in [record.levelname for record in caplog.records]
+
+
+def test_existing_index_is_kept(caplog):
+
+    schema = FakeSchema({}, {"Disease": [("_id",)], "Gene": [("GeneID",)]})
+
+    graph_schema.create_schema(FakeGraph(schema))
+
+    assert schema.created == []
+    assert [record.levelname for record in caplog.records].count("WARNING") == 1
+
+
+def test_missing_schema_is_created(caplog):
+
+    schema = FakeSchema({}, {})
+
+    graph_schema.create_schema(FakeGraph(schema))
+
+    assert schema.created == [("constraint", "Disease", "_id"), ("index", "Gene", "GeneID")]
+    assert "WARNING" not in [record.levelname for record in caplog.records]
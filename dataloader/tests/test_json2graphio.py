@@ -0,0 +1,244 @@
+import pytest
+from py2neo import Node
+
+from helpers import CypherCountingGraph, make_entity_frame, make_loader, make_target_compound_rows, reference_hash_id
+from json2graphio import Json2graphio, NodeRecord
+from load_data import Disease, TargetCompoundMap, build_entities
+
+BATCH_SIZE = 50
+
+
+def load_batches(loader, entities, graph, mode):
+    # loads the entities batch by batch like a parsing worker, returns the number of buffered rows
+    buffered_rows = 0
+    for batch_start in range(0, len(entities), BATCH_SIZE):
+        for entity in entities[batch_start:batch_start + BATCH_SIZE]:
+            loader.load_json(entity.to_dict(), "Disease")
+        buffered_rows += sum(len(nodes.nodes) for nodes in loader.nodeSets.values())
+        buffered_rows += sum(len(rels.relationships) for rels in loader.relationshipSets.values())
+        getattr(loader, mode)(graph)
+    return buffered_rows
+
+
+def test_flush_sends_every_batch_once():
+
+    batch_count = 10
+    # without missing values no disease shares its generated id with another one
+    entities = build_entities(Disease, "Disease", make_entity_frame("Disease", batch_count * BATCH_SIZE, null_ratio=0))
+    graph = CypherCountingGraph()
+
+    buffered_rows = load_batches(make_loader(), entities, graph, "flush")
+
+    # one statement per node/relationship set and batch
+    assert graph.statements == batch_count * 2
+    # every batch has its diseases, their parents (DOID:i and DOID:i+1, so one more than diseases)
+    # and two IS_A relationships per disease. Sending earlier batches again would add up to several times that
+    assert graph.rows == batch_count * (BATCH_SIZE + (BATCH_SIZE + 1) + 2 * BATCH_SIZE)
+    assert graph.rows == buffered_rows
+
+
+def test_cached_md5_ids_match_uncached_ids():
+
+    loader = make_loader()
+    loader.config_str_primarykey_generated_hash_func = "md5"
+    hash_attrs = loader.config_dict_primarykey_generated_hashed_attrs_by_label
+    nodes = []
+    # every pair shows up twice, so the second one is served from the cache
+    for row in make_target_compound_rows(200) * 2:
+        entity = TargetCompoundMap(row)
+        for label, json_data in [(entity.parent_label, entity.parent_json_data),
+                                 (entity.child_label, entity.child_json_data)]:
+            node = loader._adjust_label_name(NodeRecord(label))
+            node.update(json_data)
+            nodes.append(node)
+
+    expected = [reference_hash_id(node, hash_attrs[node.__primarylabel__]) for node in nodes]
+    for node in nodes:
+        loader._generate_id_attr(node, None)
+
+    assert [node[loader.config_str_primarykey_generated_attr_name] for node in nodes] == expected
+
+
+def test_config_assignment_drops_the_cached_labels_and_merge_keys():
+
+    loader = Json2graphio()
+    loader.config_dict_label_override = {"thing": "Thing"}
+    loader.config_dict_primarykey_attr_by_label = {"Thing": "name", "Item": "name"}
+    loader.load_json({"name": "a", "kind": "x"}, "thing")
+    assert loader.nodeSets[frozenset(["Thing"])].merge_keys == ["name"]
+
+    loader.config_dict_label_override = {"thing": "Item"}
+    loader.config_dict_primarykey_attr_by_label = {"Thing": "name", "Item": ["name", "kind"]}
+    loader.load_json({"name": "b", "kind": "y"}, "thing")
+
+    assert loader.nodeSets[frozenset(["Item"])].merge_keys == ["name", "kind"]
+    assert loader.nodeSets[frozenset(["Item"])].nodes == [{"name": "b", "kind": "y"}]
+
+
+def test_invalidate_caches_after_changing_the_config_in_place():
+
+    loader = Json2graphio()
+    loader.config_dict_primarykey_attr_by_label["Thing"] = "name"
+    node = loader.build_node("Thing", {"name": "a", "kind": "x"})
+    assert loader._get_merge_keys(node) == ["name"]
+
+    loader.config_dict_primarykey_attr_by_label["Thing"] = "kind"
+    loader.invalidate_caches()
+
+    assert loader._get_merge_keys(node) == ["kind"]
+
+
+def test_config_assignment_drops_the_cached_hash_ids():
+
+    loader = make_loader()
+    node = loader.build_node("Target", {"ttd_id": "T00001"})
+    loader.config_str_primarykey_generated_attr_name = "target_id"
+    loader.config_dict_primarykey_generated_hashed_attrs_by_label = {"Target": ["ttd_id", "name"]}
+
+    other_node = loader.build_node("Target", {"ttd_id": "T00001", "name": "Target 1"})
+
+    assert other_node["target_id"] == reference_hash_id(other_node, ["ttd_id", "name"])
+    assert other_node["target_id"] != node["_id"]
+    assert loader._get_merge_keys(other_node) == ["target_id"]
+
+
+def test_merge_keys_from_the_node_properties_are_not_cached():
+
+    loader = Json2graphio()
+    first = loader.build_node("Thing", {"name": "a"})
+    second = loader.build_node("Thing", {"name": "b", "kind": "x"})
+
+    # without a configured primary key a node is merged on all of its properties
+    assert loader._get_merge_keys(first) == ["name"]
+    assert loader._get_merge_keys(second) == ["name", "kind"]
+    assert "Thing" not in loader._merge_keys_cache
+
+
+def build_py2neo_node(loader, label, json_data):
+    # Json2graphio.build_node with a py2neo.Node, like the nodes were built before NodeRecord
+    node = loader._adjust_label_name(Node(label))
+    node.update(json_data)
+    return loader._generate_id_attr(node, json_data)
+
+
+@pytest.mark.parametrize("label, json_data, update", [
+    ("Target", {"ttd_id": "T00001", "name": "Target 1"}, {}),
+    ("Target", {"ttd_id": "T00001", "name": None, "weight": 1.5}, {"weight": None, "flag": True}),
+    ("Compound", {"drugbank_id": None, "ttd_id": "D00001", "count": 0}, {"drugbank_id": "DB00001"}),
+    ("Thing", {"name": "a", "kind": None, "empty": ""}, {"name": None, "kind": "x"}),
+])
+def test_node_record_matches_py2neo_node(label, json_data, update):
+
+    loader = make_loader()
+    loader.config_dict_label_override = {"Thing": {"Item": {"source": "test"}}}
+
+    record = loader.build_node(label, dict(json_data))
+    node = build_py2neo_node(loader, label, dict(json_data))
+    properties = record.properties
+    # like a modifier hook would
+    record.update(update)
+    node.update(update)
+    record["extra"] = None
+    node["extra"] = None
+
+    assert record.properties is properties
+    assert record.properties == dict(node)
+    assert dict(record) == dict(node)
+    assert sorted(record.labels) == sorted(node.labels)
+    assert record.__primarylabel__ == node.__primarylabel__
+    assert loader._get_merge_keys(record) == loader._get_merge_keys(node)
+    assert all(key in record for key in node) and len(record) == len(node)
+
+
+def load_duplicates(policy, nodes=({"name": "a", "kind": "x", "size": 1}, {"name": "b"},
+                                   {"name": "a", "size": 2, "color": "red"}, {"kind": "no name"}, {"kind": "no name"}),
+                    relationships=({"weight": 1, "note": "first"}, {"weight": 2})):
+    # nodes merged on their name and relationships between the same two nodes
+    loader = Json2graphio()
+    loader.config_str_dedup_policy = policy
+    loader.config_dict_primarykey_attr_by_label = {"Thing": "name", "Other": "name"}
+    for properties in nodes:
+        loader.load_json(dict(properties), "Thing")
+    start_node, end_node = loader.build_node("Thing", {"name": "a"}), loader.build_node("Other", {"name": "o"})
+    for properties in relationships:
+        loader._create_relation(start_node, end_node, dict(properties))
+    return loader
+
+
+def get_buffer(loader):
+
+    # the sets of a payload are keyed by labels and merge keys, those of load_json by labels only
+    nodes = [node for nodes in loader.nodeSets.values() if list(nodes.labels) == ["Thing"] for node in nodes.nodes]
+    rels = [rel.properties for rels in loader.relationshipSets.values() for rel in rels.relationships]
+    return nodes, rels
+
+
+RELATIONSHIP_SET_NAME = "(Thing)-[THING_HAS_OTHER]->(Other)"
+
+
+def test_update_policy_applies_duplicates_like_merge():
+
+    loader = load_duplicates("update")
+
+    nodes, rels = get_buffer(loader)
+    # SET n += properties for nodes, SET r = properties for relationships.
+    # Nodes without a merge key value can not be merged and are kept as they are
+    assert nodes == [{"name": "a", "kind": "x", "size": 2, "color": "red"}, {"name": "b"},
+                     {"kind": "no name"}, {"kind": "no name"}]
+    assert rels == [{"weight": 2}]
+    assert loader.get_duplicate_counts() == {"Thing": 1, RELATIONSHIP_SET_NAME: 1}
+
+
+def test_keep_first_policy_drops_duplicates():
+
+    loader = load_duplicates("keep_first")
+
+    nodes, rels = get_buffer(loader)
+    assert nodes == [{"name": "a", "kind": "x", "size": 1}, {"name": "b"}, {"kind": "no name"}, {"kind": "no name"}]
+    assert rels == [{"weight": 1, "note": "first"}]
+    assert loader.get_duplicate_counts() == {"Thing": 1, RELATIONSHIP_SET_NAME: 1}
+
+
+def test_no_policy_keeps_duplicates():
+
+    loader = load_duplicates(None)
+
+    nodes, rels = get_buffer(loader)
+    assert nodes == [{"name": "a", "kind": "x", "size": 1}, {"name": "b"}, {"name": "a", "size": 2, "color": "red"},
+                     {"kind": "no name"}, {"kind": "no name"}]
+    assert rels == [{"weight": 1, "note": "first"}, {"weight": 2}]
+    assert loader.get_duplicate_counts() == {}
+
+
+def test_clear_resets_the_duplicates():
+
+    loader = load_duplicates("update")
+    loader.clear()
+    loader.load_json({"name": "a"}, "Thing")
+
+    assert get_buffer(loader)[0] == [{"name": "a"}]
+    assert loader.get_duplicate_counts() == {}
+
+
+@pytest.mark.parametrize("policy", ["update", "keep_first", None])
+def test_payloads_keep_the_deduplicated_buffer(policy):
+
+    batch = load_duplicates(policy)
+    next_batch = load_duplicates(policy, nodes=[{"name": "a", "size": 3}], relationships=[{"weight": 3}])
+    expected = load_duplicates(policy, nodes=[{"name": "a", "kind": "x", "size": 1}, {"name": "b"},
+                                              {"name": "a", "size": 2, "color": "red"}, {"kind": "no name"},
+                                              {"kind": "no name"}, {"name": "a", "size": 3}],
+                               relationships=[{"weight": 1, "note": "first"}, {"weight": 2}, {"weight": 3}])
+    writer = Json2graphio()
+    writer.config_str_dedup_policy = policy
+
+    added = writer.add_payload(batch.get_payload())
+    added += writer.add_payload(next_batch.get_payload())
+
+    # coalescing the payloads of two batches gives the buffer of a single batch with all rows
+    assert get_buffer(writer) == get_buffer(expected)
+    assert added == len(get_buffer(expected)[0]) + len(get_buffer(expected)[1])
+    batch_counts = batch.get_duplicate_counts()
+    assert writer.get_duplicate_counts() == {
+        name: count - batch_counts.get(name, 0) for name, count in expected.get_duplicate_counts().items()
+    }
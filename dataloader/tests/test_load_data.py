@@ -0,0 +1,147 @@
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+import load_data
+from helpers import make_entity_frame, make_loader
+from load_data import Compound, Disease, Target, build_entities
+
+
+@pytest.mark.parametrize("entity_name, entity", [("Compound", Compound), ("Target", Target), ("Disease", Disease)])
+def test_build_entities_matches_row_entities(entity_name, entity):
+
+    data = make_entity_frame(entity_name, 200)
+
+    expected = [entity(row).to_dict() for index, row in data.iterrows()]
+
+    assert [e.to_dict() for e in build_entities(entity, entity_name, data)] == expected
+
+
+class RecordingGraph(object):
+    # stand-in for py2neo.Graph which works across processes: appends the parameter rows of every statement
+    # to a file, one line per statement. Fails every statement with fail=True
+
+    def __init__(self, record_file, fail=False):
+        self.record_file = record_file
+        self.fail = fail
+
+    def run(self, cypher, *args, **parameters):
+        if self.fail:
+            raise ConnectionError("database gone")
+        rows = [row for value in parameters.values() if isinstance(value, list) for row in value]
+        with open(self.record_file, "a") as out_file:
+            out_file.write(json.dumps(rows) + "\n")
+
+
+def read_statements(record_file):
+
+    if not os.path.exists(record_file):
+        return []
+    with open(record_file) as in_file:
+        return [json.loads(line) for line in in_file]
+
+
+def make_payload(index, node_count):
+    # a payload like Json2graphio.get_payload() creates it, with node_count new nodes
+    nodes = [{"name": "node-{0}-{1}".format(index, node)} for node in range(node_count)]
+    return [(["Thing"], ["name"], nodes)], []
+
+
+@pytest.fixture
+def writer_config(tmp_path, monkeypatch):
+
+    record_file = str(tmp_path / "statements.jsonl")
+    monkeypatch.setattr(load_data.config, "get_graph", lambda: RecordingGraph(record_file))
+    monkeypatch.setattr(load_data.config, "COMMIT_INTERVAL", 20)
+    monkeypatch.setattr(load_data.config, "DB_WRITER_FLUSH_TIMEOUT", 0.1)
+    monkeypatch.setattr(load_data.config, "NO_OF_DB_WRITERS", 2)
+    monkeypatch.setattr(load_data, "graph", None)
+    monkeypatch.setattr(load_data, "exit_code", 0, raising=False)
+    return record_file
+
+
+@pytest.fixture
+def fork_only():
+    # the writer processes get the patched config only when they are forked
+    if multiprocessing.get_start_method() != "fork":
+        pytest.skip("needs the fork start method")
+
+
+def test_every_payload_is_written_once(writer_config, fork_only):
+
+    write_queue = multiprocessing.Queue(maxsize=2)
+    writer_failed = multiprocessing.Event()
+    writers = load_data.start_db_writers(write_queue, writer_failed)
+    for index in range(30):
+        write_queue.put(make_payload(index, 7))
+
+    load_data.stop_db_writers(writers, write_queue, writer_failed)
+
+    names = [row["name"] for rows in read_statements(writer_config) for row in rows]
+    assert sorted(names) == sorted("node-{0}-{1}".format(index, node) for index in range(30) for node in range(7))
+    assert load_data.exit_code == 0
+
+
+def test_payloads_are_coalesced_up_to_the_commit_interval(writer_config):
+
+    write_queue = queue.Queue()
+    for index in range(10):
+        write_queue.put(make_payload(index, 5))
+    write_queue.put(load_data.DB_WRITER_STOP)
+
+    load_data.DBWriter(write_queue, threading.Event(), "DB_WRITER_TEST").run()
+
+    # 4 payloads of 5 nodes fill a commit, the rest is written on stop
+    assert [len(rows) for rows in read_statements(writer_config)] == [20, 20, 10]
+
+
+def test_idle_writer_flushes_its_buffer(writer_config):
+
+    write_queue = queue.Queue()
+    writer = threading.Thread(target=load_data.DBWriter(write_queue, threading.Event(), "DB_WRITER_TEST").run)
+    writer.start()
+    write_queue.put(make_payload(0, 5))
+
+    deadline = time.monotonic() + 5
+    while not read_statements(writer_config) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    statements = read_statements(writer_config)
+    write_queue.put(load_data.DB_WRITER_STOP)
+    writer.join()
+
+    # written after DB_WRITER_FLUSH_TIMEOUT, without waiting for the commit interval or the stop
+    assert [len(rows) for rows in statements] == [5]
+
+
+def test_failed_writer_stops_the_parsing_workers(writer_config, fork_only, monkeypatch):
+
+    monkeypatch.setattr(load_data.config, "get_graph", lambda: RecordingGraph(writer_config, fail=True))
+    monkeypatch.setattr(load_data.config, "NO_OF_DB_WRITERS", 1)
+    write_queue = multiprocessing.Queue(maxsize=1)
+    writer_failed = multiprocessing.Event()
+    writers = load_data.start_db_writers(write_queue, writer_failed)
+    # a parsing worker, see worker_task_init
+    monkeypatch.setattr(load_data, "db_write_queue", write_queue)
+    monkeypatch.setattr(load_data, "db_writer_failed", writer_failed)
+    dataloader = load_data.Dataloader.__new__(load_data.Dataloader)
+    dataloader.name = "WORKER_TASK_TEST"
+    dataloader.entity_label = "Disease"
+    dataloader.loader = make_loader()
+    entities = build_entities(Disease, "Disease", make_entity_frame("Disease", 1000))
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="DB writer failed"):
+        # the writer dies on its first commit, after that the queue fills up
+        for batch_start in range(0, len(entities), 10):
+            dataloader.load(entities[batch_start:batch_start + 10])
+    load_data.stop_db_writers(writers, write_queue, writer_failed)
+
+    assert writer_failed.is_set()
+    assert time.monotonic() - start < 30
+    assert load_data.exit_code == 1
+    assert read_statements(writer_config) == []
@@ -0,0 +1,25 @@
+import os
+
+from helpers import make_mesh_xml
+from mesh_desc_parser import load_mesh_descriptor_file_list
+
+
+def test_parallel_releases_match_sequential_parse(tmp_path):
+
+    outputs = {}
+    for worker_count in [1, 3]:
+        files = []
+        for index, descriptor_count in enumerate([300, 120, 100]):
+            xml_file = os.path.join(str(tmp_path), "desc{0}.gz".format(index))
+            if not os.path.exists(xml_file):
+                make_mesh_xml(xml_file, descriptor_count, seed=index)
+            files.append((xml_file, os.path.join(str(tmp_path), "terms{0}-{1}.csv".format(index, worker_count)),
+                          os.path.join(str(tmp_path), "tree-numbers{0}-{1}.csv".format(index, worker_count))))
+        load_mesh_descriptor_file_list(files, worker_count)
+        outputs[worker_count] = []
+        for xml_file, terms_file, tree_numbers_file in files:
+            for output_file in [terms_file, tree_numbers_file]:
+                with open(output_file, "rb") as in_file:
+                    outputs[worker_count].append(in_file.read())
+
+    assert outputs[1] == outputs[3]
@@ -0,0 +1,51 @@
+import pandas
+import pytest
+
+import mesh_lookup
+
+
+def write_table(file_name, rows, columns):
+    pandas.DataFrame(rows, columns=columns).to_csv(file_name, sep="\t", index=False)
+
+
+@pytest.fixture
+def mesh_files(tmp_path, monkeypatch):
+    # A01 is in all releases, A02 only in the legacy ones and A03 only in the 2005 release
+    files = {}
+    for key, rows in [("MESH_TREE_NUMBER_FILE", [("D000001", "A01")]),
+                      ("MESH_TREE_NUMBER_2002_FILE", [("D000102", "A01"), ("D000202", "A02")]),
+                      ("MESH_TREE_NUMBER_2005_FILE", [("D000105", "A01"), ("D000205", "A02"), ("D000305", "A03")])]:
+        files[key] = str(tmp_path / "{0}.tsv".format(key))
+        write_table(files[key], rows, ["mesh_id", "mesh_tree_number"])
+        monkeypatch.setattr(mesh_lookup.config, key, files[key])
+    files["MESH_TERM_FILE"] = str(tmp_path / "mesh.tsv")
+    write_table(files["MESH_TERM_FILE"], [("D000001", "Current")], ["mesh_id", "mesh_name"])
+    monkeypatch.setattr(mesh_lookup.config, "MESH_TERM_FILE", files["MESH_TERM_FILE"])
+    monkeypatch.setattr(mesh_lookup.config, "MESH_LOOKUP_FILE", str(tmp_path / "mesh-lookup.pkl"))
+    monkeypatch.setattr(mesh_lookup, "_mesh_lookups", {})
+    return files
+
+
+def test_tree_number_precedence(mesh_files):
+
+    lookup = mesh_lookup.build_mesh_lookup()
+
+    # current release first, then 2002 and 2005, like the xref update before the lookup file
+    assert lookup.tree_number_to_id == {"A01": "D000001", "A02": "D000202", "A03": "D000305"}
+
+
+def test_load_uses_the_given_term_file(mesh_files, tmp_path):
+
+    other_term_file = str(tmp_path / "other-mesh.tsv")
+    write_table(other_term_file, [("D000001", "Other")], ["mesh_id", "mesh_name"])
+
+    assert mesh_lookup.load_mesh_lookup().id_to_name == {"D000001": "Current"}
+    assert mesh_lookup.load_mesh_lookup(mesh_term_file=other_term_file).id_to_name == {"D000001": "Other"}
+
+
+def test_load_rebuilds_an_outdated_lookup(mesh_files):
+
+    mesh_lookup.build_mesh_lookup()
+    write_table(mesh_files["MESH_TERM_FILE"], [("D000001", "Renamed")], ["mesh_id", "mesh_name"])
+
+    assert mesh_lookup.load_mesh_lookup().id_to_name == {"D000001": "Renamed"}
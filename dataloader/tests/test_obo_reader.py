@@ -0,0 +1,56 @@
+from obo_reader import iter_obo_terms
+
+OBO = """format-version: 1.2
+ontology: doid
+
+[Term]
+id: DOID:1
+name: disease
+def: "A disease." [url:http://example.org]
+xref: MESH:D004194 {source="MONDO:equivalentTo"} ! Diseases
+xref: UMLS_CUI:C0012634
+! a comment line
+
+[Term]
+id: DOID:2
+name: obsolete disease
+is_obsolete: true
+
+[Term]
+id: DOID:3
+name: syndrome
+is_a: DOID:1 ! disease
+
+[Typedef]
+id: part_of
+name: part of
+"""
+
+
+def write_obo(tmp_path):
+    obo_file = str(tmp_path / "doid.obo")
+    with open(obo_file, "w") as out_file:
+        out_file.write(OBO)
+    return obo_file
+
+
+def test_iter_obo_terms(tmp_path):
+
+    terms = list(iter_obo_terms(write_obo(tmp_path)))
+
+    assert terms == [
+        {"id": "DOID:1", "name": "disease", "def": '"A disease." [url:http://example.org]',
+         "xref": ["MESH:D004194", "UMLS_CUI:C0012634"]},
+        {"id": "DOID:3", "name": "syndrome", "is_a": ["DOID:1"]},
+    ]
+
+
+def test_iter_obo_terms_selected_tags_and_obsolete(tmp_path):
+
+    terms = list(iter_obo_terms(write_obo(tmp_path), ["name"], ignore_obsolete=False))
+
+    assert terms == [
+        {"id": "DOID:1", "name": "disease"},
+        {"id": "DOID:2", "name": "obsolete disease", "is_obsolete": "true"},
+        {"id": "DOID:3", "name": "syndrome"},
+    ]
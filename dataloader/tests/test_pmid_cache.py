@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+
+from eutils_client import EutilsClient, EutilsError
+from helpers import get_stand_in_pmids, start_eutils_stand_in
+from pmid_cache import PmidCache, search_cached
+
+TODAY = datetime.date(2024, 1, 1)
+TERMS = ["term {0}[MeSH Terms:noexp]".format(i) for i in range(6)]
+
+
+@pytest.fixture
+def eutils_server():
+    server, base_url = start_eutils_stand_in(rate=1000)
+    yield server, base_url
+    server.shutdown()
+
+
+@pytest.fixture
+def client(eutils_server):
+    server, base_url = eutils_server
+    client = EutilsClient(base_url, requests_per_second=1000, worker_count=4, max_retries=0, backoff=0.01)
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PmidCache(str(tmp_path / "pmid-cache.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_cache_entries(cache):
+
+    cache.put("a[MeSH Terms]", ["3", "2", "1"], TODAY)
+    cache.put("b[MeSH Terms]", [], TODAY)
+
+    assert cache.get("a[MeSH Terms]") == (["3", "2", "1"], TODAY)
+    assert cache.get("b[MeSH Terms]") == ([], TODAY)
+    assert cache.get("c[MeSH Terms]") is None
+
+
+def test_search_cached_within_the_ttl(eutils_server, client, cache):
+
+    server, base_url = eutils_server
+    expected = [get_stand_in_pmids(term) for term in TERMS]
+    assert search_cached(client, cache, TERMS, ttl_days=30, today=TODAY) == expected
+    del server.requests[:]
+
+    assert search_cached(client, cache, TERMS, ttl_days=30, today=TODAY + datetime.timedelta(days=29)) == expected
+    assert server.requests == []
+
+
+def test_search_cached_refreshes_outdated_queries(eutils_server, client, cache):
+
+    server, base_url = eutils_server
+    search_cached(client, cache, TERMS, ttl_days=30, today=TODAY)
+    # a few articles were added to PubMed since
+    server.new_ids = {term: ["40000000{0}".format(i)] for i, term in enumerate(TERMS[:2])}
+    del server.requests[:]
+
+    results = search_cached(client, cache, TERMS + ["new term"], ttl_days=30, today=TODAY + datetime.timedelta(days=60))
+
+    assert results == [server.new_ids.get(term, []) + get_stand_in_pmids(term) for term in TERMS + ["new term"]]
+    # one request per refreshed query, the new query is fetched in full
+    assert sorted(params["term"] for path, params in server.requests if params.get("mindate") == "2024/01/01") == \
+        sorted(TERMS)
+    assert all("mindate" not in params for path, params in server.requests if params["term"] == "new term")
+
+
+def test_search_cached_keeps_the_finished_queries(eutils_server, client, cache):
+
+    server, base_url = eutils_server
+
+    def get_ids(term):
+        if term == TERMS[3]:
+            raise ValueError("backend failed")
+        return get_stand_in_pmids(term)
+    server.get_ids = get_ids
+
+    with pytest.raises(EutilsError):
+        search_cached(client, cache, TERMS, ttl_days=30, today=TODAY)
+
+    assert [cache.get(term) is not None for term in TERMS] == [True, True, True, False, True, True]
@@ -0,0 +1,141 @@
+import os
+
+import pytest
+
+import stage_manifest
+from stage_manifest import load_manifest, run_stage
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(stage_manifest.config, "STAGE_MANIFEST_FILE", str(tmp_path / "stage-manifest.json"))
+    monkeypatch.setattr(stage_manifest.config, "FORCE_STAGE_REBUILD", False)
+    files = {name: str(tmp_path / "{0}.csv".format(name)) for name in ["input", "middle", "output"]}
+    write(files["input"], "input")
+    return files
+
+
+def write(file_name, content):
+
+    with open(file_name, "w") as out_file:
+        out_file.write(content)
+
+
+def read(file_name):
+
+    with open(file_name) as in_file:
+        return in_file.read()
+
+
+class Stage(object):
+    # a preprocessing stage that writes its input file with a suffix to its output file
+
+    def __init__(self, name, input_file, output_file, config_keys=()):
+        self.name = name
+        self.input_file = input_file
+        self.output_file = output_file
+        self.config_keys = config_keys
+        self.runs = 0
+
+    def convert(self, input_file, output_file):
+        self.runs += 1
+        write(output_file, read(input_file) + " > " + self.name)
+        # the file system clock may not tick between two quick runs, while real stages take a while
+        stat = os.stat(output_file)
+        os.utime(output_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + self.runs * 10 ** 6))
+
+    def run(self):
+        return run_stage(self.name, self.convert, [self.input_file, self.output_file], [self.input_file],
+                         [self.output_file], self.config_keys)
+
+
+@pytest.fixture
+def stages(files):
+
+    return (Stage("first", files["input"], files["middle"], ["DATASET_INDEX_INTERVAL"]),
+            Stage("second", files["middle"], files["output"]))
+
+
+def run_all(stages):
+
+    return [stage.run() for stage in stages]
+
+
+def test_unchanged_stages_are_skipped(stages, files):
+
+    assert run_all(stages) == [True, True]
+    assert run_all(stages) == [False, False]
+    assert read(files["output"]) == "input > first > second"
+
+
+def test_changed_input_reruns_the_stage_and_its_dependents(stages, files):
+
+    run_all(stages)
+    write(files["input"], "changed input")
+
+    assert run_all(stages) == [True, True]
+    assert read(files["output"]) == "changed input > first > second"
+
+
+def test_touched_input_reruns_the_stage(stages, files):
+
+    run_all(stages)
+    # same size, other mtime
+    stat = os.stat(files["input"])
+    os.utime(files["input"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert run_all(stages) == [True, True]
+
+
+def test_changed_output_reruns_the_stage(stages, files):
+
+    run_all(stages)
+    write(files["output"], "edited by hand")
+
+    assert run_all(stages) == [False, True]
+    assert read(files["output"]) == "input > first > second"
+
+
+def test_missing_output_reruns_the_stage(stages, files):
+
+    run_all(stages)
+    os.remove(files["middle"])
+
+    # the rewritten middle file is a new input of the second stage
+    assert run_all(stages) == [True, True]
+    assert run_all(stages) == [False, False]
+
+
+def test_changed_config_reruns_the_stage(stages, monkeypatch):
+
+    run_all(stages)
+    monkeypatch.setattr(stage_manifest.config, "DATASET_INDEX_INTERVAL",
+                        stage_manifest.config.DATASET_INDEX_INTERVAL + 1)
+
+    # the second stage does not depend on the config value, but on the rewritten middle file
+    assert run_all(stages) == [True, True]
+    assert [stage.runs for stage in stages] == [2, 2]
+
+
+def test_forced_rebuild_runs_every_stage(stages, monkeypatch):
+
+    run_all(stages)
+    monkeypatch.setattr(stage_manifest.config, "FORCE_STAGE_REBUILD", True)
+
+    assert run_all(stages) == [True, True]
+
+
+def test_failed_stage_is_not_recorded(files):
+
+    def fail(input_file, output_file):
+        write(output_file, "partial")
+        raise ValueError("parse error")
+
+    with pytest.raises(ValueError):
+        run_stage("failing", fail, [files["input"], files["output"]], [files["input"]], [files["output"]])
+
+    assert "failing" not in load_manifest()
+    stage = Stage("failing", files["input"], files["output"])
+    assert stage.run()
+    assert read(files["output"]) == "input > failing"
@@ -0,0 +1,38 @@
+import numpy
+import pandas
+import pytest
+
+from helpers import make_obo_file, make_xref_frame, reference_parse_anatomy_entries, reference_update_xrefs
+from uberon_parser import parse_anatomy_entries, update_mesh_xrefs
+
+
+def test_update_mesh_xrefs_matches_per_row_update():
+
+    df, tn_to_id = make_xref_frame(2000, mesh_ratio=0.5)
+
+    pandas.testing.assert_series_equal(update_mesh_xrefs(df.xref, tn_to_id), reference_update_xrefs(df.xref, tn_to_id))
+
+
+@pytest.mark.parametrize("values", [[numpy.nan, numpy.nan], ["MESH:A01.000", None], []])
+def test_update_mesh_xrefs_edge_cases(values):
+
+    tn_to_id = {"A01.000": "D000001"}
+    values = pandas.Series(values, dtype=object)
+
+    # Series.map infers float64 for a result without strings, which makes no difference in the written file
+    pandas.testing.assert_series_equal(update_mesh_xrefs(values, tn_to_id), reference_update_xrefs(values, tn_to_id),
+                                       check_dtype=False)
+
+
+def test_parse_anatomy_entries_matches_obonet_graph(tmp_path):
+
+    # the graph based reference needs obonet, which the loader itself does not use anymore
+    pytest.importorskip("obonet")
+    obo_file = str(tmp_path / "basic.obo")
+    make_obo_file(obo_file, 500, prefix="UBERON", unnamed_ratio=0.05, depiction_ratio=0.05)
+
+    tables = parse_anatomy_entries(obo_file)
+    reference_tables = reference_parse_anatomy_entries(obo_file)
+
+    assert [table.to_csv(sep="\t", index=False) for table in tables] == \
+        [table.to_csv(sep="\t", index=False) for table in reference_tables]
@@ -1,10 +1,13 @@
 import os
 import pandas as pd
 import re
+import sys
 import logging
-import obo
 from Configs import getConfig
 
+from mesh_lookup import load_mesh_lookup
+from obo_reader import iter_obo_terms
+
 config = getConfig()
 log = logging.getLogger(__name__)
 log.addHandler(logging.StreamHandler())
@@ -13,82 +16,87 @@ log.setLevel(getattr(logging, config.LOG_LEVEL))
 
 def parse_anatomy_entries(basic_obo_file):
 
-    with open(basic_obo_file) as basic_file:
-        basic = obo.read_obo(basic_file)
-
-    # Extract information from the graph
-    term_rows = []
-    xref_rows = []
-    subset_rows = []
-
-    for node, data in basic.nodes(data=True):
-
-        # obo read_obo parses "relationship" attributes as graph edges
-        # mostly, these are relationships to another Uberon term
-        # sometimes, these are "depicted_by" relationships that refer to an image url
-        # which should not be added to the graph (it creates nodes for the image url entry which will not contain any data)
-        try:
-            data = data['attr_dict']
+    # Extract the tables while streaming over the terms, the relationships are not needed.
+    # Obsolete terms are included, terms without a name are skipped
+    term_rows = {'uberon_id': [], 'uberon_name': []}
+    xref_rows = {'uberon_id': [], 'xref': []}
+    subset_rows = {'uberon_id': [], 'subset': []}
 
-            term_rows.append((node, data['name']))
-        except Exception as e:
+    for data in iter_obo_terms(basic_obo_file, ['name', 'xref', 'subset'], ignore_obsolete=False):
+        if 'name' not in data:
             continue
+        node = data['id']
+        term_rows['uberon_id'].append(node)
+        term_rows['uberon_name'].append(data['name'])
 
+        # the xrefs stay whole 'vocab:identifier' strings, which is what the xref table holds. The
+        # vocabulary prefix is part of each string and can only be shared after splitting it off
         for xref in data.get('xref', []):
-            xref_rows.append((node, xref))
+            xref_rows['uberon_id'].append(node)
+            xref_rows['xref'].append(xref)
 
+        # there are only a few subsets, share their names
         for subset in data.get('subset', []):
-            subset_rows.append((node, subset))
+            subset_rows['uberon_id'].append(node)
+            subset_rows['subset'].append(sys.intern(subset))
 
-    term_df = pd.DataFrame(term_rows, columns=['uberon_id', 'uberon_name']).sort_values(['uberon_id', 'uberon_name'])
-    xref_df = pd.DataFrame(xref_rows, columns=['uberon_id', 'xref']).sort_values(['uberon_id', 'xref'])
-    subset_df = pd.DataFrame(subset_rows, columns=['uberon_id', 'subset']).sort_values(['uberon_id', 'subset'])
+    term_df = pd.DataFrame(term_rows).sort_values(['uberon_id', 'uberon_name'])
+    xref_df = pd.DataFrame(xref_rows).sort_values(['uberon_id', 'xref'])
+    subset_df = pd.DataFrame(subset_rows).sort_values(['uberon_id', 'subset'])
 
     return (term_df, xref_df, subset_df)
 
 
-def update_xrefs(df):
-
-    # https://www.nlm.nih.gov/mesh/intro_trees.html : The numbers are subject to change 
-    # when new descriptors are added or the hierarchical arrangement is revised to reflect vocabulary changes.
-
-    # TODO: compile a lookup table that includes legacy and current tree numbers 
-    # from all MeSH releases instead of including lookups from 2002 & 2005
-
-    # Update MESH IDs that are tree numbers
-    tree_number_df = pd.read_table(config.MESH_TREE_NUMBER_FILE)
-    tree_number_2002_df = pd.read_table(config.MESH_TREE_NUMBER_2005_FILE)
-    tree_number_2005_df = pd.read_table(config.MESH_TREE_NUMBER_2002_FILE)
-
-    tn_to_id = dict(zip(tree_number_df.mesh_tree_number, tree_number_df.mesh_id))
-    tn_to_id_2002 = dict(zip(tree_number_2002_df.mesh_tree_number, tree_number_2002_df.mesh_id))
-    tn_to_id_2005 = dict(zip(tree_number_2005_df.mesh_tree_number, tree_number_2005_df.mesh_id))
-
-    # outdated MeSH xrefs mapped to current MeSH descriptors
-    xref_map = {'A03.492' : 'D041981',
-                'A14.254.245' : 'D014094',
-                'A03.867' : 'D010614',
-                'A03.867.490' : 'D007013',
-                'A03.867.557' : 'D009305',
-                'A03.867.603' : 'D009960',
-                'A03.867.603.925' : 'D014066'}
-
-    def update_xref(x):
-        try:
-            vocab, identifier = x.split(':', 1)
-            if vocab == 'MESH':
-                if re.search('D[0-9]{6}', identifier):
-                    if identifier in xref_map:
-                        log.debug("Found mapped identifier: {0}".format(identifier))
-                        return 'MESH:' + xref_map.get(identifier)
-                    return x   
-                return 'MESH:' + (xref_map.get(identifier) or tn_to_id.get(identifier) or tn_to_id_2005.get(identifier) or tn_to_id_2002.get(identifier) or identifier)
-        except Exception as e:
-            pass
-        
-        return x
-
-    df.xref = df.xref.map(update_xref)
+# outdated MeSH xrefs mapped to current MeSH descriptors
+MESH_XREF_MAP = {'A03.492' : 'D041981',
+                 'A14.254.245' : 'D014094',
+                 'A03.867' : 'D010614',
+                 'A03.867.490' : 'D007013',
+                 'A03.867.557' : 'D009305',
+                 'A03.867.603' : 'D009960',
+                 'A03.867.603.925' : 'D014066'}
+
+MESH_DESCRIPTOR_PATTERN = re.compile('D[0-9]{6}')
+
+
+def update_mesh_xrefs(xrefs, tn_to_id):
+    """Rewrite MESH xrefs that are outdated or tree numbers to descriptor ids.
+
+    xrefs is a Series of 'vocab:identifier' strings. Other vocabularies, values without
+    a ':' and non string values are returned unchanged.
+    """
+    if not pd.api.types.is_string_dtype(xrefs):
+        return xrefs.copy()
+
+    # non string values are no MESH xrefs
+    is_mesh = xrefs.str.startswith('MESH:', na=False).to_numpy()
+    identifier = xrefs[is_mesh].str.slice(len('MESH:'))
+
+    # identifiers that contain a descriptor id are kept unless they are mapped explicitly
+    is_descriptor = identifier.str.contains(MESH_DESCRIPTOR_PATTERN)
+    is_mapped = identifier.isin(MESH_XREF_MAP.keys())
+    for mapped_identifier in identifier[is_descriptor & is_mapped]:
+        log.debug("Found mapped identifier: {0}".format(mapped_identifier))
+
+    update = is_mesh.copy()
+    update[is_mesh] = (~is_descriptor | is_mapped).to_numpy()
+    identifier = identifier[~is_descriptor | is_mapped]
+
+    # the explicit mappings take precedence over the tree numbers
+    lookup = dict(tn_to_id)
+    lookup.update(MESH_XREF_MAP)
+    updated_identifier = identifier.map(lookup).fillna(identifier)
+
+    xrefs = xrefs.copy()
+    xrefs[update] = ('MESH:' + updated_identifier).to_numpy()
+    return xrefs
+
+
+def update_xrefs(df, mesh_lookup):
+
+    # Update MESH IDs that are tree numbers.
+    # The lookup holds the current and the legacy tree numbers of all parsed MeSH releases
+    df.xref = update_mesh_xrefs(df.xref, mesh_lookup.tree_number_to_id)
     return df
 
 def load_uberon_anatomy_file(basic_obo_file, anatomy_term_file, anatomy_xref_file, anatomy_subset_file, 
@@ -96,9 +104,10 @@ def load_uberon_anatomy_file(basic_obo_file, anatomy_term_file, anatomy_xref_fil
 
     (term_df, xref_df, subset_df) = parse_anatomy_entries(basic_obo_file)
     term_df.to_csv(anatomy_term_file, sep="\t", index=False)
+    mesh_lookup = load_mesh_lookup(mesh_term_file=mesh_term_file)
 
     # Create a dataframe of cross-references
-    xref_df = update_xrefs(xref_df)
+    xref_df = update_xrefs(xref_df, mesh_lookup)
     xref_df.to_csv(anatomy_xref_file, sep='\t', index=False)
     
     # Create a dataframe of term subsets
@@ -127,9 +136,9 @@ def load_uberon_anatomy_file(basic_obo_file, anatomy_term_file, anatomy_xref_fil
     # filter by uberon_slim and pheno_slim subsets
     uberon_slim_df = uberon_slim_df[uberon_slim_df.uberon_id.isin(subset_dict['uberon_slim'] | subset_dict['pheno_slim'])]
 
-    # Add mesh_name column to uberon dataframe
-    mesh_df = pd.read_table(mesh_term_file)
-    uberon_slim_df = uberon_slim_df.merge(mesh_df, how='left')
+    # Add mesh_name column to uberon dataframe (names of the current release, see mesh_lookup.py)
+    uberon_slim_df = uberon_slim_df.reset_index(drop=True)
+    uberon_slim_df['mesh_name'] = uberon_slim_df.mesh_id.map(mesh_lookup.id_to_name)
 
     # mesh_id_str = "|".join(["D008198", "D001365", "D006119", "D009333", "D008643"])
     # mesh_df[mesh_df.mesh_id.str.contains(mesh_id_str)]